@@ -0,0 +1,80 @@
+"""
+Embedding backend benchmark: throughput (chunks/s) and retrieval recall of the
+ONNX / int8 ONNX backends against the PyTorch reference.
+
+Usage:
+    python debug_embedding_benchmark.py [markdown_file] [--backends torch,onnx,onnx-int8]
+                                        [--batch-size 64] [--threads 0] [--top-k 5]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add project root
+sys.path.append(os.getcwd())
+
+from src.config import EMBEDDING_MODEL_NAME, EMBEDDING_BATCH_SIZE, EMBEDDING_NUM_THREADS
+from src.utils import rag
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger("EmbeddingBenchmark")
+
+QUERIES = [
+    "Revenue", "Net Income", "EBITDA", "Operating Cash Flow", "Diluted EPS",
+    "Capital expenditures", "Total debt", "Goodwill impairment", "Risk factors", "Share repurchases",
+]
+
+
+def _top_k(doc_vecs: np.ndarray, query_vecs: np.ndarray, k: int) -> list:
+    scores = query_vecs @ doc_vecs.T
+    return [set(np.argsort(-row)[:k]) for row in scores]
+
+
+def _normalize(vecs: np.ndarray) -> np.ndarray:
+    return vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+
+
+def run_benchmark(markdown_path: str, backends: list, batch_size: int, num_threads: int, top_k: int):
+    with open(markdown_path, "r", encoding="utf-8") as f:
+        markdown = f.read()
+    texts = [c["text"] for c in rag.chunk_by_sections(markdown)]
+    logger.info(f"{len(texts)} chunks from {markdown_path} ({len(markdown):,} chars)")
+
+    reference = None
+    rows = []
+    for backend in backends:
+        manager = rag.EmbeddingModelManager(backend=backend, batch_size=batch_size, num_threads=num_threads)
+        load_start = time.time()
+        manager.encode(EMBEDDING_MODEL_NAME, ["warm-up"])
+        load_time = time.time() - load_start
+
+        start = time.time()
+        doc_vecs = _normalize(manager.encode(EMBEDDING_MODEL_NAME, texts))
+        elapsed = time.time() - start
+        query_vecs = _normalize(manager.encode(EMBEDDING_MODEL_NAME, QUERIES))
+
+        hits = _top_k(doc_vecs, query_vecs, top_k)
+        if reference is None:
+            reference = hits  # the first backend is the baseline
+        recall = np.mean([len(h & r) / max(len(r), 1) for h, r in zip(hits, reference)])
+        rows.append((backend, load_time, elapsed, len(texts) / elapsed if elapsed else float("inf"), recall))
+
+    base_rate = rows[0][3]
+    print(f"\n{'backend':<12}{'load s':>9}{'encode s':>10}{'chunks/s':>11}{'speed-up':>10}{f'recall@{top_k}':>11}")
+    for backend, load_time, elapsed, rate, recall in rows:
+        print(f"{backend:<12}{load_time:>9.2f}{elapsed:>10.2f}{rate:>11.1f}{rate / base_rate:>9.2f}x{recall:>11.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark embedding backends")
+    parser.add_argument("markdown", nargs="?", default="debug_markdown.md")
+    parser.add_argument("--backends", default="torch,onnx,onnx-int8")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=EMBEDDING_NUM_THREADS)
+    parser.add_argument("--top-k", type=int, default=5)
+    args = parser.parse_args()
+    run_benchmark(args.markdown, args.backends.split(","), args.batch_size, args.threads, args.top_k)
@@ -1,8 +1,10 @@
 from src.agents.base_agent import BaseAgent
 from src.tools.vision import VisionTool
 from typing import Dict, Any, Optional
+import asyncio
 import json
 import logging
+import re
 
 logger = logging.getLogger("AuditorAgent")
 
@@ -41,10 +43,32 @@ Return a JSON object:
         Red Teams a specific metric against the provided source text.
         Includes VLM Hook for 'Operating Cash Flow'.
         """
+        vlm_failure = self._vlm_checkpoint(metric, image_crop_path)
+        if vlm_failure:
+            return vlm_failure
+        
+        response = self.run(self._audit_prompt(metric, context_text))
+        return self._parse_verdict(response)
+
+    async def verify_metric_async(self, metric: Dict[str, Any], context_text: str, image_crop_path: Optional[str] = None,
+                                  llm_session=None) -> Dict[str, Any]:
+        """
+        verify_metric for the event loop: the VLM checkpoint runs in a worker
+        thread and the LLM call awaits llm_session (an open AsyncLLMSession)
+        when given, else the executor-backed client.
+        """
+        vlm_failure = await asyncio.to_thread(self._vlm_checkpoint, metric, image_crop_path)
+        if vlm_failure:
+            return vlm_failure
+        
+        response = await self.run_async(self._audit_prompt(metric, context_text), session=llm_session)
+        return self._parse_verdict(response)
+
+    def _vlm_checkpoint(self, metric: Dict[str, Any], image_crop_path: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Critical Verification for Cash Flow using Vision; returns the failure verdict, if any."""
         metric_id = metric.get('metric_id', '').lower().replace(" ", "_")
         
         # --- VLM CHECKPOINT ---
-        # Critical Verification for Cash Flow using Vision
         if "operating_cash_flow" in metric_id and image_crop_path:
             logger.info("Triggering VLM Checkpoint for Operating Cash Flow...")
             vlm_result = self.vision_tool.verify_table_data(image_crop_path, metric)
@@ -55,9 +79,12 @@ Return a JSON object:
                     "error_details": f"VLM Verification Failed: {vlm_result.get('error') or 'Visual Mismatch'}",
                     "auditor_note": "Visual inspection contradicts the extraction."
                 }
+        return None
 
+    @staticmethod
+    def _audit_prompt(metric: Dict[str, Any], context_text: str) -> str:
         # --- TEXTUAL VERIFICATION ---
-        prompt = f"""
+        return f"""
 AUDIT TARGET:
 - Metric: {metric.get('metric_id')}
 - Claimed Value: {metric.get('value_raw')} ({metric.get('display_value')})
@@ -72,12 +99,10 @@ TASK:
 Prove the Claimed Value is WRONG.
 If it is correct, begrudgingly admit it.
 """
-        response = self.run(prompt)
-        
+
+    @staticmethod
+    def _parse_verdict(response: str) -> Dict[str, Any]:
         try:
-            import re
-            import json
-            
             # Robust Extraction
             if "```json" in response:
                 clean = response.split("```json")[1].split("```")[0].strip()
@@ -1,60 +1,168 @@
+import os
 import logging
+import threading
+from collections import OrderedDict
 import fitz  # PyMuPDF
-from typing import Dict, Any, Tuple
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
 
 logger = logging.getLogger("AuditorLogic")
 
+# Open documents kept by a verifier (each holds the file handle and parsed xref)
+MAX_OPEN_DOCUMENTS = 4
+
+
+class _PageWords:
+    """One get_text("words") extraction of a page, queried by rectangle."""
+
+    def __init__(self, words: List[tuple], height: float):
+        # words: (x0, y0, x1, y1, word, block_no, line_no, word_no) in reading order, top-left origin
+        self.height = height
+        self.words = [w[4] for w in words]
+        self.lines = [(w[5], w[6]) for w in words]
+        boxes = np.array([w[:4] for w in words], dtype=np.float64).reshape(-1, 4)
+        self.centers_x = (boxes[:, 0] + boxes[:, 2]) / 2
+        self.centers_y = (boxes[:, 1] + boxes[:, 3]) / 2
+
+    def text_in(self, rect: fitz.Rect) -> str:
+        """Words whose centre lies in rect, one output line per text line."""
+        inside = np.flatnonzero(
+            (self.centers_x >= rect.x0) & (self.centers_x <= rect.x1) &
+            (self.centers_y >= rect.y0) & (self.centers_y <= rect.y1)
+        )
+        lines, current = [], None
+        for i in inside.tolist():
+            if self.lines[i] != current:
+                lines.append([])
+                current = self.lines[i]
+            lines[-1].append(self.words[i])
+        return "\n".join(" ".join(line) for line in lines)
+
+
 class CoordinateVerifier:
-    def __init__(self):
-        pass
+    def __init__(self, max_open_documents: int = MAX_OPEN_DOCUMENTS):
+        # (path, mtime, size) -> (fitz.Document, {page_num: _PageWords}), least recently used first
+        self.max_open_documents = max_open_documents
+        self._documents: "OrderedDict[tuple, tuple]" = OrderedDict()
+        # PyMuPDF documents are not safe to use from several threads at once
+        self._lock = threading.RLock()
+
+    def _document(self, pdf_path: str) -> tuple:
+        """Open document and its page-word cache, reopened if the file changed on disk."""
+        stat = os.stat(pdf_path)
+        key = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size)
+        entry = self._documents.get(key)
+        if entry is not None:
+            self._documents.move_to_end(key)
+            return entry
+        entry = (fitz.open(pdf_path), {})
+        self._documents[key] = entry
+        while len(self._documents) > self.max_open_documents:
+            _, (stale_doc, _) = self._documents.popitem(last=False)
+            stale_doc.close()
+        return entry
+
+    def _page_words(self, pdf_path: str, page_num: int) -> _PageWords:
+        doc, pages = self._document(pdf_path)
+        # Page Number Logic (Assumes 1-based provided, convert to 0-based)
+        # PROVENANCE from Docling usually is 1-based.
+        if page_num < 1 or page_num > len(doc):
+            raise IndexError(f"Page {page_num} out of bounds (1-{len(doc)})")
+        if page_num not in pages:
+            page = doc[page_num - 1]
+            pages[page_num] = _PageWords(page.get_text("words", sort=True), page.rect.height)
+        return pages[page_num]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Closes every cached document (the verifier can still be used afterwards)."""
+        with self._lock:
+            for doc, _ in self._documents.values():
+                doc.close()
+            self._documents.clear()
 
     def verify_jump(self, pdf_path: str, page_num: int, bbox: Tuple[float, float, float, float], claimed_text: str) -> Dict[str, Any]:
         """
         Performs the 'JUMP' verification.
-        1. Opens PDF.
-        2. Goes to Page.
+        1. Opens PDF (kept open for later claims).
+        2. Goes to Page (words extracted once per page).
         3. Extracts text at BBox.
         4. Compares with Claim.
         """
         try:
-            doc = fitz.open(pdf_path)
-            
-            # Page Number Logic (Assumes 1-based provided, convert to 0-based)
-            # PROVENANCE from Docling usually is 1-based.
-            if page_num < 1 or page_num > len(doc):
-                return {"match": False, "error": f"Page {page_num} out of bounds (1-{len(doc)})"}
-            
-            page = doc[page_num - 1]
-            
-            # BBox: [x0, y0, x1, y1] or [left, top, right, bottom]
-            # Docling BBox might be different format. 
-            # Docling V2 (TableFormer) usually standard PDF coordinates.
-            # We assume [L, T, R, B] from the parser.
-            # If parser provides [x, y, w, h] (top-left, width, height), we convert.
-            # For this implementation, we assume the parser sends [L, T, R, B].
-            
-            rect = fitz.Rect(bbox)
-            extracted_text = page.get_text("text", clip=rect).strip()
-            
+            with self._lock:
+                page_words = self._page_words(pdf_path, page_num)
+        except IndexError as e:
+            return {"match": False, "error": str(e)}
+        except Exception as e:
+            logger.error(f"JUMP Verification Error: {e}")
+            return {"match": False, "error": str(e)}
+        return self._compare(page_words, page_num, bbox, claimed_text)
+
+    def verify_jumps(self, pdf_path: str, claims: List[Optional[Tuple[int, Any, str]]]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Batch JUMP verification of [(page_num, bbox, claimed_text)] against one PDF.
+        Claims are handled page by page, so each page's words are extracted once.
+        Results are in input order; a None claim gives a None result.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(claims)
+        by_page: Dict[int, List[int]] = {}
+        for i, claim in enumerate(claims):
+            if claim is not None:
+                by_page.setdefault(claim[0], []).append(i)
+
+        for page_num in sorted(by_page):
+            try:
+                with self._lock:
+                    page_words = self._page_words(pdf_path, page_num)
+            except Exception as e:
+                if not isinstance(e, IndexError):
+                    logger.error(f"JUMP Verification Error: {e}")
+                for i in by_page[page_num]:
+                    results[i] = {"match": False, "error": str(e)}
+                continue
+            for i in by_page[page_num]:
+                _, bbox, claimed_text = claims[i]
+                results[i] = self._compare(page_words, page_num, bbox, claimed_text)
+        return results
+
+    def _compare(self, page_words: _PageWords, page_num: int, bbox, claimed_text: str) -> Dict[str, Any]:
+        try:
+            # BBox: [left, top, right, bottom] in PDF points.
+            # The parser emits Docling's bottom-left origin (top above bottom, so T > B);
+            # PyMuPDF measures from the top-left, so those boxes are flipped first.
+            left, top, right, bottom = (float(v) for v in bbox)
+            if top > bottom:
+                top, bottom = page_words.height - top, page_words.height - bottom
+            rect = fitz.Rect(left, top, right, bottom)
+            extracted_text = page_words.text_in(rect).strip()
+
             # Comparison Logic (Case Insensitive, Normalize Whitespace)
+            claim = " ".join(claimed_text.lower().split())
+            truth = " ".join(extracted_text.lower().split())
             is_match = False
-            if claimed_text.lower() in extracted_text.lower():
+            if claim in truth:
                 is_match = True
-            elif extracted_text.lower() in claimed_text.lower():
+            elif truth in claim:
                 is_match = True
-            
+
             # Fuzzy match or "contains" is safer than strict equality due to layout noise
-                
+
             result = {
                 "match": is_match,
                 "ground_truth_text": extracted_text,
                 "claimed_text": claimed_text,
                 "page": page_num
             }
-            
+
             if not is_match:
                 logger.warning(f"JUMP MISMATCH! Claim: '{claimed_text}' vs Truth: '{extracted_text}'")
-                
+
             return result
 
         except Exception as e:
@@ -34,9 +34,11 @@ User Input:
     def get_history(self):
         return self.history
 
-    async def run_async(self, user_input, context=None):
+    async def run_async(self, user_input, context=None, session=None):
         """
         Asynchronously executes the agent's logic.
+        session: an open AsyncLLMSession to await the call on natively;
+        without one the sync client runs in the shared executor.
         """
         full_prompt = f"""
 System Instruction:
@@ -49,7 +51,10 @@ User Input:
 {user_input}
 """
         # Call Async LLM Wrapper
-        response = await generate_text_async(full_prompt)
+        if session is not None:
+            response = await session.generate_text(full_prompt, temperature=self.temperature)
+        else:
+            response = await generate_text_async(full_prompt, temperature=self.temperature)
         
         self.history.append({"user": user_input, "agent": response})
         return response
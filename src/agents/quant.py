@@ -39,12 +39,14 @@ JSON SCHEMA:
 """
         )
 
-    def extract_metrics(self, markdown_content: str, target_metrics: List[str] = None, feedback: str = None) -> Dict[str, Any]:
+    def extract_metrics(self, markdown_content: str, target_metrics: List[str] = None, feedback: str = None,
+                        provenance_map=None) -> Dict[str, Any]:
         """
         Extracts specific metrics from the Markdown content.
         
         Uses RAG (Retrieval-Augmented Generation) to select only relevant
         sections instead of dumping the entire 500k character document.
+        With the parser's provenance_map, retrieved sections are labelled with their pages.
         
         Supports Feedback Injection for One-Strike Recovery.
         """
@@ -62,7 +64,8 @@ JSON SCHEMA:
             relevant_context = get_context_for_metrics(
                 metrics=metrics_list,
                 markdown=markdown_content,
-                max_chars=25000  # ~25k chars vs 500k = 95% reduction
+                max_chars=25000,  # ~25k chars vs 500k = 95% reduction
+                provenance_map=provenance_map
             )
             logger.info(f"RAG retrieved {len(relevant_context)} chars (reduced from {len(markdown_content)})")
         except ImportError:
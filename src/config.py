@@ -22,3 +22,10 @@ DEFAULT_PRICE = 100.0
 DEFAULT_REVENUE = 1_000_000_000.0
 DEFAULT_EPS = 1.0
 DEFAULT_SHARES = 1_000_000  # Fallback: Assume 1M shares to prevent division errors
+
+# --- RAG / Embeddings ---
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+WARM_EMBEDDING_MODEL_ON_STARTUP = True  # Load the encoder in the background when the dashboard starts
+EMBEDDING_BACKEND = "torch"  # "torch", "onnx" or "onnx-int8" (ONNX needs sentence-transformers[onnx])
+EMBEDDING_BATCH_SIZE = 64
+EMBEDDING_NUM_THREADS = 0  # 0 = library default (all cores)
@@ -44,4 +44,10 @@ app.layout = dbc.Container([
 ], fluid=True)
 
 if __name__ == "__main__":
+    # Warm the shared RAG encoder in the serving process only
+    # (with debug=True the reloader parent just watches files).
+    from src.config import WARM_EMBEDDING_MODEL_ON_STARTUP, EMBEDDING_MODEL_NAME
+    if WARM_EMBEDDING_MODEL_ON_STARTUP and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        from src.utils.rag import warm_up_embedding_model
+        warm_up_embedding_model(EMBEDDING_MODEL_NAME, background=True)
     app.run(debug=True, port=8052)
@@ -5,6 +5,9 @@ import json
 import logging
 import os
 from src.utils.pdf_renderer import PDFRenderer
+from src.utils import db
+from src.parsers.provenance import get_provenance_store
+from src.logic.earnings_ui_logic import resolve_metric_location
 
 logger = logging.getLogger("EarningsCallbacks")
 
@@ -14,7 +17,14 @@ logger = logging.getLogger("EarningsCallbacks")
 LOG_PATH = "verification_log.json"
 
 def load_verification_log():
-    """Safely load the verification log"""
+    """Safely load the latest verification report (database first, legacy JSON fallback)"""
+    try:
+        report = db.get_latest_verification_log()
+        if report:
+            return report
+    except Exception as e:
+        logger.error(f"Failed to load log from database: {e}")
+    
     if not os.path.exists(LOG_PATH):
         return None
     try:
@@ -323,9 +333,9 @@ def update_pdf_view_logic(prev_n, next_n, friction_clicks, report_data, page_dat
             metric = log_data['metrics'][idx]
             prov = metric.get('provenance', {})
             
-            # Dynamic JUMP
-            target_page = prov.get('page', 1)
-            target_bbox = prov.get('bbox') 
+            # Dynamic JUMP (snippet-only metrics are anchored via the provenance text index)
+            store = get_provenance_store(pdf_path) if not prov.get('bbox') and prov.get('source_snippet') else None
+            target_page, target_bbox = resolve_metric_location(metric, store)
             
             if target_page:
                 current_page = target_page
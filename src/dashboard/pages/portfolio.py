@@ -2,7 +2,6 @@ import dash
 from dash import html, dcc
 import dash_bootstrap_components as dbc
 import dash_ag_grid as dag
-import pandas as pd
 import plotly.express as px
 import os
 from src.dashboard.components.cards import create_metric_card
@@ -19,8 +18,7 @@ df = data_manager.get_portfolio_df()
 
 # Create charts
 if not df.empty:
-    # Ensure Market Value is numeric
-    df['Market Value'] = pd.to_numeric(df['Market Value'], errors='coerce').fillna(0)
+    # Market Value is already typed float64 by DataManager
     fig_allocation = px.pie(df, values='Market Value', names='Ticker', title='Portfolio Allocation', hole=0.3)
     fig_allocation.update_layout(template="plotly_dark")
 else:
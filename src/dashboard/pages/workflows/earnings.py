@@ -6,6 +6,7 @@ import json
 import os
 import plotly.graph_objects as go
 from src.utils.pdf_renderer import PDFRenderer
+from src.utils import db
 
 # Register Page
 dash.register_page(__name__, path='/earnings-workstation', name="Earnings Workstation")
@@ -23,8 +24,8 @@ def load_data():
         with open(report_path, "r") as f:
             report = json.load(f)
             
-    logs = {}
-    if os.path.exists(log_path):
+    logs = db.get_latest_verification_log() or {}
+    if not logs and os.path.exists(log_path):
          with open(log_path, "r") as f:
             logs = json.load(f)
             
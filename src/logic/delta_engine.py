@@ -1,32 +1,86 @@
 import re
 import logging
 import asyncio
-from typing import Dict, Any, List, Tuple, Set
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Tuple, Set, Optional
+from src.parsers import financial_pdf
 from src.parsers.financial_pdf import FinancialPDFParser
 
 logger = logging.getLogger("DeltaEngine")
 
+def _parse_document(file_path: str, workers: int, use_cache: bool, cache_dir: Optional[str]) -> Dict[str, Any]:
+    """Worker entry point: one full parse (the result is also written to the shared parse cache)."""
+    return FinancialPDFParser(use_cache=use_cache, cache_dir=cache_dir).parse(file_path, workers=workers)
+
 class DeltaParser:
-    def __init__(self):
-        self.parser = FinancialPDFParser()
+    def __init__(self, parser: Optional[FinancialPDFParser] = None):
+        self.parser = parser or FinancialPDFParser()
 
     async def parse_dual_docs(self, current_pdf: str, prior_pdf: str) -> Dict[str, Any]:
         """
         Parses two PDFs to prepare for Delta Analysis.
-        In a real scenario, this would run in parallel executors.
-        For now, we run sequentially but structuring for async.
+        Filings already in the parse cache (typically the prior year) are loaded
+        from it; the rest are parsed concurrently, in separate worker processes
+        when both miss.
         """
-        logger.info(f"Parsing Current: {current_pdf}")
-        current_data = self.parser.parse(current_pdf)
+        paths = {"current": current_pdf, "prior": prior_pdf}
+        results: Dict[str, Optional[Dict[str, Any]]] = {}
+        keys: Dict[str, Optional[str]] = {}
+        for label, path in paths.items():
+            keys[label], results[label] = self._cached(path)
+            if results[label] is not None:
+                logger.info(f"Parse cache hit for {label}: {path}")
+        
+        pending = [label for label in paths if results[label] is None]
+        # Same bytes under two names: parse once
+        if len(pending) == 2 and keys["current"] is not None and keys["current"] == keys["prior"]:
+            pending = ["current"]
         
-        logger.info(f"Parsing Prior: {prior_pdf}")
-        prior_data = self.parser.parse(prior_pdf)
+        if len(pending) == 1:
+            label = pending[0]
+            logger.info(f"Parsing {label.title()}: {paths[label]}")
+            results[label] = await asyncio.to_thread(self.parser.parse, paths[label])
+        elif pending:
+            parsed = await self._parse_in_processes([paths[label] for label in pending])
+            results.update(zip(pending, parsed))
         
         return {
-            "current": current_data,
-            "prior": prior_data
+            "current": results["current"],
+            "prior": results["prior"] if results["prior"] is not None else results["current"]
         }
 
+    def _cached(self, file_path: str) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """(cache key, cached parse) without running the pipeline; (None, None) if the cache is unusable."""
+        if self.parser.cache is None:
+            return None, None
+        try:
+            key = self.parser.cache.key_for(file_path)
+            return key, self.parser.cache.get(key)
+        except OSError as e:
+            logger.warning(f"Parse cache unavailable for {file_path}: {e}")
+            return None, None
+
+    async def _parse_in_processes(self, file_paths: List[str]) -> List[Dict[str, Any]]:
+        """Parses each PDF in its own worker process; falls back to in-process parsing if the pool fails."""
+        cache = self.parser.cache
+        use_cache, cache_dir = cache is not None, cache.cache_dir if cache is not None else None
+        # Each parse may shard its own pages, so split the worker budget between them
+        shard_workers = max(1, financial_pdf.PARSE_WORKERS // len(file_paths))
+        loop = asyncio.get_running_loop()
+        logger.info(f"Parsing {len(file_paths)} filings in parallel: {file_paths}")
+        try:
+            # spawn: forking a process that already holds torch threads can deadlock
+            with ProcessPoolExecutor(max_workers=len(file_paths),
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                return await asyncio.gather(*(
+                    loop.run_in_executor(pool, _parse_document, path, shard_workers, use_cache, cache_dir)
+                    for path in file_paths
+                ))
+        except Exception as e:
+            logger.warning(f"Parallel parse failed ({e}), parsing serially.")
+            return [await asyncio.to_thread(self.parser.parse, path) for path in file_paths]
+
 class VaguenessChecker:
     def __init__(self):
         # Patterns looking for vague qualifiers replacing numbers
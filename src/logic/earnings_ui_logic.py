@@ -21,7 +21,15 @@ logger = logging.getLogger("EarningsUILogic")
 # DATA LOADING
 # ======================================
 def load_verification_log(log_path: str = "verification_log.json") -> Optional[Dict[str, Any]]:
-    """Load verification log from disk."""
+    """Load the latest verification report from the database, falling back to a legacy JSON log."""
+    try:
+        from src.utils import db
+        report = db.get_latest_verification_log()
+        if report:
+            return report
+    except Exception as e:
+        logger.error(f"Failed to load log from database: {e}")
+    
     if not os.path.exists(log_path):
         return None
     try:
@@ -84,8 +92,11 @@ def get_memo_content(report: Optional[Dict[str, Any]]) -> Dict[str, Any]:
     if thesis:
         result["thesis"] = _parse_thesis(thesis)
     
-    # Build friction points for sidebar
-    result["friction_points"] = _build_friction_points(metrics)
+    # Build friction points for sidebar (provenance only loaded if a metric needs anchoring)
+    provenance_store = None
+    if any(not m.get('provenance', {}).get('bbox') and m.get('provenance', {}).get('source_snippet') for m in metrics):
+        provenance_store = _load_provenance_store(log_data.get('pdf_path'))
+    result["friction_points"] = _build_friction_points(metrics, provenance_store)
     
     return result
 
@@ -123,7 +134,35 @@ def _parse_thesis(thesis: Any) -> Dict[str, Any]:
     return {}
 
 
-def _build_friction_points(metrics: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+def _load_provenance_store(pdf_path: Optional[str]):
+    """Indexed provenance for an already-parsed PDF (None if unavailable)."""
+    try:
+        from src.parsers.provenance import get_provenance_store
+        return get_provenance_store(pdf_path)
+    except Exception as e:
+        logger.error(f"Failed to load provenance: {e}")
+        return None
+
+
+def resolve_metric_location(metric: Dict[str, Any], provenance_store=None) -> Tuple[int, Optional[List[float]]]:
+    """
+    (page, bbox) for a metric. When the agent gave a snippet but no bbox, the
+    snippet is located through the provenance store's text index.
+    """
+    provenance = metric.get('provenance', {})
+    page = provenance.get('page', 1)
+    bbox = provenance.get('bbox')
+    snippet = provenance.get('source_snippet')
+    
+    if not bbox and snippet and provenance_store is not None:
+        element = provenance_store.locate(snippet, page=provenance.get('page'))
+        if element:
+            page = element.get('page', page)
+            bbox = element.get('bbox')
+    return page, bbox
+
+
+def _build_friction_points(metrics: List[Dict[str, Any]], provenance_store=None) -> List[Dict[str, Any]]:
     """Extract friction points (metrics needing attention) from metrics list."""
     friction_points = []
     
@@ -133,14 +172,15 @@ def _build_friction_points(metrics: List[Dict[str, Any]]) -> List[Dict[str, Any]
         
         # Flag metrics that had issues
         if status in ['error_detected', 'unverified'] or metric.get('recovery_used'):
+            page, bbox = resolve_metric_location(metric, provenance_store)
             friction_points.append({
                 "index": i,
                 "display_name": metric.get('display_name', f'Metric {i}'),
                 "status": status,
                 "note": verification.get('note', ''),
                 "recovery_used": metric.get('recovery_used', False),
-                "page": metric.get('provenance', {}).get('page', 1),
-                "bbox": metric.get('provenance', {}).get('bbox')
+                "page": page,
+                "bbox": bbox
             })
     
     return friction_points
@@ -1,7 +1,15 @@
 import logging
 import json
+import hashlib
+import os
+import re
+import zlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+
+from src.parsers.provenance import ColumnarProvenance, as_columnar
 
 # Docling Imports (V2)
 try:
@@ -17,6 +25,18 @@ except ImportError:
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("FinancialPDFParser")
 
+# Pipeline settings (also part of the parse cache key)
+PIPELINE_SETTINGS = {
+    "do_ocr": False,
+    "do_table_structure": True,
+    "table_mode": "accurate",
+    "do_cell_text_clean": True,
+    "backend": "DoclingParseV2",
+    # Two-tier parsing: only pages triaged as financial tables go through Docling
+    "two_tier": True,
+    "triage_min_score": 0.45,
+}
+
 def configure_pipeline():
     """
     Configures the Docling Pipeline for Institutional 10-Ks.
@@ -24,14 +44,14 @@ def configure_pipeline():
     High-Fidelity: Hierarchical table structure enabled.
     """
     pipeline_options = PdfPipelineOptions()
-    pipeline_options.do_ocr = False
-    pipeline_options.do_table_structure = True
+    pipeline_options.do_ocr = PIPELINE_SETTINGS["do_ocr"]
+    pipeline_options.do_table_structure = PIPELINE_SETTINGS["do_table_structure"]
     
     # NOTE: User requested 'hierarchical', but the library enum requires 'accurate'.
     # 'accurate' mode utilizes the TableFormer model, which correctly recovers hierarchical headers.
     pipeline_options.table_structure_options = TableStructureOptions(
-        mode="accurate", 
-        do_cell_text_clean=True
+        mode=PIPELINE_SETTINGS["table_mode"], 
+        do_cell_text_clean=PIPELINE_SETTINGS["do_cell_text_clean"]
     )
     
     # Use V2 Backend for coordinate access
@@ -65,32 +85,339 @@ def _get_converter_instance():
     return _CONVERTER_INSTANCE
 
 
+# ======================================
+# CONTENT-ADDRESSED PARSE CACHE
+# ======================================
+# Parses are keyed by SHA-256(PDF bytes) + the pipeline settings, so re-uploads,
+# re-audits and "prior year" delta inputs skip the TableFormer pass entirely.
+# Bump PARSE_CACHE_VERSION when the output format of parse() changes.
+PARSE_CACHE_VERSION = 3
+PARSE_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                               'data', 'parse_cache')
+
+def pipeline_fingerprint() -> str:
+    """Hash of everything besides the PDF bytes that affects parse output."""
+    try:
+        from importlib.metadata import version
+        docling_version = version("docling")
+    except Exception:
+        docling_version = "unknown"
+    config = dict(PIPELINE_SETTINGS, cache_version=PARSE_CACHE_VERSION, docling=docling_version)
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode("utf-8")).hexdigest()
+
+def file_sha256(file_path: str) -> str:
+    """SHA-256 of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class ParseCache:
+    """zlib-compressed JSON parse results under <cache_dir>/<key[:2]>/<key>.json.z"""
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or PARSE_CACHE_DIR
+
+    def key_for(self, file_path: str) -> str:
+        return hashlib.sha256(f"{file_sha256(file_path)}:{pipeline_fingerprint()}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.z")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                result = json.loads(zlib.decompress(f.read()).decode("utf-8"))
+            result["provenance_map"] = ColumnarProvenance.from_payload(result["provenance_map"])
+            return result
+        except Exception as e:
+            logger.warning(f"Discarding unreadable parse cache entry {key[:12]}: {e}")
+            return None
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        result = dict(result, provenance_map=as_columnar(result["provenance_map"]).to_payload())
+        payload = zlib.compress(json.dumps(result).encode("utf-8"), 6)
+        # Write then rename so concurrent readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+
+# ======================================
+# PAGE-SHARDED PARALLEL PARSING
+# ======================================
+# Below this many pages a process pool costs more than it saves
+PARALLEL_PARSE_MIN_PAGES = 40
+# Every worker loads its own converter (TableFormer, ~1-2GB), so keep this modest
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+
+def _page_count(file_path: str) -> int:
+    """Page count from the PDF header (0 if unreadable, which keeps the parse serial)."""
+    try:
+        import fitz
+        with fitz.open(file_path) as pdf:
+            return pdf.page_count
+    except Exception as e:
+        logger.debug(f"Could not count pages of {file_path}: {e}")
+        return 0
+
+def _page_ranges(page_count: int, shards: int) -> List[tuple]:
+    """Contiguous 1-based inclusive page ranges, as Docling's page_range expects."""
+    step = -(-page_count // shards)  # ceil division
+    return [(start, min(start + step - 1, page_count)) for start in range(1, page_count + 1, step)]
+
+# ======================================
+# TWO-TIER PARSING (TEXT-LAYER TRIAGE)
+# ======================================
+# Phrases that mark a page of primary statements (lower case)
+STATEMENT_KEYWORDS = (
+    "consolidated statements of", "consolidated statement of", "balance sheets", "balance sheet",
+    "statements of operations", "statements of income", "statements of cash flows",
+    "statement of financial position", "cash flows from operating activities",
+    "total assets", "total liabilities", "total stockholders", "total shareholders",
+    "earnings per share", "net cash provided by",
+)
+# Numeric-token share at which a page counts as fully "tabular"
+NUMERIC_DENSITY_SATURATION = 0.3
+_NUMERIC_TOKEN = re.compile(r"^[(\-\u2014$€£]*\d[\d,]*(\.\d+)?[)%]*$")
+
+def score_page_text(text: str) -> float:
+    """
+    0..1 likelihood that a page holds financial tables:
+    35% statement keywords (3+ distinct hits saturate), 65% numeric-token density.
+    """
+    lowered = text.lower()
+    tokens = lowered.split()
+    if not tokens:
+        return 0.0
+    keyword_hits = sum(1 for kw in STATEMENT_KEYWORDS if kw in lowered)
+    numeric = sum(1 for token in tokens if _NUMERIC_TOKEN.match(token))
+    density = numeric / len(tokens)
+    return 0.35 * min(1.0, keyword_hits / 3) + 0.65 * min(1.0, density / NUMERIC_DENSITY_SATURATION)
+
+def triage_pages(file_path: str) -> Dict[int, float]:
+    """
+    Scores every page (1-based) from the PDF text layer. Pages without a text layer
+    score 1.0 so they still get the full pipeline. Returns {} if the PDF can't be read.
+    """
+    try:
+        import fitz
+        with fitz.open(file_path) as pdf:
+            scores = {}
+            for i, page in enumerate(pdf):
+                text = page.get_text("text")
+                scores[i + 1] = score_page_text(text) if text.strip() else 1.0
+            return scores
+    except Exception as e:
+        logger.debug(f"Triage unavailable for {file_path}: {e}")
+        return {}
+
+def _page_runs(pages: List[int]) -> List[tuple]:
+    """Sorted page numbers -> contiguous (first, last) runs."""
+    runs = []
+    for page in pages:
+        if runs and page == runs[-1][1] + 1:
+            runs[-1] = (runs[-1][0], page)
+        else:
+            runs.append((page, page))
+    return runs
+
+# Text-tier headings: noticeably larger than the page's body text, short bold
+# lines, or 10-K structure markers ("PART II", "Item 7. Management's ...")
+HEADING_SIZE_RATIO = 1.15
+HEADING_MAX_WORDS = 16
+_STRUCTURE_HEADING = re.compile(r"^(PART\s+[IVX]+\b|ITEM\s+\d+[A-C]?\.)", re.IGNORECASE)
+_BOLD_FLAG = 16
+
+def _body_font_size(blocks: List[dict]) -> float:
+    """Most common font size on the page, weighted by characters."""
+    weights: Dict[float, int] = {}
+    for block in blocks:
+        for line in block.get("lines", []):
+            for span in line["spans"]:
+                size = round(span["size"], 1)
+                weights[size] = weights.get(size, 0) + len(span["text"].strip())
+    return max(weights, key=weights.get) if weights else 0.0
+
+def _is_heading(text: str, spans: List[dict], body_size: float) -> bool:
+    if len(text.split()) > HEADING_MAX_WORDS:
+        return False
+    if _STRUCTURE_HEADING.match(text):
+        return True
+    visible = [span for span in spans if span["text"].strip()]
+    if not visible or text.endswith((".", ",", ";", ":")):
+        return False
+    if body_size and max(span["size"] for span in visible) >= body_size * HEADING_SIZE_RATIO:
+        return True
+    return all(span["flags"] & _BOLD_FLAG for span in visible)
+
+def _extract_text_pages(file_path: str, pages: List[int]) -> List[tuple]:
+    """
+    Cheap tier: PyMuPDF text blocks as paragraphs, headings emitted as "## ..."
+    so section-aware chunking still sees narrative sections. Bboxes are converted
+    to Docling's convention ([L, T, R, B], bottom-left origin, so T > B).
+    """
+    import fitz
+    segments = []
+    with fitz.open(file_path) as pdf:
+        for page_no in pages:
+            page = pdf[page_no - 1]
+            height = page.rect.height
+            blocks = [b for b in page.get_text("dict", sort=True)["blocks"] if b.get("type") == 0]
+            body_size = _body_font_size(blocks)
+            paragraphs, provenance = [], []
+            for block in blocks:
+                spans = [span for line in block["lines"] for span in line["spans"]]
+                text = " ".join(" ".join("".join(span["text"] for span in line["spans"]) for line in block["lines"]).split())
+                if not text:
+                    continue
+                heading = _is_heading(text, spans, body_size)
+                paragraphs.append(f"## {text}" if heading else text)
+                x0, y0, x1, y1 = block["bbox"]
+                provenance.append({
+                    "text_snippet": text[:100],
+                    "full_text": text,
+                    "type": "SectionHeaderItem" if heading else "TextBlock",
+                    "page": page_no,
+                    "bbox": [x0, height - y0, x1, height - y1]
+                })
+            segments.append(((page_no, page_no), {"markdown": "\n\n".join(paragraphs),
+                                                  "provenance_map": ColumnarProvenance.from_entries(provenance)}))
+    return segments
+
+def _stitch(segments: List[tuple]) -> Dict[str, Any]:
+    """[((first, last), result)] -> one result in page order."""
+    segments = sorted(segments, key=lambda seg: seg[0][0])
+    return {
+        "markdown": "\n\n".join(part["markdown"] for _, part in segments if part["markdown"]),
+        "provenance_map": ColumnarProvenance.concat([part["provenance_map"] for _, part in segments])
+    }
+
+def _init_parse_worker():
+    """Process-pool initializer: each worker loads its converter once."""
+    _get_converter_instance()
+
+def _convert_page_range(file_path: str, first_page: int, last_page: int) -> Dict[str, Any]:
+    """Worker entry point: converts one page range of the PDF."""
+    return FinancialPDFParser(use_cache=False)._convert(file_path, page_range=(first_page, last_page))
+
+
 class FinancialPDFParser:
-    def __init__(self):
-        # Use shared singleton instance instead of creating a new one
-        self.converter = _get_converter_instance()
+    def __init__(self, use_cache: bool = True, cache_dir: Optional[str] = None):
+        self.cache = ParseCache(cache_dir) if use_cache else None
+
+    @property
+    def converter(self):
+        # Shared singleton, loaded on first real parse (cache hits never load the models)
+        return _get_converter_instance()
 
-    def parse(self, file_path: str) -> Dict[str, Any]:
+    def parse(self, file_path: str, workers: Optional[int] = None) -> Dict[str, Any]:
         """
         Parses a financial PDF into Semantic Markdown and a Coordinate Map.
+        Results are served from the parse cache when this exact PDF was parsed
+        before with the same pipeline settings.
+        
+        Two-tier: pages are triaged from the text layer, and only pages likely to
+        hold financial tables go through Docling/TableFormer; the rest use
+        PyMuPDF text extraction. When at least PARALLEL_PARSE_MIN_PAGES pages go
+        through Docling they are split into page ranges converted in `workers`
+        processes (default PARSE_WORKERS; 1 = serial).
         Returns:
             {
                 "markdown": str,
-                "provenance_map": List[Dict]  # [{text, page, bbox}]
+                "provenance_map": ColumnarProvenance  # reads as [{text, page, bbox, md_start, md_end}]
             }
         """
-        logger.info(f"Starting High-Fidelity Parse for: {file_path}")
+        cache_key = None
+        if self.cache is not None:
+            try:
+                cache_key = self.cache.key_for(file_path)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    logger.info(f"Parse cache hit for {file_path} ({len(cached['provenance_map'])} elements)")
+                    return cached
+            except OSError as e:
+                logger.warning(f"Parse cache unavailable: {e}")
+        
+        result = self._run_pipeline(file_path, PARSE_WORKERS if workers is None else workers)
+        
+        # Offsets are computed on the final (stitched) markdown
+        result["provenance_map"] = as_columnar(result["provenance_map"])
+        _attach_markdown_offsets(result["markdown"], result["provenance_map"])
+        logger.info(f"Parsing Complete. Extracted {len(result['provenance_map'])} navigable elements.")
+        
+        if cache_key is not None:
+            try:
+                self.cache.put(cache_key, result)
+            except OSError as e:
+                logger.warning(f"Failed to write parse cache: {e}")
+        return result
+
+    def _run_pipeline(self, file_path: str, workers: int) -> Dict[str, Any]:
+        """Chooses between whole-document, sharded and two-tier conversion."""
+        page_count = _page_count(file_path)
+        if not page_count:
+            return self._convert(file_path)
+        
+        table_pages = list(range(1, page_count + 1))
+        if PIPELINE_SETTINGS["two_tier"]:
+            scores = triage_pages(file_path)
+            if scores:
+                table_pages = [p for p, score in sorted(scores.items()) if score >= PIPELINE_SETTINGS["triage_min_score"]]
         
-        doc = self.converter.convert(file_path).document
+        if len(table_pages) == page_count:
+            if workers > 1 and page_count >= PARALLEL_PARSE_MIN_PAGES:
+                return _stitch(self._convert_ranges(file_path, _page_ranges(page_count, workers), workers))
+            return self._convert(file_path)
+        
+        logger.info(f"Triage: {len(table_pages)}/{page_count} pages go through the table pipeline")
+        text_pages = sorted(set(range(1, page_count + 1)) - set(table_pages))
+        ranges = _page_runs(table_pages)
+        parallel = workers > 1 and len(table_pages) >= PARALLEL_PARSE_MIN_PAGES
+        segments = self._convert_ranges(file_path, ranges, workers if parallel else 1)
+        segments.extend(_extract_text_pages(file_path, text_pages))
+        return _stitch(segments)
+
+    def _convert_ranges(self, file_path: str, ranges: List[tuple], workers: int) -> List[tuple]:
+        """
+        Converts page ranges with Docling, in worker processes when workers > 1.
+        Returns [((first, last), result)]; falls back to in-process conversion if the pool fails.
+        """
+        if workers > 1 and len(ranges) > 1:
+            logger.info(f"Parsing {len(ranges)} page ranges across {min(workers, len(ranges))} processes")
+            try:
+                # spawn: forking a process that already holds torch threads can deadlock
+                with ProcessPoolExecutor(max_workers=min(workers, len(ranges)),
+                                         mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=_init_parse_worker) as pool:
+                    futures = [pool.submit(_convert_page_range, file_path, first, last) for first, last in ranges]
+                    return [(r, future.result()) for r, future in zip(ranges, futures)]
+            except Exception as e:
+                logger.warning(f"Parallel parse failed ({e}), parsing serially.")
+        return [(r, self._convert(file_path, page_range=r)) for r in ranges]
+
+    def _convert(self, file_path: str, page_range: Optional[tuple] = None) -> Dict[str, Any]:
+        """Runs the Docling pipeline (the expensive part of parse), optionally on a page range."""
+        logger.info(f"Starting High-Fidelity Parse for: {file_path}" + (f" pages {page_range[0]}-{page_range[1]}" if page_range else ""))
+        
+        if page_range:
+            doc = self.converter.convert(file_path, page_range=page_range).document
+        else:
+            doc = self.converter.convert(file_path).document
         
         # 1. Semantic Markdown Export
         # We ensure strict markdown generation
         markdown_output = doc.export_to_markdown()
         
-        # 2. Coordinate Mapping (The "Chain of Custody")
-        provenance_map = self._extract_provenance(doc)
-        
-        logger.info(f"Parsing Complete. Extracted {len(provenance_map)} navigable elements.")
+        # 2. Coordinate Mapping (The "Chain of Custody"), stored column-wise
+        provenance_map = ColumnarProvenance.from_entries(self._extract_provenance(doc))
         
         return {
             "markdown": markdown_output,
@@ -118,7 +445,7 @@ class FinancialPDFParser:
                     if hasattr(item, "prov") and item.prov:
                         first_prov = item.prov[0]
                         entry["page"] = first_prov.page_no
-                        entry["bbox"] = first_prov.bbox.as_tuple() if hasattr(first_prov.bbox, "as_tuple") else str(first_prov.bbox)
+                        entry["bbox"] = list(first_prov.bbox.as_tuple()) if hasattr(first_prov.bbox, "as_tuple") else str(first_prov.bbox)
                         
                     provenance.append(entry)
                     
@@ -128,6 +455,39 @@ class FinancialPDFParser:
                 
         return provenance
 
+# How far ahead of the previous match to look for the next element's text.
+# Elements are exported in reading order, so a miss only costs one window.
+OFFSET_SEARCH_WINDOW = 20000
+
+def _attach_markdown_offsets(markdown: str, provenance) -> None:
+    """
+    Records where each element's text sits in the exported markdown (md_start/md_end,
+    -1 if not found), so RAG chunks can be mapped back to pages and bboxes.
+    Accepts ColumnarProvenance (writes md_spans) or a list of dicts (writes the keys).
+    """
+    if isinstance(provenance, ColumnarProvenance):
+        cursor = 0
+        for i in range(len(provenance)):
+            text = provenance.full_text(i)
+            pos = markdown.find(text, cursor, cursor + OFFSET_SEARCH_WINDOW + len(text)) if text else -1
+            if pos == -1:
+                provenance.md_spans[i] = (-1, -1)
+                continue
+            provenance.md_spans[i] = (pos, pos + len(text))
+            cursor = pos + len(text)
+        return
+    
+    cursor = 0
+    for entry in provenance:
+        text = entry.get("full_text", "")
+        pos = markdown.find(text, cursor, cursor + OFFSET_SEARCH_WINDOW + len(text)) if text else -1
+        if pos == -1:
+            entry["md_start"] = entry["md_end"] = -1
+            continue
+        entry["md_start"] = pos
+        entry["md_end"] = pos + len(text)
+        cursor = entry["md_end"]
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1:
@@ -1,6 +1,8 @@
 import re
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Union
+
+from src.parsers.provenance import ProvenanceStore, as_provenance_store
 
 logger = logging.getLogger("CrossRefIndexer")
 
@@ -11,7 +13,7 @@ class CrossReferenceIndexer:
         # Headers: "Note 12. Income Taxes", "Note 12 - Revenue"
         self.target_pattern = re.compile(r"^#*\s*Note\s+(\d+)[.\-]", re.IGNORECASE | re.MULTILINE)
 
-    def build_index(self, markdown_text: str, provenance_map: List[Dict]) -> Dict[str, Any]:
+    def build_index(self, markdown_text: str, provenance_map: Union[List[Dict], ProvenanceStore]) -> Dict[str, Any]:
         """
         Scans the document for 'Targets' (e.g. 'Note 12. Income Taxes') and builds a map.
         Returns:
@@ -26,9 +28,13 @@ class CrossReferenceIndexer:
         index = {}
         
         # 1. Find Targets in Markdown (Quick Scan)
-        # We prefer using the provenance map to get exact coordinates
+        # We prefer using the provenance map to get exact coordinates.
+        # Only elements containing the token "note" can be headers, so the
+        # regex runs on that posting list instead of every element.
+        store = as_provenance_store(provenance_map)
         
-        for item in provenance_map:
+        for element_id in store.elements_with_token("note"):
+            item = store[element_id]
             text = item.get("full_text", "")
             match = self.target_pattern.search(text)
             if match:
@@ -0,0 +1,369 @@
+import os
+import re
+import base64
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Iterable, Union
+
+import numpy as np
+
+logger = logging.getLogger("ProvenanceStore")
+
+# Length of the "text_snippet" field (a prefix of full_text, so never stored)
+SNIPPET_LENGTH = 100
+COLUMNAR_FORMAT = "columnar-v1"
+
+
+# ======================================
+# COLUMNAR PROVENANCE
+# ======================================
+class ColumnarProvenance:
+    """
+    Struct-of-arrays provenance map. One element per parsed text item:
+
+    - pages:     int32 [n]         (-1 = unknown)
+    - bboxes:    float64 [n, 4]    [L, T, R, B], bottom-left origin (Docling); NaN rows = no bbox
+    - text:      str               all full_text values concatenated
+    - offsets:   int64 [n + 1]     element i is text[offsets[i]:offsets[i + 1]]
+    - type_codes uint16 [n]        index into type_names (interned)
+    - md_spans:  int64 [n, 2]      md_start / md_end (-1 = not in the markdown)
+
+    Indexing and iteration yield plain dicts in the legacy shape
+    ({text_snippet, full_text, type, page, bbox, md_start, md_end}), built on
+    access. They are copies: writes to them do not reach the columns.
+    """
+
+    def __init__(self, pages, bboxes, text: str, offsets, type_codes, type_names: List[str], md_spans=None):
+        self.pages = np.asarray(pages, dtype=np.int32)
+        self.bboxes = np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+        self.text = text
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.type_codes = np.asarray(type_codes, dtype=np.uint16)
+        self.type_names = list(type_names)
+        n = len(self.pages)
+        self.md_spans = (np.full((n, 2), -1, dtype=np.int64) if md_spans is None
+                         else np.array(md_spans, dtype=np.int64).reshape(-1, 2))  # copy: offsets are written in place
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, Any]]) -> "ColumnarProvenance":
+        """Builds the columns from legacy provenance dicts (a bbox that is not 4 numbers is dropped)."""
+        pages, bboxes, texts, codes, md_spans = [], [], [], [], []
+        type_index: Dict[str, int] = {}
+        for entry in entries:
+            full_text = entry.get("full_text", "")
+            texts.append(full_text)
+            pages.append(entry.get("page", -1))
+            rect = entry.get("bbox")
+            try:
+                bboxes.append([float(v) for v in rect] if isinstance(rect, (list, tuple)) and len(rect) == 4
+                              else [np.nan] * 4)
+            except (TypeError, ValueError):
+                bboxes.append([np.nan] * 4)
+            codes.append(type_index.setdefault(entry.get("type", ""), len(type_index)))
+            md_spans.append([entry.get("md_start", -1), entry.get("md_end", -1)])
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum([len(t) for t in texts], out=offsets[1:])
+        return cls(pages, np.array(bboxes, dtype=np.float64).reshape(-1, 4), "".join(texts), offsets, codes,
+                   list(type_index), np.array(md_spans, dtype=np.int64).reshape(-1, 2))
+
+    @classmethod
+    def concat(cls, parts: List[Union["ColumnarProvenance", List[Dict[str, Any]]]]) -> "ColumnarProvenance":
+        """Joins provenance maps (columnar or legacy lists) in the given order."""
+        parts = [as_columnar(part) for part in parts]
+        type_index: Dict[str, int] = {}
+        codes, offsets, base = [], [np.zeros(1, dtype=np.int64)], 0
+        for part in parts:
+            remap = np.array([type_index.setdefault(name, len(type_index)) for name in part.type_names] or [0],
+                             dtype=np.uint16)
+            codes.append(remap[part.type_codes])
+            offsets.append(part.offsets[1:] + base)
+            base += len(part.text)
+        return cls(
+            np.concatenate([p.pages for p in parts]) if parts else [],
+            np.concatenate([p.bboxes for p in parts]) if parts else np.empty((0, 4)),
+            "".join(p.text for p in parts),
+            np.concatenate(offsets),
+            np.concatenate(codes) if parts else [],
+            list(type_index),
+            np.concatenate([p.md_spans for p in parts]) if parts else None,
+        )
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def full_text(self, i: int) -> str:
+        return self.text[self.offsets[i]:self.offsets[i + 1]]
+
+    def bbox(self, i: int) -> List[float]:
+        row = self.bboxes[i]
+        return [] if np.isnan(row).any() else row.tolist()
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("provenance index out of range")
+        full_text = self.full_text(i)
+        return {
+            "text_snippet": full_text[:SNIPPET_LENGTH],
+            "full_text": full_text,
+            "type": self.type_names[self.type_codes[i]] if self.type_names else "",
+            "page": int(self.pages[i]),
+            "bbox": self.bbox(i),
+            "md_start": int(self.md_spans[i, 0]),
+            "md_end": int(self.md_spans[i, 1]),
+        }
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, ColumnarProvenance):
+            return (self.text == other.text and np.array_equal(self.offsets, other.offsets)
+                    and np.array_equal(self.pages, other.pages)
+                    and np.array_equal(self.bboxes, other.bboxes, equal_nan=True)
+                    and [self.type_names[c] for c in self.type_codes] == [other.type_names[c] for c in other.type_codes]
+                    and np.array_equal(self.md_spans, other.md_spans))
+        if isinstance(other, list):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def to_entries(self) -> List[Dict[str, Any]]:
+        """Legacy list-of-dicts form."""
+        return list(self)
+
+    def to_payload(self) -> Dict[str, Any]:
+        """JSON-safe form: the text buffer as-is, each array as base64 little-endian bytes."""
+        def pack(array, dtype):
+            return base64.b64encode(np.ascontiguousarray(array, dtype=dtype).tobytes()).decode("ascii")
+        return {
+            "format": COLUMNAR_FORMAT,
+            "count": len(self),
+            "text": self.text,
+            "offsets": pack(self.offsets, "<i8"),
+            "pages": pack(self.pages, "<i4"),
+            "bboxes": pack(self.bboxes, "<f8"),
+            "type_codes": pack(self.type_codes, "<u2"),
+            "type_names": self.type_names,
+            "md_spans": pack(self.md_spans, "<i8"),
+        }
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "ColumnarProvenance":
+        if payload.get("format") != COLUMNAR_FORMAT:
+            raise ValueError(f"Unknown provenance format: {payload.get('format')}")
+
+        def unpack(key, dtype):
+            return np.frombuffer(base64.b64decode(payload[key]), dtype=dtype)
+        return cls(unpack("pages", "<i4"), unpack("bboxes", "<f8"), payload["text"], unpack("offsets", "<i8"),
+                   unpack("type_codes", "<u2"), payload["type_names"], unpack("md_spans", "<i8"))
+
+
+def as_columnar(provenance) -> ColumnarProvenance:
+    """Accepts ColumnarProvenance, a legacy list of dicts, or a serialized payload."""
+    if isinstance(provenance, ColumnarProvenance):
+        return provenance
+    if isinstance(provenance, dict):
+        return ColumnarProvenance.from_payload(provenance)
+    return ColumnarProvenance.from_entries(provenance or [])
+
+
+# ======================================
+# INDEXED STORE
+# ======================================
+# Grid cell edge in PDF points (a US Letter page is 612 x 792 -> ~10 x 13 cells)
+GRID_CELL_SIZE = 64.0
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _as_rect(bbox) -> Optional[tuple]:
+    """[L, T, R, B] -> (x0, y0, x1, y1) with x0 <= x1, y0 <= y1; None if not a usable box."""
+    if not isinstance(bbox, (list, tuple)) or len(bbox) != 4:
+        return None
+    try:
+        l, t, r, b = (float(v) for v in bbox)
+    except (TypeError, ValueError):
+        return None
+    return (min(l, r), min(t, b), max(l, r), max(t, b))
+
+
+class ProvenanceStore:
+    """
+    Indexed view over the parser's provenance map ([{full_text, page, bbox, ...}]).
+
+    - Spatial: a uniform grid per page maps each cell to the elements whose bbox
+      overlaps it, so point / rectangle lookups only test a handful of elements.
+    - Text: an inverted index from token to element ids; a string lookup
+      intersects the posting lists of its tokens and then confirms the
+      (whitespace/case-normalised) substring on those candidates only.
+
+    Element ids are positions in the provenance map; the elements themselves
+    are kept in columnar form (see ColumnarProvenance).
+    """
+
+    def __init__(self, provenance_map, cell_size: float = GRID_CELL_SIZE):
+        self.entries = as_columnar(provenance_map)
+        self.cell_size = cell_size
+        self._grid: Dict[tuple, List[int]] = {}
+        self._pages: Dict[int, List[int]] = {}
+        self._postings: Dict[str, List[int]] = {}
+
+        columns = self.entries
+        # Normalised (x0, y0, x1, y1); NaN rows (no bbox) never enter the grid
+        self._rects = np.column_stack([
+            np.minimum(columns.bboxes[:, 0], columns.bboxes[:, 2]), np.minimum(columns.bboxes[:, 1], columns.bboxes[:, 3]),
+            np.maximum(columns.bboxes[:, 0], columns.bboxes[:, 2]), np.maximum(columns.bboxes[:, 1], columns.bboxes[:, 3]),
+        ]) if len(columns) else np.empty((0, 4))
+        has_rect = ~np.isnan(self._rects).any(axis=1)
+
+        for element_id, page in enumerate(columns.pages.tolist()):
+            self._pages.setdefault(page, []).append(element_id)
+            if has_rect[element_id]:
+                for cell in self._cells(page, self._rects[element_id].tolist()):
+                    self._grid.setdefault(cell, []).append(element_id)
+            for token in set(_tokens(columns.full_text(element_id))):
+                self._postings.setdefault(token, []).append(element_id)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, element_id: int) -> Dict[str, Any]:
+        return self.entries[element_id]
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def _cells(self, page: int, rect: tuple) -> Iterable[tuple]:
+        size = self.cell_size
+        x0, y0, x1, y1 = rect
+        for gx in range(int(x0 // size), int(x1 // size) + 1):
+            for gy in range(int(y0 // size), int(y1 // size) + 1):
+                yield (page, gx, gy)
+
+    # ---------- Spatial lookups ----------
+    def elements_on_page(self, page: int) -> List[int]:
+        return self._pages.get(page, [])
+
+    def elements_at(self, page: int, x: float, y: float) -> List[int]:
+        """Ids of elements whose bbox contains the point (smallest box first)."""
+        cell = (page, int(x // self.cell_size), int(y // self.cell_size))
+        candidates = np.array(self._grid.get(cell, []), dtype=np.int64)
+        if not len(candidates):
+            return []
+        rects = self._rects[candidates]
+        inside = (rects[:, 0] <= x) & (x <= rects[:, 2]) & (rects[:, 1] <= y) & (y <= rects[:, 3])
+        hits, rects = candidates[inside], rects[inside]
+        areas = (rects[:, 2] - rects[:, 0]) * (rects[:, 3] - rects[:, 1])
+        return hits[np.argsort(areas, kind="stable")].tolist()
+
+    def elements_in(self, page: int, bbox) -> List[int]:
+        """Ids of elements whose bbox intersects the rectangle, in document order."""
+        rect = _as_rect(bbox)
+        if rect is None:
+            return []
+        x0, y0, x1, y1 = rect
+        candidates = np.unique(np.array([i for cell in self._cells(page, rect) for i in self._grid.get(cell, [])],
+                                        dtype=np.int64))
+        if not len(candidates):
+            return []
+        r = self._rects[candidates]
+        overlaps = (r[:, 0] <= x1) & (x0 <= r[:, 2]) & (r[:, 1] <= y1) & (y0 <= r[:, 3])
+        return candidates[overlaps].tolist()
+
+    # ---------- Text lookups ----------
+    def elements_with_token(self, token: str) -> List[int]:
+        """Ids of elements containing the whole token (case-insensitive), in document order."""
+        return self._postings.get(token.lower(), [])
+
+    def find_text(self, text: str, page: Optional[int] = None) -> List[int]:
+        """
+        Ids of elements whose text contains `text` (case- and whitespace-insensitive,
+        matched on whole tokens), in document order; optionally on one page only.
+        """
+        query_tokens = list(dict.fromkeys(_tokens(text)))
+        if not query_tokens:
+            return []
+        postings = sorted((self._postings.get(t, []) for t in query_tokens), key=len)
+        if not postings[0]:
+            return []
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        needle = _normalize(text)
+        return [
+            i for i in sorted(candidates)
+            if (page is None or self.entries.pages[i] == page)
+            and needle in _normalize(self.entries.full_text(i))
+        ]
+
+    def locate(self, text: str, page: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """First element containing `text` (preferring the given page), or None."""
+        if page is not None:
+            hits = self.find_text(text, page=page)
+            if hits:
+                return self.entries[hits[0]]
+        hits = self.find_text(text)
+        return self.entries[hits[0]] if hits else None
+
+
+def as_provenance_store(provenance) -> ProvenanceStore:
+    """Accepts a ProvenanceStore or a raw provenance list."""
+    if isinstance(provenance, ProvenanceStore):
+        return provenance
+    return ProvenanceStore(provenance or [])
+
+
+# ======================================
+# STORES FOR PREVIOUSLY PARSED PDFs
+# ======================================
+# The dashboard only has the report (pdf_path + metrics); the provenance map is
+# recovered from the parse cache without re-parsing.
+_STORE_LRU_SIZE = 4
+_store_lru: "OrderedDict[tuple, ProvenanceStore]" = OrderedDict()
+_store_lock = threading.Lock()
+
+
+def get_provenance_store(pdf_path: Optional[str], cache_dir: Optional[str] = None) -> Optional[ProvenanceStore]:
+    """ProvenanceStore for a PDF that has been parsed before (None if not in the parse cache)."""
+    if not pdf_path or not os.path.exists(pdf_path):
+        return None
+    stat = os.stat(pdf_path)
+    # Keyed on path + mtime + size so repeat dashboard callbacks skip re-hashing the PDF
+    lru_key = (os.path.abspath(pdf_path), stat.st_mtime_ns, stat.st_size, cache_dir)
+    with _store_lock:
+        store = _store_lru.get(lru_key)
+        if store is not None:
+            _store_lru.move_to_end(lru_key)
+            return store
+
+    try:
+        from src.parsers.financial_pdf import ParseCache
+        cache = ParseCache(cache_dir)
+        cached = cache.get(cache.key_for(pdf_path))
+    except Exception as e:
+        logger.warning(f"Could not load provenance for {pdf_path}: {e}")
+        return None
+    if cached is None:
+        return None
+
+    store = ProvenanceStore(cached.get("provenance_map") or [])
+    with _store_lock:
+        _store_lru[lru_key] = store
+        while len(_store_lru) > _STORE_LRU_SIZE:
+            _store_lru.popitem(last=False)
+    return store
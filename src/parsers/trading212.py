@@ -1,26 +1,69 @@
-
+import os
+import hashlib
 import pdfplumber
 import re
+from concurrent.futures import ProcessPoolExecutor
+
+# Below this many pages a process pool costs more than it saves
+PARALLEL_PAGE_THRESHOLD = 8
+
+TEXT_TABLE_SETTINGS = {"vertical_strategy": "text", "horizontal_strategy": "text"}
+
+# Fixed field order used to build dedup keys (records are flat dicts of scalars)
+HOLDING_FIELDS = ("Ticker", "ISIN", "Qty", "Market Value")
+TRANSACTION_FIELDS = ("Date", "Action", "Ticker", "Total", "Raw")
+
+
+def _new_page_result():
+    # page_hashes: fingerprints of parsed pages without open positions (safe to skip next time)
+    return {"holdings": [], "transactions": [], "page_hashes": [], "pages_skipped": 0}
+
+
+def _merge_page_result(target, part):
+    target["holdings"].extend(part["holdings"])
+    target["transactions"].extend(part["transactions"])
+    target["page_hashes"].extend(part["page_hashes"])
+    target["pages_skipped"] += part["pages_skipped"]
+
+
+def _parse_page_range(file_path, start, stop, skip_page_hashes=None):
+    """
+    Worker: opens the PDF once and extracts holdings/transactions from pages [start, stop).
+    Module-level so it can be pickled into a process pool.
+    """
+    parser = Trading212Parser()
+    result = _new_page_result()
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages[start:stop]:
+            parser._parse_page(page, result, skip_page_hashes=skip_page_hashes)
+    return result
+
 
 class Trading212Parser:
     """
     Parser for Trading212 Statements using pdfplumber (Visual Extraction).
-    Implements multi-pass strategy (Default + Text-Based) to handle variable table formats.
+    Each page is classified once: the default (ruled) table strategy runs first and
+    the text/whitespace strategy only on pages where it finds no usable table.
+    Large statements are split into page ranges across a process pool.
     """
 
-    def parse(self, file_path):
+    def parse(self, file_path, max_workers=None, skip_page_hashes=None):
         """
         Parses the PDF and returns structured data.
+        skip_page_hashes: fingerprints of pages already imported; matching pages are not
+        table-extracted. When given, fingerprints of parsed pages are returned in "page_hashes".
         """
         data = {
             "summary": {},
             "holdings": [],
             "transactions": []
         }
+        pages = _new_page_result()
 
         print(f"DEBUG: [Trading212Parser] Opening {file_path} with pdfplumber...")
         
         with pdfplumber.open(file_path) as pdf:
+            page_count = len(pdf.pages)
             # 1. Extract Summary from Page 1 (Try tables first, then text)
             first_page = pdf.pages[0]
             summary_tables = first_page.extract_tables()
@@ -29,53 +72,96 @@ class Trading212Parser:
             if not data["summary"].get("Account Value"):
                  data["summary"].update(self._extract_summary_text(first_page.extract_text()))
 
-            # 2. Extract Data Tables across all pages using Multi-Pass Strategy
-            # Pass 1: Standard Table Extraction (Lines) - Good for boxed tables
-            # Pass 2: Text/Whitespace Extraction - Good for open tables or when lines are missing
-            
-            # We collect all candidate tables from all pages and all strategies
-            candidate_tables = []
-            
-            for i, page in enumerate(pdf.pages):
-                # Strategy 1: Default
-                t1 = page.extract_tables()
-                if t1:
-                    # print(f"DEBUG: Page {i} - Default found {len(t1)} tables")
-                    for t in t1: candidate_tables.append({"type": "DEFAULT", "data": t})
-                
-                # Strategy 2: Text-based (simulate columns by whitespace)
-                t2 = page.extract_tables({"vertical_strategy": "text", "horizontal_strategy": "text"})
-                if t2:
-                    # print(f"DEBUG: Page {i} - Text found {len(t2)} tables")
-                    for t in t2: candidate_tables.append({"type": "TEXT", "data": t})
-
-            # Process candidates
-            for entry in candidate_tables:
-                table = entry['data']
-                if not table: continue
-                
-                table_type = self._identify_table_type(table)
-                
-                if table_type == "HOLDINGS":
-                    data["holdings"].extend(self._parse_holdings_table(table))
-                        
-                elif table_type == "TRANSACTIONS":
-                    data["transactions"].extend(self._parse_transactions_table(table))
+            # Small statements: parse in-process, reusing the open document
+            parallel = page_count >= PARALLEL_PAGE_THRESHOLD and max_workers != 1
+            if not parallel:
+                for page in pdf.pages:
+                    self._parse_page(page, pages, summary_tables if page is first_page else None, skip_page_hashes)
+
+        # 2. Large statements: contiguous page ranges in parallel, merged in page order
+        if parallel:
+            pages = self._parse_pages_parallel(file_path, page_count, max_workers, skip_page_hashes)
 
-        # Post-process: Deduplicate Transactions based on content
-        data["transactions"] = self._deduplicate_dicts(data["transactions"])
-        data["holdings"] = self._deduplicate_dicts(data["holdings"])
+        # Post-process: Deduplicate on hashed row content
+        data["transactions"] = self._deduplicate_dicts(pages["transactions"], TRANSACTION_FIELDS)
+        data["holdings"] = self._deduplicate_dicts(pages["holdings"], HOLDING_FIELDS)
+        data["page_count"] = page_count
+        data["page_hashes"] = pages["page_hashes"]
+        data["pages_skipped"] = pages["pages_skipped"]
 
         return data
 
-    def _deduplicate_dicts(self, dict_list):
-        """Helper to remove exact duplicate dictionary entries."""
+    def _parse_pages_parallel(self, file_path, page_count, max_workers=None, skip_page_hashes=None):
+        """Fans page ranges out to worker processes; falls back to serial on pool failure."""
+        workers = max(1, min(max_workers or os.cpu_count() or 1, page_count))
+        step = -(-page_count // workers)  # ceil division
+        ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        
+        result = _new_page_result()
+        try:
+            with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+                futures = [pool.submit(_parse_page_range, file_path, start, stop, skip_page_hashes) for start, stop in ranges]
+                for future in futures:
+                    _merge_page_result(result, future.result())
+        except Exception as e:
+            print(f"DEBUG: [Trading212Parser] Process pool unavailable ({e}), parsing serially.")
+            result = _parse_page_range(file_path, 0, page_count, skip_page_hashes)
+        return result
+
+    def _page_fingerprint(self, page):
+        """Content fingerprint of a page (text layer), stable across re-exports of the same period."""
+        return hashlib.sha256((page.extract_text() or "").encode("utf-8")).hexdigest()
+
+    def _parse_page(self, page, result, default_tables=None, skip_page_hashes=None):
+        """
+        Single-pass page handler. Classifies each table once and only falls back to the
+        text strategy when the default strategy yields no holdings/transactions table.
+        """
+        page_hash = None
+        if skip_page_hashes is not None:
+            page_hash = self._page_fingerprint(page)
+            if page_hash in skip_page_hashes:
+                result["pages_skipped"] += 1
+                return
+        
+        holdings, transactions = [], []
+        
+        tables = default_tables if default_tables is not None else page.extract_tables()
+        found = self._collect_tables(tables, holdings, transactions)
+        
+        if not found:
+            self._collect_tables(page.extract_tables(TEXT_TABLE_SETTINGS), holdings, transactions)
+        
+        result["holdings"].extend(holdings)
+        result["transactions"].extend(transactions)
+        # Pages with open positions are always re-read: holdings are a point-in-time snapshot
+        if page_hash and not holdings:
+            result["page_hashes"].append(page_hash)
+
+    def _collect_tables(self, tables, holdings, transactions):
+        """Classifies and parses tables into the given lists. Returns True if any table was usable."""
+        found = False
+        for table in tables or []:
+            if not table: continue
+            
+            table_type = self._identify_table_type(table)
+            
+            if table_type == "HOLDINGS":
+                holdings.extend(self._parse_holdings_table(table))
+                found = True
+            elif table_type == "TRANSACTIONS":
+                transactions.extend(self._parse_transactions_table(table))
+                found = True
+        return found
+
+    def _deduplicate_dicts(self, dict_list, fields=None):
+        """Helper to remove exact duplicate dictionary entries (set lookup on values in fixed field order)."""
         seen = set()
         new_l = []
         for d in dict_list:
-            t = tuple(sorted(d.items()))
-            if t not in seen:
-                seen.add(t)
+            key = tuple(d.get(f) for f in fields) if fields else tuple(sorted(d.items()))
+            if key not in seen:
+                seen.add(key)
                 new_l.append(d)
         return new_l
 
@@ -256,10 +342,21 @@ class Trading212Parser:
                 # ANCHOR 4: Total (End of row)
                 total_val = self._clean_money(clean[-1])
 
+                # Quantity and price: the first numeric cells between the ISIN and the total
+                numbers = []
+                for cell in clean[max(isin_idx, 0) + 1:-1]:
+                    try:
+                        numbers.append(float(cell.replace(",", "")))
+                    except ValueError:
+                        pass
+
                 records.append({
                     "Date": date_str,
                     "Action": action,
                     "Ticker": ticker,
+                    "ISIN": clean[isin_idx] if isin_idx != -1 else None,
+                    "Qty": numbers[0] if numbers else None,
+                    "Price": numbers[1] if len(numbers) > 1 else None,
                     "Total": total_val,
                     "Raw": str(clean)
                 })
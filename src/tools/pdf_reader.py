@@ -1,15 +1,41 @@
 import PyPDF2
 
-def read_pdf(file_path):
+def iter_pdf_pages(file_path):
+    """
+    Yields the text of each page lazily (the file stays open only while iterating).
+    """
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for page in reader.pages:
+            yield page.extract_text() or ""
+
+def read_pdf(file_path, stop_after_section=None, section_end_marker="Total"):
     """
     Extracts text from a PDF file.
+
+    stop_after_section: optional section title (e.g. "Open positions"). Reading stops at the
+    end of the page where that section ends, i.e. the first line containing
+    section_end_marker after the title. If the section never ends, the whole file is read.
     """
     try:
-        with open(file_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+        parts = []
+        in_section = False
+        for text in iter_pdf_pages(file_path):
+            parts.append(text)
+            if stop_after_section and _section_ends(text, stop_after_section, section_end_marker, in_section):
+                break
+            if stop_after_section and not in_section:
+                in_section = stop_after_section in text
+        # Join once instead of growing a string page by page
+        return "\n".join(parts) + "\n" if parts else ""
     except Exception as e:
         return f"Error reading PDF: {str(e)}"
+
+def _section_ends(text, section, end_marker, in_section):
+    """True if the section (already open, or opened on this page) closes on this page."""
+    for line in text.split('\n'):
+        if section in line:
+            in_section = True
+        elif in_section and end_marker in line:
+            return True
+    return False
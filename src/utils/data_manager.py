@@ -5,8 +5,13 @@ Thread-safe data persistence using SQLite instead of CSV/JSON.
 Maintains backward-compatible API for existing callers.
 """
 import pandas as pd
+import numpy as np
 import os
+import re
+import hashlib
 import logging
+import threading
+from collections import Counter
 from typing import Dict, Any, List, Optional
 
 # Import SQLite database layer
@@ -14,6 +19,108 @@ from src.utils import db
 
 logger = logging.getLogger("DataManager")
 
+# DB column -> legacy DataFrame column
+HOLDINGS_COLUMN_MAP = {
+    'ticker': 'Ticker',
+    'isin': 'ISIN',
+    'currency': 'Currency',
+    'shares': 'Shares',
+    'opening_price': 'Opening Price',
+    'current_price': 'Current Price',
+    'unrealised_pl': 'Unrealised P/L',
+    'value_source': 'Value (Source)',
+    'fx_rate': 'FX Rate',
+    'unrealised_pl_base': 'Unrealised P/L (Base)',
+    'market_value': 'Market Value',
+    'allocation_pct': 'Allocation %'
+}
+
+# Compact dtypes: repeated strings as categoricals, money in float64,
+# percentages in float32.
+HOLDINGS_DTYPES = {
+    'Ticker': 'category',
+    'ISIN': 'object',
+    'Currency': 'category',
+    'Shares': 'float64',
+    'Opening Price': 'float64',
+    'Current Price': 'float64',
+    'Unrealised P/L': 'float64',
+    'Value (Source)': 'float64',
+    'FX Rate': 'float64',
+    'Unrealised P/L (Base)': 'float64',
+    'Market Value': 'float64',
+    'Allocation %': 'float32'
+}
+
+
+def file_fingerprint(file_path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of the file bytes, streamed in chunks."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _number_key(value: Any) -> str:
+    try:
+        return f"{float(value):.4f}"
+    except (TypeError, ValueError):
+        return ''
+
+
+def transaction_identity(trans: Dict[str, Any]) -> str:
+    """
+    Layout-independent identity of a parsed transaction: normalized date, ISIN, action,
+    quantity, price and total (never the raw cells, which depend on the table strategy).
+    """
+    date = str(trans.get('Date') or '')
+    day = re.search(r"\d{4}-\d{2}-\d{2}", date)
+    return "|".join([
+        day.group(0) if day else date.strip(),
+        str(trans.get('ISIN') or '').strip().upper(),
+        str(trans.get('Action') or '').strip().lower(),
+        _number_key(trans.get('Qty')),
+        _number_key(trans.get('Price')),
+        _number_key(trans.get('Total')),
+    ])
+
+
+def transaction_fingerprint(trans: Dict[str, Any], occurrence: int = 0) -> str:
+    """
+    Stable identity for a parsed transaction. Trading 212 statements carry no order id;
+    occurrence (the how-many-th identical row within one statement) keeps genuinely
+    identical same-day fills distinct, while re-imports of the statement still collide.
+    """
+    basis = f"{transaction_identity(trans)}#{occurrence}"
+    return hashlib.sha256(basis.encode('utf-8')).hexdigest()
+
+
+def _to_db_transaction(trans: Dict[str, Any], occurrence: int = 0) -> Dict[str, Any]:
+    """Maps a parser transaction record to the transactions table schema."""
+    return {
+        'date': trans.get('Date', ''),
+        'type': trans.get('Action', ''),
+        'ticker': trans.get('Ticker', ''),
+        'isin': trans.get('ISIN'),
+        'shares': trans.get('Qty') or 0,
+        'price': trans.get('Price') or 0,
+        'amount': trans.get('Total', 0),
+        'notes': trans.get('Raw', ''),
+        'fingerprint': transaction_fingerprint(trans, occurrence)
+    }
+
+
+def build_holdings_frame(holdings: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Builds the typed holdings DataFrame from DB rows in one pass (no per-column renames)."""
+    if not holdings:
+        return pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in HOLDINGS_DTYPES.items()})
+    df = pd.DataFrame.from_records(holdings, columns=list(HOLDINGS_COLUMN_MAP))
+    df.columns = list(HOLDINGS_COLUMN_MAP.values())
+    numeric_cols = [c for c, t in HOLDINGS_DTYPES.items() if t.startswith('float')]
+    df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce').fillna(0.0)
+    return df.astype(HOLDINGS_DTYPES)
+
 
 class DataManager:
     """Singleton DataManager with SQLite persistence."""
@@ -37,8 +144,12 @@ class DataManager:
         self.account_info_path = os.path.join(self.data_dir, 'account_info.json')  # Legacy
         
         # In-memory cache for DataFrame (for backward compatibility)
+        # _versions holds the table_versions counters the caches were built from.
         self._df_cache = None
         self._account_cache = None
+        self._aggregates: Dict[str, Any] = {}
+        self._versions: Dict[str, int] = {}
+        self._cache_lock = threading.RLock()
         
         # Migrate existing CSV/JSON data to SQLite if needed
         self._migrate_legacy_data()
@@ -77,39 +188,93 @@ class DataManager:
 
     def load_data(self):
         """Loads portfolio and account info from SQLite."""
-        # Load Holdings from SQLite
-        holdings = db.get_all_holdings()
-        if holdings:
-            # Convert to DataFrame for backward compatibility
-            self._df_cache = pd.DataFrame(holdings)
-            # Rename DB columns to legacy column names
-            column_map = {
-                'ticker': 'Ticker',
-                'isin': 'ISIN',
-                'currency': 'Currency',
-                'shares': 'Shares',
-                'opening_price': 'Opening Price',
-                'current_price': 'Current Price',
-                'unrealised_pl': 'Unrealised P/L',
-                'value_source': 'Value (Source)',
-                'fx_rate': 'FX Rate',
-                'unrealised_pl_base': 'Unrealised P/L (Base)',
-                'market_value': 'Market Value',
-                'allocation_pct': 'Allocation %'
+        with self._cache_lock:
+            versions = db.get_table_versions()
+            self._load_holdings()
+            self._load_account_info()
+            self._versions = versions
+
+    def _load_holdings(self):
+        """Rebuilds the typed holdings DataFrame (and its aggregates) from SQLite."""
+        self._df_cache = build_holdings_frame(db.get_all_holdings())
+        self._rebuild_aggregates()
+
+    def _rebuild_aggregates(self):
+        """
+        Precomputes totals, market-value ordering, allocation and the prompt
+        summary. Runs only when holdings change; every agent prompt reads them.
+        """
+        df = self._df_cache
+        if df is None or df.empty:
+            self._aggregates = {
+                "holdings_value": 0.0,
+                "sorted_tickers": [],
+                "allocation": {},
+                "holdings_summary": "No active holdings."
             }
-            self._df_cache.rename(columns=column_map, inplace=True)
-        else:
-            self._df_cache = pd.DataFrame(columns=[
-                "Ticker", "ISIN", "Currency", "Shares", "Opening Price", 
-                "Current Price", "Unrealised P/L", "Value (Source)", 
-                "FX Rate", "Unrealised P/L (Base)", "Market Value", "Allocation %"
-            ])
+            return
+        
+        def numeric(col):
+            if col not in df:
+                return np.zeros(len(df))
+            return pd.to_numeric(df[col], errors='coerce').fillna(0.0).to_numpy(dtype='float64')
+        
+        market_value = numeric('Market Value')
+        order = np.argsort(-market_value, kind='stable')
+        total = float(market_value.sum())
+        tickers = df['Ticker'].astype(str).to_numpy() if 'Ticker' in df else np.array([''] * len(df))
+        shares = numeric('Shares')
+        prices = numeric('Current Price')
         
-        # Load Account Info from SQLite
+        self._aggregates = {
+            "holdings_value": total,
+            "sorted_tickers": tickers[order].tolist(),
+            "allocation": {
+                t: (float(v) / total * 100) if total > 0 else 0.0
+                for t, v in zip(tickers[order], market_value[order])
+            },
+            "holdings_summary": "".join(
+                f"- {tickers[i]}: {shares[i]} shares @ ${prices[i]:.2f} (Value: ${market_value[i]:.2f})\n"
+                for i in order
+            )
+        }
+
+    def _load_account_info(self):
+        """Reloads account info from SQLite."""
         self._account_cache = db.get_all_account_info()
         if not self._account_cache:
             self._account_cache = {"Free Funds": 10000.0, "Account Value": 0.0}
 
+    def _refresh_if_stale(self):
+        """
+        Cheap staleness check before reads: compares table_versions counters
+        (bumped by DB triggers on any write, from any thread or process) with
+        the ones the caches were built from, and reloads only changed tables.
+        """
+        with self._cache_lock:
+            if self._df_cache is None or self._account_cache is None:
+                self.load_data()
+                return
+            try:
+                versions = db.get_table_versions()
+            except Exception as e:
+                logger.error(f"Version check failed: {e}")
+                return
+            if versions == self._versions:
+                return
+            if versions.get('holdings') != self._versions.get('holdings'):
+                logger.debug("Holdings changed in DB, reloading.")
+                self._load_holdings()
+            if versions.get('account_info') != self._versions.get('account_info'):
+                logger.debug("Account info changed in DB, reloading.")
+                self._load_account_info()
+            self._versions = versions
+
+    def _mark_current(self, table: str):
+        """Records our own write so the next read does not reload the cache we just set."""
+        with self._cache_lock:
+            self._versions[table] = db.get_table_versions().get(table)
+
     # Backward compatibility alias
     def load_portfolio(self):
         return self.load_data()
@@ -117,25 +282,25 @@ class DataManager:
     @property
     def df(self):
         """Property for backward compatibility with self.df access."""
-        if self._df_cache is None:
-            self.load_data()
+        self._refresh_if_stale()
         return self._df_cache
     
     @df.setter
     def df(self, value):
         """Setter to intercept DataFrame assignments and persist to SQLite."""
         self._df_cache = value
+        self._rebuild_aggregates()
         # Persist to SQLite
         if value is not None and not value.empty:
             db.clear_holdings()
             for _, row in value.iterrows():
                 db.upsert_holding(row.to_dict())
+            self._mark_current('holdings')
 
     @property
     def account_info(self):
         """Property for backward compatibility with self.account_info access."""
-        if self._account_cache is None:
-            self.load_data()
+        self._refresh_if_stale()
         return self._account_cache
     
     @account_info.setter
@@ -146,10 +311,10 @@ class DataManager:
         if value:
             for key, val in value.items():
                 db.set_account_value(key, val)
+            self._mark_current('account_info')
 
     def get_portfolio_df(self):
-        if self._df_cache is None:
-            self.load_data()
+        self._refresh_if_stale()
         return self._df_cache
 
     def get_total_value(self):
@@ -158,30 +323,27 @@ class DataManager:
         return self.get_holdings_value() + self.get_cash_balance()
 
     def get_holdings_value(self):
-        if self._df_cache is None or self._df_cache.empty:
-            return 0.0
-        return self._df_cache['Market Value'].sum()
+        self._refresh_if_stale()
+        return self._aggregates["holdings_value"]
 
     def get_cash_balance(self):
         return self.account_info.get("Free Funds", 0.0)
 
     def get_holdings_list(self):
-        if self._df_cache is None or self._df_cache.empty:
-            return []
-        return self._df_cache['Ticker'].tolist()
+        self._refresh_if_stale()
+        return list(self._aggregates["sorted_tickers"])
+
+    def get_allocation(self) -> Dict[str, float]:
+        """Allocation % per ticker, ordered by market value (precomputed)."""
+        self._refresh_if_stale()
+        return dict(self._aggregates["allocation"])
 
     def get_portfolio_context(self):
         total_value = self.get_total_value()
         cash = self.get_cash_balance()
         invested = self.get_holdings_value()
         
-        holdings_summary = ""
-        if self._df_cache is not None and not self._df_cache.empty:
-            sorted_df = self._df_cache.sort_values(by='Market Value', ascending=False)
-            for _, row in sorted_df.iterrows():
-                holdings_summary += f"- {row['Ticker']}: {row['Shares']} shares @ ${row['Current Price']:.2f} (Value: ${row['Market Value']:.2f})\n"
-        else:
-            holdings_summary = "No active holdings."
+        holdings_summary = self._aggregates["holdings_summary"]
 
         context = f"""
 PORTFOLIO SNAPSHOT
@@ -198,46 +360,56 @@ HOLDINGS:
 
     def ingest_statement(self, file_path, broker="trading212"):
         """
-        Updates the portfolio from a PDF statement.
-        Now persists directly to SQLite.
+        Updates the portfolio from a PDF statement, incrementally.
+        The file is fingerprinted (exact re-uploads are no-ops), pages already imported
+        are not re-extracted, transactions are de-duplicated by fingerprint, and the
+        delta is applied to SQLite in one transaction.
         """
-        if broker == "trading212":
-            from src.parsers.trading212 import Trading212Parser
-            parser = Trading212Parser()
-            data = parser.parse(file_path)
-        else:
+        if broker != "trading212":
             return "Broker not supported."
-            
-        # Update Account Info in SQLite
-        if data['summary']:
-            for key, value in data['summary'].items():
-                db.set_account_value(key, value)
-            self._account_cache = db.get_all_account_info()
         
-        # Update Holdings in SQLite
+        file_hash = file_fingerprint(file_path)
+        if db.is_statement_imported(file_hash):
+            return f"Statement already imported; no changes. Cash: ${self.get_cash_balance():,.2f}"
+        
+        from src.parsers.trading212 import Trading212Parser
+        parser = Trading212Parser()
+        data = parser.parse(file_path, skip_page_hashes=db.get_imported_page_hashes())
+        
+        # Holdings snapshot (parser reports quantity as 'Qty')
         new_holdings = data['holdings']
-        if new_holdings:
-            db.clear_holdings()  # Full refresh
-            
-            # Calculate Allocation
-            total_val = sum(h.get('Market Value', 0) for h in new_holdings)
-            
-            for holding in new_holdings:
-                if total_val > 0:
-                    holding['Allocation %'] = (holding.get('Market Value', 0) / total_val) * 100
-                else:
-                    holding['Allocation %'] = 0
-                db.upsert_holding(holding)
-            
-            # Refresh cache
-            self.load_data()
+        total_val = sum(h.get('Market Value', 0) for h in new_holdings)
+        for holding in new_holdings:
+            holding.setdefault('Shares', holding.get('Qty', 0))
+            if total_val > 0:
+                holding['Allocation %'] = (holding.get('Market Value', 0) / total_val) * 100
+            else:
+                holding['Allocation %'] = 0
+        
+        # Identical rows within the statement are numbered so each keeps its own fingerprint
+        occurrences: Counter = Counter()
+        new_transactions = []
+        for trans in data.get('transactions', []):
+            identity = transaction_identity(trans)
+            new_transactions.append(_to_db_transaction(trans, occurrences[identity]))
+            occurrences[identity] += 1
+        
+        inserted = db.apply_statement_import(
+            file_hash=file_hash,
+            file_path=file_path,
+            page_count=data.get('page_count', 0),
+            summary=data['summary'],
+            holdings=new_holdings,
+            transactions=new_transactions,
+            page_hashes=data.get('page_hashes', [])
+        )
+        logger.info(f"Statement {file_hash[:12]}: {inserted} new transactions, "
+                    f"{data.get('pages_skipped', 0)}/{data.get('page_count', 0)} pages already on file")
             
-        # Update Transactions in SQLite
-        new_transactions = data.get('transactions', [])
-        for trans in new_transactions:
-            db.insert_transaction(trans)
+        # Refresh caches (only tables touched by this import are reloaded)
+        self._refresh_if_stale()
             
-        return f"Imported {len(new_holdings)} holdings and {len(new_transactions)} transactions. Cash: ${self.get_cash_balance():,.2f}"
+        return f"Imported {len(new_holdings)} holdings and {inserted} new transactions. Cash: ${self.get_cash_balance():,.2f}"
 
     def refresh_prices(self):
         from src.utils.portfolio_manager import update_portfolio_prices
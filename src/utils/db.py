@@ -8,6 +8,7 @@ import os
 import sqlite3
 import json
 import logging
+import zlib
 from contextlib import contextmanager
 from typing import Dict, Any, List, Optional
 import threading
@@ -18,7 +19,10 @@ logger = logging.getLogger("Database")
 # DATABASE PATH CONFIGURATION
 # ======================================
 def _get_db_path():
-    """Returns the path to the SQLite database file."""
+    """Returns the path to the SQLite database file (GVD_DB_PATH overrides data/gvd_engine.db)."""
+    override = os.environ.get("GVD_DB_PATH")
+    if override:
+        return override
     current_dir = os.path.dirname(os.path.abspath(__file__))
     project_root = os.path.dirname(os.path.dirname(current_dir))
     data_dir = os.path.join(project_root, 'data')
@@ -63,6 +67,9 @@ def get_cursor():
 # ======================================
 # SCHEMA INITIALIZATION
 # ======================================
+# Tables whose writes are tracked in table_versions
+VERSIONED_TABLES = ("holdings", "account_info", "transactions")
+
 def init_database():
     """Creates tables if they don't exist."""
     with get_cursor() as cursor:
@@ -112,7 +119,33 @@ def init_database():
             )
         """)
         
+        _ensure_columns(cursor, "transactions", {
+            "isin": "TEXT",
+            "fingerprint": "TEXT"
+        })
+        # Transaction fingerprints make re-imports of overlapping statements idempotent
+        cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_fingerprint ON transactions(fingerprint)")
+        
+        # Statement import ledger (file fingerprints) and pages known to hold no positions
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS imported_statements (
+                file_hash TEXT PRIMARY KEY,
+                file_path TEXT,
+                page_count INTEGER,
+                new_transactions INTEGER,
+                imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS imported_pages (
+                page_hash TEXT PRIMARY KEY,
+                file_hash TEXT,
+                imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
         # Verification logs table (for audit trail)
+        # Reports are stored zlib-compressed in report_blob; report_json is legacy.
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS verification_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -120,50 +153,186 @@ def init_database():
                 timestamp TEXT,
                 pdf_path TEXT,
                 report_json TEXT,
+                ticker TEXT,
+                period TEXT,
+                report_blob BLOB,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        _ensure_columns(cursor, "verification_logs", {
+            "ticker": "TEXT",
+            "period": "TEXT",
+            "report_blob": "BLOB"
+        })
+        
+        # Per-metric verification outcomes (queryable without decompressing reports)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS verification_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                log_id INTEGER NOT NULL REFERENCES verification_logs(id) ON DELETE CASCADE,
+                run_id TEXT NOT NULL,
+                ticker TEXT,
+                period TEXT,
+                metric_id TEXT,
+                status TEXT,
+                value_raw TEXT,
+                flagged INTEGER DEFAULT 0
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vlogs_run_id ON verification_logs(run_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vlogs_ticker_period ON verification_logs(ticker, period)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vmetrics_metric ON verification_metrics(metric_id, ticker, period)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vmetrics_status ON verification_metrics(status)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vmetrics_log_id ON verification_metrics(log_id)")
+        
+        # Change-log counters: bumped by triggers on every write so readers
+        # (e.g. DataManager caches) can detect changes from any thread/process.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS table_versions (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        for table in VERSIONED_TABLES:
+            cursor.execute("INSERT OR IGNORE INTO table_versions (table_name, version) VALUES (?, 0)", (table,))
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE table_versions SET version = version + 1 WHERE table_name = '{table}';
+                    END
+                """)
         
     logger.info("Database schema initialized.")
 
+def _ensure_columns(cursor, table: str, columns: Dict[str, str]) -> None:
+    """Adds columns missing from an existing table (lightweight schema migration)."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, col_type in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}")
+
+# ======================================
+# CHANGE TRACKING
+# ======================================
+def get_table_versions() -> Dict[str, int]:
+    """Returns the current write counter of each versioned table (one tiny indexed read)."""
+    with get_cursor() as cursor:
+        cursor.execute("SELECT table_name, version FROM table_versions")
+        return {row['table_name']: row['version'] for row in cursor.fetchall()}
+
 # ======================================
 # HOLDINGS CRUD OPERATIONS
 # ======================================
+_UPSERT_HOLDING_SQL = """
+    INSERT INTO holdings (ticker, isin, currency, shares, opening_price, current_price,
+                          unrealised_pl, value_source, fx_rate, unrealised_pl_base,
+                          market_value, allocation_pct)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(ticker) DO UPDATE SET
+        isin = excluded.isin,
+        currency = excluded.currency,
+        shares = excluded.shares,
+        opening_price = excluded.opening_price,
+        current_price = excluded.current_price,
+        unrealised_pl = excluded.unrealised_pl,
+        value_source = excluded.value_source,
+        fx_rate = excluded.fx_rate,
+        unrealised_pl_base = excluded.unrealised_pl_base,
+        market_value = excluded.market_value,
+        allocation_pct = excluded.allocation_pct,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# Same upsert, but rows whose values are unchanged are left untouched
+_UPSERT_HOLDING_IF_CHANGED_SQL = _UPSERT_HOLDING_SQL + """
+    WHERE isin IS NOT excluded.isin
+       OR currency IS NOT excluded.currency
+       OR shares IS NOT excluded.shares
+       OR opening_price IS NOT excluded.opening_price
+       OR current_price IS NOT excluded.current_price
+       OR unrealised_pl IS NOT excluded.unrealised_pl
+       OR value_source IS NOT excluded.value_source
+       OR fx_rate IS NOT excluded.fx_rate
+       OR unrealised_pl_base IS NOT excluded.unrealised_pl_base
+       OR market_value IS NOT excluded.market_value
+       OR allocation_pct IS NOT excluded.allocation_pct
+"""
+
+def _holding_params(holding: Dict[str, Any]) -> tuple:
+    """Maps a holding dict (legacy or DB column names) to upsert parameters."""
+    return (
+        holding.get('Ticker', holding.get('ticker', '')),
+        holding.get('ISIN', holding.get('isin', '')),
+        holding.get('Currency', holding.get('currency', 'USD')),
+        holding.get('Shares', holding.get('shares', 0)),
+        holding.get('Opening Price', holding.get('opening_price', 0)),
+        holding.get('Current Price', holding.get('current_price', 0)),
+        holding.get('Unrealised P/L', holding.get('unrealised_pl', 0)),
+        holding.get('Value (Source)', holding.get('value_source', 0)),
+        holding.get('FX Rate', holding.get('fx_rate', 1)),
+        holding.get('Unrealised P/L (Base)', holding.get('unrealised_pl_base', 0)),
+        holding.get('Market Value', holding.get('market_value', 0)),
+        holding.get('Allocation %', holding.get('allocation_pct', 0))
+    )
+
 def upsert_holding(holding: Dict[str, Any]) -> None:
     """Insert or update a holding by ticker."""
     with get_cursor() as cursor:
-        cursor.execute("""
-            INSERT INTO holdings (ticker, isin, currency, shares, opening_price, current_price,
-                                  unrealised_pl, value_source, fx_rate, unrealised_pl_base,
-                                  market_value, allocation_pct)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        cursor.execute(_UPSERT_HOLDING_SQL, _holding_params(holding))
+
+def merge_holdings(holdings: List[Dict[str, Any]]) -> int:
+    """
+    Bulk upsert of position fields (ticker, shares, opening/current price, market value).
+    Other columns of existing rows are preserved and unchanged rows are not written.
+    Returns the number of rows inserted or updated.
+    """
+    if not holdings:
+        return 0
+    with get_cursor() as cursor:
+        cursor.executemany("""
+            INSERT INTO holdings (ticker, shares, opening_price, current_price, market_value)
+            VALUES (?, ?, ?, ?, ?)
             ON CONFLICT(ticker) DO UPDATE SET
-                isin = excluded.isin,
-                currency = excluded.currency,
                 shares = excluded.shares,
                 opening_price = excluded.opening_price,
                 current_price = excluded.current_price,
-                unrealised_pl = excluded.unrealised_pl,
-                value_source = excluded.value_source,
-                fx_rate = excluded.fx_rate,
-                unrealised_pl_base = excluded.unrealised_pl_base,
                 market_value = excluded.market_value,
-                allocation_pct = excluded.allocation_pct,
                 updated_at = CURRENT_TIMESTAMP
-        """, (
-            holding.get('Ticker', holding.get('ticker', '')),
-            holding.get('ISIN', holding.get('isin', '')),
-            holding.get('Currency', holding.get('currency', 'USD')),
-            holding.get('Shares', holding.get('shares', 0)),
-            holding.get('Opening Price', holding.get('opening_price', 0)),
-            holding.get('Current Price', holding.get('current_price', 0)),
-            holding.get('Unrealised P/L', holding.get('unrealised_pl', 0)),
-            holding.get('Value (Source)', holding.get('value_source', 0)),
-            holding.get('FX Rate', holding.get('fx_rate', 1)),
-            holding.get('Unrealised P/L (Base)', holding.get('unrealised_pl_base', 0)),
-            holding.get('Market Value', holding.get('market_value', 0)),
-            holding.get('Allocation %', holding.get('allocation_pct', 0))
-        ))
+            WHERE shares IS NOT excluded.shares
+               OR opening_price IS NOT excluded.opening_price
+               OR current_price IS NOT excluded.current_price
+               OR market_value IS NOT excluded.market_value
+        """, [
+            (h['ticker'], h['shares'], h['opening_price'], h['current_price'], h['market_value'])
+            for h in holdings
+        ])
+        return max(cursor.rowcount, 0)
+
+def update_holding_prices(prices: Dict[str, float]) -> int:
+    """Sets current_price (and market_value = shares * price) for the given tickers only."""
+    if not prices:
+        return 0
+    with get_cursor() as cursor:
+        cursor.executemany("""
+            UPDATE holdings
+            SET current_price = ?, market_value = shares * ?, updated_at = CURRENT_TIMESTAMP
+            WHERE ticker = ? AND current_price IS NOT ?
+        """, [(price, price, ticker, price) for ticker, price in prices.items()])
+        return max(cursor.rowcount, 0)
+
+def recalculate_allocations() -> None:
+    """Recomputes allocation_pct from market_value in one statement (rows that change only)."""
+    with get_cursor() as cursor:
+        cursor.execute("""
+            WITH total AS (SELECT SUM(market_value) AS value FROM holdings)
+            UPDATE holdings
+            SET allocation_pct = market_value * 100.0 / (SELECT value FROM total)
+            WHERE (SELECT value FROM total) > 0
+              AND allocation_pct IS NOT market_value * 100.0 / (SELECT value FROM total)
+        """)
 
 def get_all_holdings() -> List[Dict[str, Any]]:
     """Returns all holdings as a list of dicts."""
@@ -214,18 +383,23 @@ def insert_transaction(transaction: Dict[str, Any]) -> None:
     """Inserts a new transaction."""
     with get_cursor() as cursor:
         cursor.execute("""
-            INSERT INTO transactions (date, type, ticker, shares, price, amount, currency, notes)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            transaction.get('date', ''),
-            transaction.get('type', ''),
-            transaction.get('ticker', ''),
-            transaction.get('shares', 0),
-            transaction.get('price', 0),
-            transaction.get('amount', 0),
-            transaction.get('currency', 'USD'),
-            transaction.get('notes', '')
-        ))
+            INSERT INTO transactions (date, type, ticker, shares, price, amount, currency, notes, isin, fingerprint)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, _transaction_params(transaction))
+
+def _transaction_params(transaction: Dict[str, Any]) -> tuple:
+    return (
+        transaction.get('date', ''),
+        transaction.get('type', ''),
+        transaction.get('ticker', ''),
+        transaction.get('shares', 0),
+        transaction.get('price', 0),
+        transaction.get('amount', 0),
+        transaction.get('currency', 'USD'),
+        transaction.get('notes', ''),
+        transaction.get('isin'),
+        transaction.get('fingerprint')
+    )
 
 def get_all_transactions() -> List[Dict[str, Any]]:
     """Returns all transactions."""
@@ -234,5 +408,191 @@ def get_all_transactions() -> List[Dict[str, Any]]:
         rows = cursor.fetchall()
         return [dict(row) for row in rows]
 
+# ======================================
+# STATEMENT IMPORT LEDGER
+# ======================================
+def is_statement_imported(file_hash: str) -> bool:
+    """True if a statement with this content fingerprint was already applied."""
+    with get_cursor() as cursor:
+        cursor.execute("SELECT 1 FROM imported_statements WHERE file_hash = ?", (file_hash,))
+        return cursor.fetchone() is not None
+
+def get_imported_page_hashes() -> set:
+    """Fingerprints of previously imported pages that carried no open positions."""
+    with get_cursor() as cursor:
+        cursor.execute("SELECT page_hash FROM imported_pages")
+        return {row['page_hash'] for row in cursor.fetchall()}
+
+def apply_statement_import(file_hash: str, file_path: str, page_count: int,
+                           summary: Dict[str, Any], holdings: List[Dict[str, Any]],
+                           transactions: List[Dict[str, Any]], page_hashes: List[str]) -> int:
+    """
+    Applies one statement as a single DB transaction:
+    account values, holdings snapshot (unchanged rows untouched, closed positions removed),
+    fingerprinted transactions (INSERT OR IGNORE) and the import ledger.
+    Returns the number of newly inserted transactions.
+    """
+    with get_cursor() as cursor:
+        cursor.executemany("""
+            INSERT INTO account_info (key, value)
+            VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                value = excluded.value,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE value IS NOT excluded.value
+        """, [(key, json.dumps(value)) for key, value in (summary or {}).items()])
+        
+        if holdings:
+            tickers = [h.get('Ticker', h.get('ticker', '')) for h in holdings]
+            placeholders = ",".join("?" * len(tickers))
+            cursor.execute(f"DELETE FROM holdings WHERE ticker NOT IN ({placeholders})", tickers)
+            cursor.executemany(_UPSERT_HOLDING_IF_CHANGED_SQL, [_holding_params(h) for h in holdings])
+        
+        inserted = 0
+        if transactions:
+            cursor.executemany("""
+                INSERT OR IGNORE INTO transactions (date, type, ticker, shares, price, amount, currency, notes, isin, fingerprint)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [_transaction_params(t) for t in transactions])
+            inserted = max(cursor.rowcount, 0)  # summed over rows; excludes trigger writes
+        
+        cursor.executemany("INSERT OR IGNORE INTO imported_pages (page_hash, file_hash) VALUES (?, ?)",
+                           [(h, file_hash) for h in page_hashes])
+        cursor.execute("""
+            INSERT OR REPLACE INTO imported_statements (file_hash, file_path, page_count, new_transactions)
+            VALUES (?, ?, ?, ?)
+        """, (file_hash, file_path, page_count, inserted))
+    return inserted
+
+# ======================================
+# VERIFICATION LOG OPERATIONS
+# ======================================
+def _compress_report(report: Dict[str, Any]) -> bytes:
+    return zlib.compress(json.dumps(report, default=str).encode("utf-8"), 6)
+
+def _decompress_report(row) -> Optional[Dict[str, Any]]:
+    if row["report_blob"] is not None:
+        return json.loads(zlib.decompress(row["report_blob"]).decode("utf-8"))
+    if row["report_json"]:
+        return json.loads(row["report_json"])
+    return None
+
+def insert_verification_log(report: Dict[str, Any]) -> int:
+    """
+    Persists an audit report (compressed) plus one indexed row per metric.
+    Returns the new verification_logs row id.
+    """
+    run_id = report.get("run_id", "")
+    ticker = report.get("ticker")
+    period = report.get("period")
+    with get_cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO verification_logs (run_id, timestamp, pdf_path, ticker, period, report_blob)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            run_id,
+            report.get("timestamp"),
+            report.get("pdf_path"),
+            ticker,
+            period,
+            sqlite3.Binary(_compress_report(report))
+        ))
+        log_id = cursor.lastrowid
+        cursor.executemany("""
+            INSERT INTO verification_metrics (log_id, run_id, ticker, period, metric_id, status, value_raw, flagged)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [
+            (
+                log_id,
+                run_id,
+                ticker,
+                period,
+                m.get("metric_id"),
+                (m.get("verification") or {}).get("status"),
+                None if m.get("value_raw") is None else str(m.get("value_raw")),
+                1 if m.get("flagged") else 0
+            )
+            for m in report.get("metrics", []) or []
+        ])
+    return log_id
+
+def get_verification_log(run_id: str) -> Optional[Dict[str, Any]]:
+    """Returns the most recent report stored for a run_id."""
+    with get_cursor() as cursor:
+        cursor.execute("""
+            SELECT report_blob, report_json FROM verification_logs
+            WHERE run_id = ? ORDER BY id DESC LIMIT 1
+        """, (run_id,))
+        row = cursor.fetchone()
+        return _decompress_report(row) if row else None
+
+# Decoded copy of the latest report, keyed by row id (avoids re-decompressing on every render)
+_latest_report_cache: Dict[str, Any] = {"key": None, "report": None}
+_latest_report_lock = threading.Lock()
+
+def get_latest_verification_log(ticker: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Returns the newest report (optionally for one ticker), or None if none stored."""
+    with get_cursor() as cursor:
+        if ticker:
+            cursor.execute("SELECT MAX(id) AS id FROM verification_logs WHERE ticker = ?", (ticker,))
+        else:
+            cursor.execute("SELECT MAX(id) AS id FROM verification_logs")
+        row = cursor.fetchone()
+        log_id = row["id"] if row else None
+        if log_id is None:
+            return None
+        
+        cache_key = (DB_PATH, log_id)
+        with _latest_report_lock:
+            if _latest_report_cache["key"] == cache_key:
+                return _latest_report_cache["report"]
+        
+        cursor.execute("SELECT report_blob, report_json FROM verification_logs WHERE id = ?", (log_id,))
+        report = _decompress_report(cursor.fetchone())
+    
+    with _latest_report_lock:
+        _latest_report_cache["key"] = cache_key
+        _latest_report_cache["report"] = report
+    return report
+
+def list_verification_runs(ticker: Optional[str] = None, period: Optional[str] = None,
+                           limit: int = 50) -> List[Dict[str, Any]]:
+    """Lists stored runs (metadata only, reports stay compressed)."""
+    query = "SELECT id, run_id, timestamp, pdf_path, ticker, period, created_at FROM verification_logs"
+    clauses, params = [], []
+    if ticker:
+        clauses.append("ticker = ?")
+        params.append(ticker)
+    if period:
+        clauses.append("period = ?")
+        params.append(period)
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY id DESC LIMIT ?"
+    params.append(limit)
+    with get_cursor() as cursor:
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+
+def get_metric_history(metric_id: str, ticker: Optional[str] = None, status: Optional[str] = None,
+                       limit: int = 50) -> List[Dict[str, Any]]:
+    """Returns verification outcomes for a metric across runs, newest first."""
+    query = """
+        SELECT run_id, ticker, period, metric_id, status, value_raw, flagged
+        FROM verification_metrics WHERE metric_id = ?
+    """
+    params: List[Any] = [metric_id]
+    if ticker:
+        query += " AND ticker = ?"
+        params.append(ticker)
+    if status:
+        query += " AND status = ?"
+        params.append(status)
+    query += " ORDER BY log_id DESC LIMIT ?"
+    params.append(limit)
+    with get_cursor() as cursor:
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+
 # Initialize database on module load
 init_database()
@@ -45,10 +45,11 @@ class JobManager:
         self.jobs: Dict[str, Dict[str, Any]] = {}
         self._initialized = True
 
-    def submit_job(self, pdf_path: str) -> str:
+    def submit_job(self, pdf_path: str, ticker: Optional[str] = None, period: Optional[str] = None) -> str:
         """
         Submits a PDF for analysis. Returns a unique job_id.
         Uses ThreadPoolExecutor for managed background execution.
+        ticker/period label the filing; the orchestrator infers them from the filename when omitted.
         """
         job_id = str(uuid.uuid4())
         
@@ -57,13 +58,15 @@ class JobManager:
                 "status": "QUEUED",
                 "submitted_at": time.time(),
                 "pdf_path": pdf_path,
+                "ticker": ticker,
+                "period": period,
                 "result": None,
                 "error": None,
                 "logs": []
             }
         
         # Submit to executor pool instead of manual threading
-        _executor.submit(self._run_worker, job_id, pdf_path)
+        _executor.submit(self._run_worker, job_id, pdf_path, ticker, period)
         
         logger.info(f"Job {job_id} submitted for {pdf_path}")
         return job_id
@@ -74,7 +77,7 @@ class JobManager:
             if job_id in self.jobs:
                 self.jobs[job_id].update(kwargs)
 
-    def _run_worker(self, job_id: str, pdf_path: str):
+    def _run_worker(self, job_id: str, pdf_path: str, ticker: Optional[str] = None, period: Optional[str] = None):
         """
         Worker function executed in thread pool.
         Sets up a new asyncio event loop for the async orchestrator.
@@ -91,7 +94,7 @@ class JobManager:
             
             try:
                 orchestrator = EarningsAuditOrchestrator()
-                result = loop.run_until_complete(orchestrator.run_workflow(pdf_path))
+                result = loop.run_until_complete(orchestrator.run_workflow(pdf_path, ticker=ticker, period=period))
                 
                 self._update_job(job_id, result=result, status="COMPLETED")
                 logger.info(f"Job {job_id} completed successfully.")
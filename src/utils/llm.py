@@ -1,5 +1,7 @@
 import os
 import google.generativeai as genai
+import google.ai.generativelanguage as glm
+from google.api_core.client_options import ClientOptions
 from dotenv import load_dotenv
 
 # Use centralized secrets management
@@ -62,3 +64,49 @@ async def generate_text_async(prompt, model_name="gemini-flash-latest", temperat
         model_name, 
         temperature
     )
+
+# ======================================
+# NATIVE ASYNC SESSION
+# ======================================
+# A grpc.aio channel is bound to the event loop that created it, and job_manager
+# runs each job on a fresh loop, so the async client is scoped to one block of
+# work and closed before that loop ends (nothing is cached across loops).
+
+class AsyncLLMSession:
+    """
+    Gemini async client for many concurrent calls on the current event loop.
+
+        async with AsyncLLMSession() as llm:
+            text = await llm.generate_text(prompt)
+    """
+
+    def __init__(self):
+        self._client = None
+
+    async def __aenter__(self):
+        self._client = glm.GenerativeServiceAsyncClient(
+            client_options=ClientOptions(api_key=GOOGLE_API_KEY)
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.transport.close()
+
+    async def generate_text(self, prompt, model_name="gemini-flash-latest", temperature=0.7):
+        """Same contract as generate_text, awaited on the session's channel."""
+        if self._client is None:
+            raise RuntimeError("AsyncLLMSession is not open")
+        request = glm.GenerateContentRequest(
+            model=f"models/{model_name}",
+            contents=[glm.Content(role="user", parts=[glm.Part(text=prompt)])],
+            generation_config=glm.GenerationConfig(temperature=temperature)
+        )
+        response = await self._client.generate_content(request)
+        if not response.candidates:
+            raise ValueError(f"No candidates returned (prompt feedback: {response.prompt_feedback})")
+        return "".join(part.text for part in response.candidates[0].content.parts)
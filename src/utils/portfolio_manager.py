@@ -1,13 +1,8 @@
 import pandas as pd
-import os
+import re
 from src.tools.pdf_reader import read_pdf
 from src.tools.market_data import get_current_price
-
-PORTFOLIO_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data', 'master_portfolio.csv')
-
-import re
-
-import re
+from src.utils import db
 
 def parse_trading212_pdf(text):
     """
@@ -82,9 +77,10 @@ def parse_trading212_pdf(text):
 
 def import_broker_statement(file_path):
     """
-    Reads a PDF statement and updates the master_portfolio.csv
+    Reads a PDF statement and merges its Open Positions into the SQLite holdings table.
     """
-    text = read_pdf(file_path)
+    # Holdings live in the Open Positions table: stop reading once it ends
+    text = read_pdf(file_path, stop_after_section="Open positions")
     if "Error" in text:
         return text
         
@@ -93,55 +89,22 @@ def import_broker_statement(file_path):
     if not holdings:
         return "No holdings found in PDF. Check format."
         
-    # Load existing portfolio or create new
-    if os.path.exists(PORTFOLIO_PATH):
-        df = pd.read_csv(PORTFOLIO_PATH)
-        # Ensure Opening Price column exists if reading old file
-        if "Opening Price" not in df.columns and "Avg Price" in df.columns:
-            df.rename(columns={"Avg Price": "Opening Price"}, inplace=True)
-    else:
-        df = pd.DataFrame(columns=["Ticker", "Company Name", "Shares", "Opening Price", "Current Price", "Market Value", "Allocation %", "Sector", "Tier"])
-        
-    # Update shares
     print(f"Found {len(holdings)} holdings in PDF.")
     
-    for h in holdings:
-        ticker = h["Ticker"]
-        shares = h["Shares"]
-        opening_price = h.get("Avg Price", 0) # Extracted as avg_price but corresponds to Opening Price
-        current_price = h.get("Current Price", 0)
-        
-        # Check if ticker exists
-        # Check if ticker exists
-        if ticker in df['Ticker'].values:
-            print(f"DEBUG: Updating existing ticker {ticker}")
-            df.loc[df['Ticker'] == ticker, 'Shares'] = shares
-            df.loc[df['Ticker'] == ticker, 'Opening Price'] = opening_price
-            df.loc[df['Ticker'] == ticker, 'Current Price'] = current_price
-            df.loc[df['Ticker'] == ticker, 'Market Value'] = shares * current_price
-        else:
-            print(f"DEBUG: Adding new ticker {ticker}")
-            # Add new row
-            new_row = {
-                "Ticker": ticker, 
-                "Shares": shares,
-                "Company Name": ticker, # Placeholder
-                "Opening Price": opening_price,
-                "Current Price": current_price,
-                "Market Value": shares * current_price,
-                "Allocation %": 0,
-                "Sector": "Unknown",
-                "Tier": "Tier 2" # Default
-            }
-            df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-            
-    # Recalculate Market Value and Allocation
-    df['Market Value'] = df['Shares'] * df['Current Price']
-    total_value = df['Market Value'].sum()
-    if total_value > 0:
-        df['Allocation %'] = (df['Market Value'] / total_value) * 100
-        
-    df.to_csv(PORTFOLIO_PATH, index=False)
+    # Vectorized: one frame for the statement, last occurrence of a ticker wins
+    df = pd.DataFrame(holdings).drop_duplicates(subset="Ticker", keep="last")
+    df = df.rename(columns={
+        "Ticker": "ticker",
+        "Shares": "shares",
+        "Avg Price": "opening_price",  # Extracted as avg_price but corresponds to Opening Price
+        "Current Price": "current_price"
+    })
+    df["market_value"] = df["shares"] * df["current_price"]
+    
+    # Upsert in one transaction (existing rows keep ISIN/currency/etc.), then allocations
+    changed = db.merge_holdings(df[["ticker", "shares", "opening_price", "current_price", "market_value"]].to_dict("records"))
+    db.recalculate_allocations()
+    print(f"DEBUG: {changed} holdings inserted or updated.")
     
     # Trigger price update (optional, but good to refresh if PDF is old)
     # update_portfolio_prices() 
@@ -150,28 +113,24 @@ def import_broker_statement(file_path):
 
 def update_portfolio_prices():
     """
-    Updates the 'Current Price' and 'Market Value' columns in master_portfolio.csv
+    Updates 'Current Price' and 'Market Value' in the SQLite holdings table.
+    Only rows whose price actually moved are written.
     """
-    if not os.path.exists(PORTFOLIO_PATH):
-        return "Portfolio file not found."
+    df = pd.DataFrame(db.get_all_holdings(), columns=["ticker", "shares", "current_price"])
+    if df.empty:
+        return "No holdings found in database."
         
-    df = pd.read_csv(PORTFOLIO_PATH)
-    
     print("Updating portfolio prices...")
-    for index, row in df.iterrows():
-        ticker = row['Ticker']
-        price = get_current_price(ticker)
-        if price:
-            df.at[index, 'Current Price'] = price
-            df.at[index, 'Market Value'] = price * row['Shares']
-            print(f"Updated {ticker}: ${price}")
-        else:
-            print(f"Could not fetch price for {ticker}")
-            
-    # Recalculate Allocation %
-    total_value = df['Market Value'].sum()
-    if total_value > 0:
-        df['Allocation %'] = (df['Market Value'] / total_value) * 100
+    df["new_price"] = pd.to_numeric(pd.Series([get_current_price(t) for t in df["ticker"]], index=df.index), errors="coerce")
+    
+    for ticker in df.loc[df["new_price"].isna(), "ticker"]:
+        print(f"Could not fetch price for {ticker}")
+    
+    # Vectorized change detection: fetched and different from the stored price
+    changed = df[df["new_price"].notna() & (df["new_price"] != df["current_price"])]
+    updated = db.update_holding_prices(dict(zip(changed["ticker"], changed["new_price"].astype(float))))
+    if updated:
+        db.recalculate_allocations()
+    print(f"Updated {updated} of {len(df)} holdings.")
         
-    df.to_csv(PORTFOLIO_PATH, index=False)
     return "Portfolio updated successfully."
@@ -5,22 +5,39 @@ Implements semantic search over document chunks to reduce LLM context size.
 Uses FAISS for vector similarity search with sentence-transformers embeddings.
 
 ARCHITECTURE:
-1. Chunker: Splits markdown by section headers
-2. Embedder: Converts chunks to vectors (all-MiniLM-L6-v2)
-3. Store: FAISS index for fast similarity search
-4. Retriever: Gets top-K relevant chunks for a query
+1. Chunker: Splits markdown by section headers in one pass (tables kept whole, char offsets kept)
+2. Embedder: Converts chunks to vectors (all-MiniLM-L6-v2; PyTorch, ONNX or int8 ONNX backend)
+3. Embedding Cache: On-disk vectors keyed by (model, chunk hash), reused across documents
+4. Store: FAISS index for fast similarity search, persisted per document hash + in-memory LRU
+5. Lexical: BM25 inverted index over the same chunks (exact metric names, tickers)
+6. Retriever: Gets top-K relevant chunks for a query (hybrid dense + BM25, or BM25 only
+   when the embedding stack is unavailable)
+7. Corpus: HNSW index over every indexed filing, filterable by (ticker, filing, period)
 """
+import os
 import re
+import copy
+import json
 import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional
 import hashlib
+import importlib.util
+import math
+
+import numpy as np
+
+from src.config import EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND, EMBEDDING_BATCH_SIZE, EMBEDDING_NUM_THREADS
 
 logger = logging.getLogger("RAG")
 
 # ======================================
 # LAZY IMPORTS FOR OPTIONAL DEPENDENCIES
 # ======================================
-# FAISS and sentence-transformers are optional - fallback to full context if missing
+# FAISS and sentence-transformers are optional - fallback to BM25-only retrieval if missing
 _faiss = None
 _SentenceTransformer = None
 
@@ -41,9 +58,177 @@ def _load_dependencies():
     return True
 
 
+# ======================================
+# SHARED EMBEDDING MODEL
+# ======================================
+DEFAULT_EMBEDDING_MODEL = EMBEDDING_MODEL_NAME
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def _int8_onnx_file() -> str:
+    """Pre-quantized ONNX export (shipped in the sentence-transformers model repos) for this CPU."""
+    import platform
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        flags = ""
+    if "avx512_vnni" in flags:
+        return "onnx/model_qint8_avx512_vnni.onnx"
+    if "avx512" in flags:
+        return "onnx/model_qint8_avx512.onnx"
+    return "onnx/model_quint8_avx2.onnx"
+
+
+def _onnx_installed() -> bool:
+    """Whether the ONNX backend can be attempted (checked without importing it)."""
+    return all(importlib.util.find_spec(name) is not None for name in ("onnxruntime", "optimum"))
+
+
+def load_encoder(model_name: str, backend: str = "torch", num_threads: int = 0):
+    """
+    Constructs a SentenceTransformer on the requested backend.
+    "onnx-int8" uses ONNX Runtime with an int8-quantized graph; if ONNX Runtime
+    (or the export) is unavailable the PyTorch model is used instead.
+    
+    Returns (encoder, backend that was actually loaded).
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    if not _load_dependencies():
+        raise ImportError("sentence-transformers is not installed")
+    
+    if backend != "torch":
+        model_kwargs: Dict[str, Any] = {}
+        if backend == "onnx-int8":
+            model_kwargs["file_name"] = _int8_onnx_file()
+        try:
+            if num_threads:
+                import onnxruntime
+                session_options = onnxruntime.SessionOptions()
+                session_options.intra_op_num_threads = num_threads
+                session_options.inter_op_num_threads = 1
+                model_kwargs["session_options"] = session_options
+            return _SentenceTransformer(model_name, backend="onnx", model_kwargs=model_kwargs), backend
+        except Exception as e:
+            logger.warning(f"ONNX embedding backend unavailable ({e}), falling back to PyTorch")
+    
+    if num_threads:
+        import torch
+        torch.set_num_threads(num_threads)
+    return _SentenceTransformer(model_name), "torch"
+
+
+class EmbeddingModelManager:
+    """
+    Process-wide owner of embedding models.
+    
+    Each model is loaded once (hundreds of MB, seconds of start-up) and shared by
+    every DocumentIndex. Loading is guarded by a lock so concurrent jobs from the
+    worker pool never load twice, and encode() calls on one model are serialised
+    because SentenceTransformer.encode is not safe to call concurrently.
+    
+    backend / batch_size / num_threads default to the EMBEDDING_* settings in config.
+    """
+    
+    def __init__(self, backend: str = EMBEDDING_BACKEND, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 num_threads: int = EMBEDDING_NUM_THREADS):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self._models: Dict[str, Any] = {}
+        # Backend each loaded model actually runs on (differs from self.backend after a fallback)
+        self._backends: Dict[str, str] = {}
+        self._encode_locks: Dict[str, threading.Lock] = {}
+        self._load_lock = threading.Lock()
+    
+    def backend_for(self, model_name: str) -> str:
+        """
+        Backend whose vectors this manager produces for a model: the one that loaded,
+        or before loading the configured one (PyTorch if ONNX is not installed).
+        """
+        backend = self._backends.get(model_name)
+        if backend is None:
+            backend = self.backend if self.backend == "torch" or _onnx_installed() else "torch"
+        return backend
+    
+    def cache_key(self, model_name: str) -> str:
+        """Identity of the vectors this manager produces (quantized vectors are cached separately)."""
+        backend = self.backend_for(model_name)
+        return model_name if backend == "torch" else f"{model_name}@{backend}"
+    
+    def register(self, model_name: str, model: Any, backend: Optional[str] = None) -> None:
+        """Installs an already-constructed encoder (any object with .encode(texts))."""
+        with self._load_lock:
+            self._models[model_name] = model
+            self._backends[model_name] = backend or self.backend
+            self._encode_locks.setdefault(model_name, threading.Lock())
+    
+    def is_loaded(self, model_name: str = DEFAULT_EMBEDDING_MODEL) -> bool:
+        return model_name in self._models
+    
+    def get(self, model_name: str = DEFAULT_EMBEDDING_MODEL):
+        """Returns the shared encoder, loading it on first use."""
+        model = self._models.get(model_name)
+        if model is not None:
+            return model
+        with self._load_lock:
+            if model_name not in self._models:
+                logger.info(f"Loading embedding model: {model_name} [{self.backend}] (once per process)")
+                model, backend = load_encoder(model_name, self.backend, self.num_threads)
+                self._models[model_name] = model
+                self._backends[model_name] = backend
+                self._encode_locks.setdefault(model_name, threading.Lock())
+            return self._models[model_name]
+    
+    def encode(self, model_name: str, texts: List[str]) -> np.ndarray:
+        """Thread-safe batch encode; returns float32 vectors."""
+        model = self.get(model_name)
+        with self._encode_locks[model_name]:
+            vectors = model.encode(texts, show_progress_bar=False, batch_size=self.batch_size)
+        return np.asarray(vectors, dtype=np.float32)
+    
+    def warm_up(self, model_name: str = DEFAULT_EMBEDDING_MODEL, background: bool = True) -> Optional[threading.Thread]:
+        """Loads (and runs one tiny encode on) the model, optionally on a daemon thread."""
+        def _warm():
+            try:
+                self.encode(model_name, ["warm-up"])
+                logger.info(f"Embedding model {model_name} warmed up.")
+            except Exception as e:
+                logger.warning(f"Embedding warm-up skipped: {e}")
+        
+        if not background:
+            _warm()
+            return None
+        thread = threading.Thread(target=_warm, name="GVD_EmbeddingWarmup", daemon=True)
+        thread.start()
+        return thread
+
+
+_model_manager = EmbeddingModelManager()
+
+
+def get_model_manager() -> EmbeddingModelManager:
+    """Returns the process-wide embedding model manager."""
+    return _model_manager
+
+
+def warm_up_embedding_model(model_name: str = DEFAULT_EMBEDDING_MODEL, background: bool = True) -> Optional[threading.Thread]:
+    """Pre-loads the shared encoder (e.g. at dashboard start-up) so the first job doesn't pay for it."""
+    return _model_manager.warm_up(model_name, background=background)
+
+
 # ======================================
 # DOCUMENT CHUNKING
 # ======================================
+# Bumped whenever chunk boundaries change, so persisted indexes are rebuilt
+CHUNKER_VERSION = 2
+
+_HEADER_PATTERN = re.compile(r'^#{2,3}\s+')
+
+
 def chunk_by_sections(markdown: str, max_chunk_size: int = 4000) -> List[Dict[str, Any]]:
     """
     Split markdown into chunks by section headers.
@@ -53,83 +238,370 @@ def chunk_by_sections(markdown: str, max_chunk_size: int = 4000) -> List[Dict[st
     - "## Risk Factors"
     - "## Management Discussion"
     
-    Returns list of {text, section_title, index}
+    Single pass over the lines: a section's body is a list of blocks
+    (paragraphs, and markdown tables as atomic units), and chunks are slices
+    of the original string, so the cost is linear in the document length.
+    Sections over max_chunk_size are split between blocks, never inside a table.
+    
+    Returns list of {text, section_title, index, start, end, has_table}, where
+    markdown[start:end] == text.
     """
     if not markdown:
         return []
     
-    # Split by markdown headers (## or ###)
-    section_pattern = r'(^#{2,3}\s+.+$)'
-    parts = re.split(section_pattern, markdown, flags=re.MULTILINE)
-    
     chunks = []
     current_section = "Document Start"
-    current_text = ""
+    blocks = []  # [start, end, is_table] spans of the current section
+    block_start = None
+    block_is_table = False
     
-    for part in parts:
-        part = part.strip()
-        if not part:
-            continue
-            
-        # Check if this is a header
-        if re.match(r'^#{2,3}\s+', part):
-            # Save previous section if it has content
-            if current_text.strip():
-                # Split large sections into sub-chunks
-                for sub_chunk in _split_large_chunk(current_text, max_chunk_size):
-                    chunks.append({
-                        "text": sub_chunk,
-                        "section_title": current_section,
-                        "index": len(chunks)
-                    })
-            current_section = part.replace("#", "").strip()
-            current_text = ""
+    def close_block(end):
+        nonlocal block_start
+        if block_start is not None:
+            blocks.append((block_start, end, block_is_table))
+            block_start = None
+    
+    def close_section():
+        _emit_section_chunks(markdown, blocks, current_section, max_chunk_size, chunks)
+        blocks.clear()
+    
+    offset = 0
+    for line in markdown.splitlines(keepends=True):
+        line_start = offset
+        offset += len(line)
+        stripped = line.strip()
+        
+        if not stripped:
+            close_block(line_start)
+        elif _HEADER_PATTERN.match(stripped):
+            close_block(line_start)
+            close_section()
+            current_section = stripped.replace("#", "").strip()
         else:
-            current_text += "\n" + part
+            is_table = stripped.startswith("|")
+            if block_start is not None and is_table != block_is_table:
+                close_block(line_start)  # table directly after text (or vice versa)
+            if block_start is None:
+                block_start = line_start
+                block_is_table = is_table
     
-    # Don't forget the last section
-    if current_text.strip():
-        for sub_chunk in _split_large_chunk(current_text, max_chunk_size):
-            chunks.append({
-                "text": sub_chunk,
-                "section_title": current_section,
-                "index": len(chunks)
-            })
+    close_block(offset)
+    close_section()
     
     logger.info(f"Chunked document into {len(chunks)} sections")
     return chunks
 
 
-def _split_large_chunk(text: str, max_size: int) -> List[str]:
-    """Split a chunk that exceeds max_size into smaller pieces."""
-    if len(text) <= max_size:
-        return [text]
+def _emit_section_chunks(markdown: str, blocks: List[tuple], section: str, max_size: int,
+                         chunks: List[Dict[str, Any]]) -> None:
+    """Groups a section's blocks into chunks of at most max_size chars (an oversized block stays whole)."""
+    group_start = None
+    group_end = None
+    has_table = False
     
-    # Split by paragraphs
-    paragraphs = text.split("\n\n")
-    chunks = []
-    current = ""
+    def emit():
+        start, end = group_start, group_end
+        # Trim surrounding whitespace without copying the section
+        while start < end and markdown[start].isspace():
+            start += 1
+        while end > start and markdown[end - 1].isspace():
+            end -= 1
+        if end > start:
+            chunks.append({
+                "text": markdown[start:end],
+                "section_title": section,
+                "index": len(chunks),
+                "start": start,
+                "end": end,
+                "has_table": has_table
+            })
     
-    for para in paragraphs:
-        if len(current) + len(para) > max_size:
-            if current:
-                chunks.append(current)
-            current = para
-        else:
-            current += "\n\n" + para if current else para
+    for start, end, is_table in blocks:
+        if group_start is not None and end - group_start > max_size:
+            emit()
+            group_start = None
+        if group_start is None:
+            group_start = start
+            has_table = False
+        group_end = end
+        has_table = has_table or is_table
+    
+    if group_start is not None:
+        emit()
+
+
+def attach_chunk_provenance(chunks: List[Dict[str, Any]], provenance_map) -> List[Dict[str, Any]]:
+    """
+    Returns copies of the chunks with "provenance_ids" (indexes into provenance_map) and
+    "pages", using the md_start / md_end offsets the parser records on provenance entries.
+    The input chunks (often shared through the index cache) are left untouched.
+    Both lists are in document order, so this is one merge pass.
+    """
+    if hasattr(provenance_map, "md_spans"):
+        # Columnar provenance: read the offset/page columns without building entry dicts
+        located = sorted(
+            (start, end, i, page)
+            for i, ((start, end), page) in enumerate(zip(provenance_map.md_spans.tolist(), provenance_map.pages.tolist()))
+            if start >= 0
+        )
+    else:
+        located = sorted(
+            (entry["md_start"], entry["md_end"], i, entry.get("page", -1))
+            for i, entry in enumerate(provenance_map)
+            if entry.get("md_start", -1) >= 0
+        )
+    annotated = [dict(chunk) for chunk in chunks]
+    cursor = 0
+    for chunk in sorted(annotated, key=lambda c: c["start"]):
+        while cursor < len(located) and located[cursor][1] <= chunk["start"]:
+            cursor += 1
+        ids, pages = [], []
+        probe = cursor
+        while probe < len(located) and located[probe][0] < chunk["end"]:
+            ids.append(located[probe][2])
+            page = located[probe][3]
+            if page not in pages and page != -1:
+                pages.append(page)
+            probe += 1
+        chunk["provenance_ids"] = ids
+        chunk["pages"] = pages
+    return annotated
+
+
+def _pages_label(chunk: Dict[str, Any]) -> str:
+    """' [Pages: 3, 4]' for chunks mapped back to the PDF, so extracted metrics can cite a page."""
+    pages = chunk.get("pages")
+    return f" [Pages: {', '.join(str(p) for p in pages)}]" if pages else ""
+
+
+# ======================================
+# LEXICAL INDEX (BM25)
+# ======================================
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased word/number tokens ("Diluted EPS" -> ["diluted", "eps"], "2,019" kept whole)."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Okapi BM25 over chunk texts, backed by an inverted index (term -> [(chunk, tf)]).
+    
+    Needs nothing beyond the standard library, so it is always available and
+    is the retrieval path of last resort when FAISS / the embedding model is not.
+    """
     
-    if current:
-        chunks.append(current)
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[tuple]] = {}
+        self.doc_lengths = []
+        for doc_id, text in enumerate(texts):
+            counts: Dict[str, int] = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                self.postings.setdefault(token, []).append((doc_id, tf))
+            self.doc_lengths.append(sum(counts.values()))
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        n_docs = len(self.doc_lengths)
+        self.idf = {
+            token: math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for token, docs in self.postings.items()
+        }
     
-    return chunks
+    def scores(self, query: str, allowed: Optional[set] = None) -> Dict[int, float]:
+        """BM25 score for every chunk containing at least one query term (optionally only chunks in allowed)."""
+        scores: Dict[int, float] = {}
+        avg = self.avg_length or 1.0
+        for token in set(tokenize(query)):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for doc_id, tf in self.postings[token]:
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+    
+    def search(self, query: str, top_k: int = 5) -> List[tuple]:
+        """[(chunk index, score)] best first."""
+        scores = self.scores(query)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+
+# ======================================
+# PERSISTENT EMBEDDING CACHE
+# ======================================
+def _default_cache_dir() -> str:
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.join(project_root, 'data', 'rag_cache')
+
+
+def chunk_hash(text: str) -> str:
+    """Content hash used as the embedding cache key."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding store keyed by (model name, chunk content hash).
+    
+    Vectors are appended to one float32 file per model and read back through a
+    memory map; a small SQLite table maps each key to its row in that file.
+    Identical chunks (re-analysed filings, boilerplate shared between years)
+    are therefore encoded once.
+    """
+    
+    def __init__(self, cache_dir: Optional[str] = None):
+        self.cache_dir = cache_dir or _default_cache_dir()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.cache_dir, "embeddings.db"),
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_keys (
+                model TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                PRIMARY KEY (model, chunk_hash)
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embedding_models (
+                model TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL
+            )
+        """)
+    
+    def _vector_path(self, model: str) -> str:
+        safe = re.sub(r'[^A-Za-z0-9_.-]', '_', model)
+        return os.path.join(self.cache_dir, f"{safe}.f32")
+    
+    def _dim(self, model: str) -> Optional[int]:
+        row = self._conn.execute("SELECT dim FROM embedding_models WHERE model = ?", (model,)).fetchone()
+        return row[0] if row else None
+    
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Returns {hash: vector} for the hashes present in the cache."""
+        if not hashes:
+            return {}
+        with self._lock:
+            dim = self._dim(model)
+            if dim is None:
+                return {}
+            found = {}
+            unique = list(dict.fromkeys(hashes))
+            for start in range(0, len(unique), 500):  # stay under SQLite's variable limit
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._conn.execute(
+                    f"SELECT chunk_hash, row FROM embedding_keys WHERE model = ? AND chunk_hash IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall())
+            if not found:
+                return {}
+            path = self._vector_path(model)
+            n_rows = os.path.getsize(path) // (dim * 4)
+            vectors = np.memmap(path, dtype=np.float32, mode='r', shape=(n_rows, dim))
+            keys = [h for h, row in found.items() if row < n_rows]
+            rows = np.fromiter((found[h] for h in keys), dtype=np.int64, count=len(keys))
+            block = np.array(vectors[rows])  # copy out of the memmap
+            del vectors
+        return dict(zip(keys, block))
+    
+    def put_many(self, model: str, hashes: List[str], vectors: np.ndarray) -> None:
+        """Appends vectors for new hashes (existing keys are left untouched)."""
+        if len(hashes) == 0:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        dim = vectors.shape[1]
+        with self._lock:
+            # IMMEDIATE serialises writers across processes sharing the cache
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                known_dim = self._dim(model)
+                if known_dim is None:
+                    self._conn.execute("INSERT INTO embedding_models (model, dim) VALUES (?, ?)", (model, dim))
+                elif known_dim != dim:
+                    raise ValueError(f"Embedding dim changed for {model}: {known_dim} -> {dim}")
+                path = self._vector_path(model)
+                first_row = os.path.getsize(path) // (dim * 4) if os.path.exists(path) else 0
+                with open(path, "ab") as f:
+                    f.write(vectors.tobytes())
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO embedding_keys (model, chunk_hash, row) VALUES (?, ?, ?)",
+                    [(model, h, first_row + i) for i, h in enumerate(hashes)]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Process-wide embedding cache (None if the cache directory is unusable)."""
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            try:
+                _embedding_cache = EmbeddingCache()
+            except Exception as e:
+                logger.warning(f"Embedding cache unavailable: {e}")
+                return None
+        return _embedding_cache
 
 
 # ======================================
 # VECTOR STORE (FAISS-based)
 # ======================================
+# Weight of the (max-normalised) BM25 score in hybrid scoring; the rest is cosine similarity
+HYBRID_LEXICAL_WEIGHT = 0.4
+
+# Section-title fragments (lower case) for each kind of disclosure
+SECTION_HINTS = {
+    "cash_flow": ["cash flow"],
+    "income_statement": ["income statement", "statement of operations", "statements of operations",
+                         "statement of income", "statements of income", "results of operations"],
+    "balance_sheet": ["balance sheet", "financial position", "financial condition"],
+    "risk": ["risk factor"],
+    "mdna": ["management's discussion", "management\u2019s discussion", "md&a"],
+}
+
+# Query keywords -> SECTION_HINTS groups searched first
+QUERY_SECTION_KEYWORDS = [
+    (("cash flow", "capex", "capital expenditure", "capital expenditures", "free cash"), ("cash_flow",)),
+    (("revenue", "sales", "net income", "eps", "earnings per share", "ebitda", "operating income",
+      "gross margin", "gross profit"), ("income_statement", "mdna")),
+    (("debt", "cash and cash equivalents", "total assets", "liabilities", "equity", "inventory"), ("balance_sheet",)),
+    (("risk", "risks"), ("risk",)),
+    (("guidance", "outlook", "segment"), ("mdna",)),
+]
+
+
+def sections_for_query(query: str) -> Optional[List[str]]:
+    """Section-title fragments a query should search first, or None for the whole document."""
+    text = query.lower()
+    for keywords, groups in QUERY_SECTION_KEYWORDS:
+        if any(re.search(rf"\b{re.escape(kw)}\b", text) for kw in keywords):
+            return [fragment for group in groups for fragment in SECTION_HINTS[group]]
+    return None
+
+
 class DocumentIndex:
     """
-    In-memory FAISS index for semantic search over document chunks.
+    In-memory FAISS + BM25 index for search over document chunks.
+    
+    If the embedding stack is unavailable (missing packages, model download
+    failure) the index is built in lexical-only mode and retrieval uses BM25.
     
     Usage:
         index = DocumentIndex()
@@ -137,137 +609,884 @@ class DocumentIndex:
         relevant = index.retrieve("revenue figures", top_k=5)
     """
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, embedding_cache: Optional[EmbeddingCache] = None):
         self.model_name = model_name
-        self.model = None
+        self.model = None  # Optional per-index encoder override; default is the shared model
         self.index = None
+        self.lexical: Optional[BM25Index] = None
+        self.sections: Dict[str, List[int]] = {}  # lower-cased section title -> chunk ids
         self.chunks = []
         self._doc_hash = None
+        self.built_at: Optional[float] = None  # time.monotonic() of the last build
+        # None -> shared on-disk cache; False -> no caching
+        self.embedding_cache = embedding_cache if embedding_cache is not None else get_embedding_cache()
     
-    def build(self, chunks: List[Dict[str, Any]]) -> bool:
-        """Build FAISS index from chunks. Returns False if dependencies missing."""
-        if not _load_dependencies():
-            return False
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encodes with the shared process-wide model (loaded on first use)."""
+        if self.model is not None:
+            return np.asarray(self.model.encode(texts, show_progress_bar=False), dtype=np.float32)
+        return _model_manager.encode(self.model_name, texts)
+    
+    def _cache_key(self) -> str:
+        return self.model_name if self.model is not None else _model_manager.cache_key(self.model_name)
+    
+    def _embed_chunks(self, texts: List[str]) -> np.ndarray:
+        """Normalized chunk embeddings, encoding only texts missing from the cache."""
+        hashes = [chunk_hash(t) for t in texts]
+        cache_key = self._cache_key()
+        cached = self.embedding_cache.get_many(cache_key, hashes) if self.embedding_cache else {}
+        
+        missing = list(dict.fromkeys(h for h in hashes if h not in cached))
+        if missing:
+            text_by_hash = dict(zip(hashes, texts))
+            logger.info(f"Embedding {len(missing)} chunks ({len(texts) - len(missing)} cached)...")
+            new_vecs = self._encode([text_by_hash[h] for h in missing])
+            _faiss.normalize_L2(new_vecs)
+            if self.embedding_cache:
+                try:
+                    self.embedding_cache.put_many(cache_key, missing, new_vecs)
+                except Exception as e:
+                    logger.warning(f"Failed to persist embeddings: {e}")
+            cached.update(zip(missing, new_vecs))
+        else:
+            logger.info(f"All {len(texts)} chunk embeddings served from cache")
         
+        return np.vstack([cached[h] for h in hashes]).astype(np.float32)
+    
+    @property
+    def lexical_only(self) -> bool:
+        return self.index is None and self.lexical is not None
+    
+    def with_provenance(self, provenance_map) -> "DocumentIndex":
+        """
+        View of this index whose chunks carry provenance ids and pages. The FAISS and
+        BM25 structures are shared; the cached index itself is not modified.
+        """
+        view = copy.copy(self)
+        view.chunks = attach_chunk_provenance(self.chunks, provenance_map)
+        return view
+    
+    def build(self, chunks: List[Dict[str, Any]]) -> bool:
+        """
+        Build BM25 + FAISS indexes from chunks. Returns False only if there is nothing
+        to index; without the embedding stack the index is lexical-only.
+        """
         if not chunks:
             logger.warning("No chunks to index")
             return False
         
-        self.chunks = chunks
         texts = [c["text"] for c in chunks]
         
         # Compute hash to detect if we need to rebuild
         doc_hash = hashlib.md5("".join(texts).encode()).hexdigest()
-        if doc_hash == self._doc_hash and self.index is not None:
+        if doc_hash == self._doc_hash and self.lexical is not None:
             logger.info("Index already built for this document")
             return True
         
-        # Load model (lazy, cached)
-        if self.model is None:
-            logger.info(f"Loading embedding model: {self.model_name}")
-            self.model = _SentenceTransformer(self.model_name)
+        self.chunks = chunks
+        self.index = None
+        self.lexical = BM25Index(texts)
+        self.sections = _section_map(chunks)
+        self._doc_hash = doc_hash
+        self.built_at = time.monotonic()
+        
+        if not _load_dependencies():
+            logger.warning("Embedding stack unavailable, index is BM25-only")
+            return True
         
-        # Generate embeddings
-        logger.info(f"Embedding {len(texts)} chunks...")
-        embeddings = self.model.encode(texts, show_progress_bar=False)
+        # Generate embeddings (normalized for cosine similarity; cache-backed)
+        try:
+            embeddings = self._embed_chunks(texts)
+        except Exception as e:
+            logger.warning(f"Embedding failed ({e}), index is BM25-only")
+            return True
         
         # Build FAISS index
         dimension = embeddings.shape[1]
         self.index = _faiss.IndexFlatIP(dimension)  # Inner product (cosine after normalization)
-        
-        # Normalize for cosine similarity
-        _faiss.normalize_L2(embeddings)
         self.index.add(embeddings)
         
-        self._doc_hash = doc_hash
         logger.info(f"FAISS index built with {self.index.ntotal} vectors")
         return True
     
-    def retrieve(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+    def save(self, directory: str, key: str) -> None:
+        """Writes the FAISS index and chunk metadata to <directory>/<key>.faiss / .chunks.json."""
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, key)
+        # Write to temp names then rename, so readers never see a half-written index
+        _faiss.write_index(self.index, base + ".faiss.tmp")
+        with open(base + ".chunks.json.tmp", "w", encoding="utf-8") as f:
+            json.dump({"model_name": self.model_name, "doc_hash": self._doc_hash, "chunks": self.chunks}, f)
+        os.replace(base + ".chunks.json.tmp", base + ".chunks.json")
+        os.replace(base + ".faiss.tmp", base + ".faiss")
+    
+    @classmethod
+    def load(cls, directory: str, key: str) -> Optional["DocumentIndex"]:
+        """Loads a previously saved index, or returns None if absent/unreadable."""
+        base = os.path.join(directory, key)
+        if not (os.path.exists(base + ".faiss") and os.path.exists(base + ".chunks.json")):
+            return None
+        if not _load_dependencies():
+            return None
+        try:
+            with open(base + ".chunks.json", "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            instance = cls(model_name=meta["model_name"], embedding_cache=False)
+            instance.index = _faiss.read_index(base + ".faiss")
+            instance.chunks = meta["chunks"]
+            instance.lexical = BM25Index([c["text"] for c in instance.chunks])
+            instance.sections = _section_map(instance.chunks)
+            instance._doc_hash = meta.get("doc_hash")
+            return instance
+        except Exception as e:
+            logger.warning(f"Could not load saved index {key}: {e}")
+            return None
+    
+    def chunk_ids_for_sections(self, fragments: List[str]) -> List[int]:
+        """Ids of chunks whose section title contains any of the (lower-case) fragments."""
+        ids = []
+        for title, chunk_ids in self.sections.items():
+            if any(fragment in title for fragment in fragments):
+                ids.extend(chunk_ids)
+        return sorted(ids)
+    
+    def retrieve(self, query: str, top_k: int = 5, mode: str = "hybrid",
+                 sections: Optional[List[str]] = None, section_boost: float = 0.0) -> List[Dict[str, Any]]:
         """Retrieve top-K most relevant chunks for a query."""
-        if not self.index or not self.model:
+        return self.retrieve_batch([query], top_k=top_k, mode=mode,
+                                   sections=[sections] if sections else None, section_boost=section_boost)[0]
+    
+    def retrieve_batch(self, queries: List[str], top_k: int = 5, mode: str = "hybrid",
+                       sections: Optional[List[Optional[List[str]]]] = None,
+                       section_boost: float = 0.0) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve top-K chunks for several queries with one encode call. Returns one
+        ranked list per query.
+        
+        mode: "hybrid" (cosine blended with BM25), "dense" or "lexical".
+        Lexical-only indexes always use "lexical".
+        
+        sections: optional per-query section-title fragments (see sections_for_query).
+        With section_boost == 0 those sections are searched first and the rest of
+        the document only fills the remaining slots; with section_boost > 0 the
+        whole document is searched and matching chunks get +section_boost.
+        """
+        if self.lexical is None:
             logger.warning("Index not built, returning empty")
+            return [[] for _ in queries]
+        if not queries:
             return []
+        if self.index is None:
+            mode = "lexical"
         
-        # Embed query
-        query_vec = self.model.encode([query], show_progress_bar=False)
-        _faiss.normalize_L2(query_vec)
+        k = min(top_k, len(self.chunks))
+        pool = k if mode == "dense" else min(len(self.chunks), max(4 * k, 20))
+        allowed = [(self.chunk_ids_for_sections(f) or None) if f else None
+                   for f in (sections or [None] * len(queries))]
+        filtered = [ids if section_boost <= 0 else None for ids in allowed]
         
-        # Search
-        scores, indices = self.index.search(query_vec, min(top_k, len(self.chunks)))
+        query_vecs = None
+        if mode != "lexical":
+            try:
+                # Embed all queries in a single batch
+                query_vecs = self._encode(list(queries))
+                _faiss.normalize_L2(query_vecs)
+            except Exception as e:
+                logger.warning(f"Query embedding failed ({e}), using BM25 only")
+                mode = "lexical"
         
-        results = []
-        for score, idx in zip(scores[0], indices[0]):
-            if idx < len(self.chunks):
+        # Unfiltered queries share one batched search; filtered ones search only their sections
+        dense = [{} for _ in queries]
+        if query_vecs is not None:
+            open_rows = [i for i, ids in enumerate(filtered) if ids is None]
+            if open_rows:
+                for i, scores in zip(open_rows, self._dense_scores(query_vecs[open_rows], pool)):
+                    dense[i] = scores
+            for i, ids in enumerate(filtered):
+                if ids is not None:
+                    dense[i] = self._dense_scores(query_vecs[i:i + 1], min(pool, len(ids)), ids)[0]
+        
+        batch_results = []
+        for i, query in enumerate(queries):
+            ranked = self._rank(query, dense[i], mode, filtered[i])
+            if filtered[i] is not None and len(ranked) < k:
+                rest_dense = self._dense_scores(query_vecs[i:i + 1], pool)[0] if query_vecs is not None else {}
+                seen = {idx for idx, _ in ranked}
+                ranked += [item for item in self._rank(query, rest_dense, mode, None) if item[0] not in seen]
+            elif allowed[i] and section_boost > 0:
+                boosted = set(allowed[i])
+                ranked = sorted(((idx, score + section_boost if idx in boosted else score) for idx, score in ranked),
+                                key=lambda item: item[1], reverse=True)
+            
+            results = []
+            for idx, score in ranked[:k]:
                 chunk = self.chunks[idx].copy()
                 chunk["relevance_score"] = float(score)
                 results.append(chunk)
+            batch_results.append(results)
         
-        return results
+        return batch_results
+    
+    def _rank(self, query: str, dense_scores: Dict[int, float], mode: str,
+              allowed: Optional[List[int]]) -> List[tuple]:
+        """[(chunk id, score)] best first, blending dense candidates with BM25."""
+        if mode == "dense":
+            scores = dense_scores
+        else:
+            lexical = self.lexical.scores(query, allowed=set(allowed) if allowed is not None else None)
+            top_lexical = max(lexical.values(), default=0.0) or 1.0
+            if mode == "lexical":
+                scores = {idx: s / top_lexical for idx, s in lexical.items()}
+            else:
+                # Chunks outside the dense candidate list get the weakest dense score seen
+                floor = min(dense_scores.values(), default=0.0)
+                scores = {
+                    idx: (1 - HYBRID_LEXICAL_WEIGHT) * dense_scores.get(idx, floor)
+                    + HYBRID_LEXICAL_WEIGHT * lexical.get(idx, 0.0) / top_lexical
+                    for idx in set(dense_scores) | set(lexical)
+                }
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    
+    def _dense_scores(self, query_vecs: np.ndarray, k: int, ids: Optional[List[int]] = None) -> List[Dict[int, float]]:
+        """Cosine scores of the k nearest chunks per query vector, optionally only among ids."""
+        params = None
+        if ids is not None:
+            params = _faiss.SearchParameters(sel=_faiss.IDSelectorBatch(np.asarray(ids, dtype=np.int64)))
+        scores, indices = self.index.search(query_vecs, k, params=params)
+        return [
+            {int(idx): float(score) for score, idx in zip(row_scores, row_indices) if 0 <= idx < len(self.chunks)}
+            for row_scores, row_indices in zip(scores, indices)
+        ]
+
+
+def _section_map(chunks: List[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """Inverted map from lower-cased section title to chunk ids."""
+    sections: Dict[str, List[int]] = {}
+    for i, chunk in enumerate(chunks):
+        sections.setdefault(chunk.get("section_title", "").lower(), []).append(i)
+    return sections
+
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Dict[str, Any]]], k: int = 60) -> Dict[int, float]:
+    """
+    Reciprocal-rank fusion: score(chunk) = sum over lists of 1 / (k + rank).
+    Chunks are identified by their "index" field.
+    """
+    fused: Dict[int, float] = {}
+    for results in ranked_lists:
+        for rank, chunk in enumerate(results):
+            fused[chunk["index"]] = fused.get(chunk["index"], 0.0) + 1.0 / (k + rank + 1)
+    return fused
 
 
 # ======================================
-# HIGH-LEVEL RETRIEVAL API
+# INDEX PERSISTENCE + LRU
 # ======================================
-_document_index: Optional[DocumentIndex] = None
+# Indexes are keyed by (model, markdown) hash: retries on the same filing
+# (e.g. One-Strike Recovery) and later runs reuse them without re-chunking
+# or re-embedding.
+INDEX_LRU_SIZE = 8
+# BM25-only fallbacks are cached under their own key; a dense build is retried once the
+# encoder has loaded, or after this many seconds
+LEXICAL_RETRY_SECONDS = 300
+
+_index_lru: "OrderedDict[str, DocumentIndex]" = OrderedDict()
+_index_lru_lock = threading.Lock()
+
+
+def _index_dir() -> str:
+    return os.path.join(_default_cache_dir(), "indexes")
+
+
+def document_key(markdown: str, model_name: str = DEFAULT_EMBEDDING_MODEL) -> str:
+    """Stable key for a document's index (changes if the text, the model/backend or the chunker changes)."""
+    model_key = _model_manager.cache_key(model_name)
+    return hashlib.sha256(f"{model_key}\0{CHUNKER_VERSION}\0{markdown}".encode("utf-8")).hexdigest()
+
+
+def _lru_get(key: str) -> Optional[DocumentIndex]:
+    with _index_lru_lock:
+        index = _index_lru.get(key)
+        if index is not None:
+            _index_lru.move_to_end(key)
+        return index
+
+
+def _lru_pop(key: str) -> None:
+    with _index_lru_lock:
+        _index_lru.pop(key, None)
+
+
+def _lru_put(key: str, index: DocumentIndex) -> None:
+    with _index_lru_lock:
+        _index_lru[key] = index
+        _index_lru.move_to_end(key)
+        while len(_index_lru) > INDEX_LRU_SIZE:
+            _index_lru.popitem(last=False)
+
+
+def _lexical_key(key: str) -> str:
+    return f"{key}@lexical"
+
+
+def _dense_retry_due(index: DocumentIndex, model_name: str) -> bool:
+    """Whether a cached BM25-only index should be rebuilt with embeddings."""
+    if _model_manager.is_loaded(model_name):
+        return True
+    return index.built_at is None or time.monotonic() - index.built_at >= LEXICAL_RETRY_SECONDS
 
 
-def index_document(markdown: str) -> bool:
+def get_or_build_index(markdown: str, model_name: str = DEFAULT_EMBEDDING_MODEL) -> Optional[DocumentIndex]:
     """
-    Index a markdown document for RAG retrieval.
-    Call this once when loading a new document.
+    Returns the index for a document: memory LRU -> disk (faiss.read_index) -> build.
+    Newly built dense indexes are written to disk. Returns None only for an empty document.
+    A BM25-only index (embedding stack unavailable) is cached apart from dense ones and
+    replaced by a dense build once an encoder is available.
     """
-    global _document_index
+    key = document_key(markdown, model_name)
+    
+    index = _lru_get(key)
+    if index is not None:
+        logger.info("Reusing in-memory index for this document")
+        return index
+    
+    index = DocumentIndex.load(_index_dir(), key)
+    if index is not None:
+        logger.info(f"Loaded saved index for this document ({len(index.chunks)} chunks)")
+        _lru_put(key, index)
+        return index
+    
+    lexical_key = _lexical_key(key)
+    index = _lru_get(lexical_key)
+    if index is not None and not _dense_retry_due(index, model_name):
+        logger.info("Reusing BM25-only index for this document")
+        return index
     
     chunks = chunk_by_sections(markdown)
     if not chunks:
-        return False
+        return None
+    index = DocumentIndex(model_name=model_name)
+    if not index.build(chunks):
+        return None
+    # The backend is only certain once the model has loaded (ONNX may have fallen back)
+    key = document_key(markdown, model_name)
+    if index.lexical_only:
+        # Not persisted, and kept out of the dense key space so it is upgraded later
+        _lru_put(lexical_key, index)
+        return index
+    _lru_pop(lexical_key)
+    try:
+        index.save(_index_dir(), key)
+    except Exception as e:
+        logger.warning(f"Failed to persist index: {e}")
+    _lru_put(key, index)
+    return index
+
+
+# ======================================
+# CORPUS INDEX (ALL INGESTED FILINGS)
+# ======================================
+# Filters narrower than this many vectors are searched exactly (brute force over
+# the selected rows); wider ones go through the HNSW graph with an ID selector.
+CORPUS_EXACT_SEARCH_LIMIT = 4096
+CORPUS_HNSW_M = 32
+CORPUS_EF_SEARCH = 128
+
+
+class CorpusIndex:
+    """
+    Cross-filing index keyed by (ticker, filing, period).
+    
+    Chunk vectors from every indexed filing go into one HNSW graph
+    (faiss.IndexIDMap2 over IndexHNSWFlat, inner product), so there is no
+    training step and documents can be appended incrementally. Chunk text and
+    document metadata live in SQLite next to the index; metadata filters
+    become a faiss ID selector over each document's contiguous vector-id range.
+    
+    Writers serialise through a SQLite IMMEDIATE transaction and readers
+    reload the index file when another process has rewritten it.
+    """
+    
+    def __init__(self, directory: Optional[str] = None, model_name: str = DEFAULT_EMBEDDING_MODEL):
+        if not _load_dependencies():
+            raise ImportError("FAISS is not installed")
+        self.model_name = model_name
+        # One corpus per vector space: PyTorch and (int8) ONNX vectors are not mixed
+        self.cache_key = _model_manager.cache_key(model_name)
+        safe = re.sub(r'[^A-Za-z0-9_.-]', '_', self.cache_key)
+        self.directory = directory or os.path.join(_default_cache_dir(), "corpus", safe)
+        os.makedirs(self.directory, exist_ok=True)
+        self.index_path = os.path.join(self.directory, "corpus.faiss")
+        self.index = None
+        self._index_mtime = None
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(self.directory, "corpus.db"),
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS corpus_documents (
+                doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                doc_key TEXT NOT NULL UNIQUE,
+                ticker TEXT,
+                filing TEXT,
+                period TEXT,
+                first_vector_id INTEGER NOT NULL,
+                n_chunks INTEGER NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS corpus_chunks (
+                vector_id INTEGER PRIMARY KEY,
+                doc_id INTEGER NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                section_title TEXT,
+                text TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_corpus_documents_ticker ON corpus_documents(ticker, period)")
+        self._reload_if_changed()
+    
+    def _reload_if_changed(self) -> None:
+        """(Re)reads the index file if it is new or was rewritten by another process."""
+        if not os.path.exists(self.index_path):
+            return
+        mtime = os.path.getmtime(self.index_path)
+        if mtime != self._index_mtime:
+            self.index = _faiss.read_index(self.index_path)
+            self._index_mtime = mtime
+    
+    def _write(self) -> None:
+        _faiss.write_index(self.index, self.index_path + ".tmp")
+        os.replace(self.index_path + ".tmp", self.index_path)
+        self._index_mtime = os.path.getmtime(self.index_path)
+    
+    def has_document(self, doc_key: str) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM corpus_documents WHERE doc_key = ?", (doc_key,)
+        ).fetchone() is not None
+    
+    def add_document(self, doc_index: DocumentIndex, doc_key: str, ticker: Optional[str] = None,
+                     filing: Optional[str] = None, period: Optional[str] = None) -> bool:
+        """
+        Adds a built DocumentIndex's chunk vectors to the corpus.
+        Returns False if the document is already present or has no dense vectors.
+        """
+        return self.add_documents([(doc_index, doc_key, ticker, filing, period)]) == 1
+    
+    def add_documents(self, documents: List[tuple]) -> int:
+        """
+        Adds [(doc_index, doc_key, ticker, filing, period)] in one transaction and writes
+        the index file once, so a backfill does not rewrite the corpus per filing.
+        Documents already present or without dense vectors are skipped. Returns the number added.
+        """
+        documents = [d for d in documents if d[0].index is not None and d[0].chunks]
+        if not documents:
+            return 0
+        added = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._reload_if_changed()
+                first_id = self._conn.execute(
+                    "SELECT COALESCE(MAX(vector_id) + 1, 0) FROM corpus_chunks"
+                ).fetchone()[0]
+                for doc_index, doc_key, ticker, filing, period in documents:
+                    if self.has_document(doc_key):
+                        continue
+                    vectors = doc_index.index.reconstruct_n(0, doc_index.index.ntotal)
+                    if self.index is None:
+                        self.index = _faiss.IndexIDMap2(
+                            _faiss.IndexHNSWFlat(vectors.shape[1], CORPUS_HNSW_M, _faiss.METRIC_INNER_PRODUCT)
+                        )
+                    cursor = self._conn.execute("""
+                        INSERT INTO corpus_documents (doc_key, ticker, filing, period, first_vector_id, n_chunks)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    """, (doc_key, ticker, filing, period, first_id, len(doc_index.chunks)))
+                    doc_id = cursor.lastrowid
+                    self._conn.executemany("""
+                        INSERT INTO corpus_chunks (vector_id, doc_id, chunk_index, section_title, text)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, [(first_id + i, doc_id, c.get("index", i), c.get("section_title"), c["text"])
+                          for i, c in enumerate(doc_index.chunks)])
+                    self.index.add_with_ids(vectors, np.arange(first_id, first_id + len(vectors), dtype=np.int64))
+                    first_id += len(vectors)
+                    added.append((ticker, filing, period, len(vectors)))
+                if added:
+                    self._write()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                # Vectors added in memory are not on disk: drop them with the transaction
+                self._index_mtime = None
+                self.index = None
+                self._reload_if_changed()
+                raise
+        for ticker, filing, period, n in added:
+            logger.info(f"Corpus: added {ticker or '?'} {filing or ''} {period or ''} ({n} chunks)")
+        return len(added)
+    
+    def documents(self, tickers: Optional[List[str]] = None, periods: Optional[List[str]] = None,
+                  filings: Optional[List[str]] = None, latest: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Documents matching the filters; latest=N keeps the N most recent periods per ticker."""
+        clauses, params = [], []
+        for column, values in (("ticker", tickers), ("period", periods), ("filing", filings)):
+            if values:
+                clauses.append(f"{column} IN ({','.join('?' * len(values))})")
+                params.extend(values)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn.execute(f"""
+            SELECT doc_id, doc_key, ticker, filing, period, first_vector_id, n_chunks
+            FROM corpus_documents {where}
+            ORDER BY ticker, period DESC, doc_id DESC
+        """, params).fetchall()
+        columns = ["doc_id", "doc_key", "ticker", "filing", "period", "first_vector_id", "n_chunks"]
+        docs = [dict(zip(columns, row)) for row in rows]
+        if latest:
+            per_ticker: Dict[Any, int] = {}
+            kept = []
+            for doc in docs:
+                per_ticker[doc["ticker"]] = per_ticker.get(doc["ticker"], 0) + 1
+                if per_ticker[doc["ticker"]] <= latest:
+                    kept.append(doc)
+            docs = kept
+        return docs
+    
+    def search(self, query: str, top_k: int = 10, tickers: Optional[List[str]] = None,
+               periods: Optional[List[str]] = None, filings: Optional[List[str]] = None,
+               latest: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Top-K chunks across the corpus, optionally restricted by ticker / period /
+        filing, or to each ticker's `latest` filings.
+        """
+        with self._lock:
+            self._reload_if_changed()
+            if self.index is None or self.index.ntotal == 0:
+                return []
+            
+            query_vec = _model_manager.encode(self.model_name, [query])
+            _faiss.normalize_L2(query_vec)
+            
+            if tickers or periods or filings or latest:
+                docs = self.documents(tickers, periods, filings, latest)
+                if not docs:
+                    return []
+                ids = np.concatenate([
+                    np.arange(d["first_vector_id"], d["first_vector_id"] + d["n_chunks"], dtype=np.int64)
+                    for d in docs
+                ])
+                if len(ids) <= CORPUS_EXACT_SEARCH_LIMIT:
+                    scores = self.index.reconstruct_batch(ids) @ query_vec[0]
+                    order = np.argsort(-scores)[:top_k]
+                    hits = [(int(ids[i]), float(scores[i])) for i in order]
+                else:
+                    params = _faiss.SearchParametersHNSW(sel=_faiss.IDSelectorBatch(ids),
+                                                         efSearch=max(CORPUS_EF_SEARCH, top_k))
+                    scores, found = self.index.search(query_vec, top_k, params=params)
+                    hits = [(int(i), float(sc)) for sc, i in zip(scores[0], found[0]) if i >= 0]
+            else:
+                params = _faiss.SearchParametersHNSW(efSearch=max(CORPUS_EF_SEARCH, top_k))
+                scores, found = self.index.search(query_vec, top_k, params=params)
+                hits = [(int(i), float(sc)) for sc, i in zip(scores[0], found[0]) if i >= 0]
+        
+        return self._hydrate(hits)
+    
+    def _hydrate(self, hits: List[tuple]) -> List[Dict[str, Any]]:
+        """Attaches chunk text and document metadata to (vector_id, score) hits."""
+        if not hits:
+            return []
+        placeholders = ",".join("?" * len(hits))
+        rows = self._conn.execute(f"""
+            SELECT c.vector_id, c.chunk_index, c.section_title, c.text, d.ticker, d.filing, d.period
+            FROM corpus_chunks c JOIN corpus_documents d ON d.doc_id = c.doc_id
+            WHERE c.vector_id IN ({placeholders})
+        """, [vid for vid, _ in hits]).fetchall()
+        by_id = {row[0]: row for row in rows}
+        results = []
+        for vector_id, score in hits:
+            row = by_id.get(vector_id)
+            if row is None:
+                continue
+            results.append({
+                "text": row[3],
+                "section_title": row[2],
+                "index": row[1],
+                "ticker": row[4],
+                "filing": row[5],
+                "period": row[6],
+                "relevance_score": score
+            })
+        return results
+
+
+_corpus_indexes: Dict[str, CorpusIndex] = {}
+_corpus_lock = threading.Lock()
+
+
+def get_corpus_index(model_name: str = DEFAULT_EMBEDDING_MODEL) -> Optional[CorpusIndex]:
+    """Process-wide corpus index for a model and backend (None if FAISS or the cache dir is unavailable)."""
+    key = _model_manager.cache_key(model_name)
+    with _corpus_lock:
+        if key not in _corpus_indexes:
+            try:
+                _corpus_indexes[key] = CorpusIndex(model_name=model_name)
+            except Exception as e:
+                logger.warning(f"Corpus index unavailable: {e}")
+                return None
+        return _corpus_indexes[key]
+
+
+def search_corpus(query: str, top_k: int = 10, **filters) -> List[Dict[str, Any]]:
+    """
+    Search every indexed filing, e.g.
+        search_corpus("goodwill impairment", tickers=holdings, latest=3)
+    """
+    corpus = get_corpus_index()
+    if corpus is None:
+        return []
+    return corpus.search(query, top_k=top_k, **filters)
+
+
+# ======================================
+# CONTEXT PACKING
+# ======================================
+CONTEXT_SEPARATOR = "\n---\n"
+# The knapsack works in units of max_chars / PACK_MAX_UNITS characters
+PACK_MAX_UNITS = 500
+# Most paragraph cut points considered per chunk
+PACK_MAX_CUTS = 8
+
+
+def _paragraph_key(paragraph: str) -> str:
+    return " ".join(paragraph.split()).lower()
+
+
+def _cut_points(paragraphs: List[str]) -> List[int]:
+    """Paragraph counts at which a chunk may be trimmed (always includes the full chunk)."""
+    n = len(paragraphs)
+    if n <= PACK_MAX_CUTS:
+        return list(range(1, n + 1))
+    step = n / PACK_MAX_CUTS
+    return sorted({max(1, round(step * (i + 1))) for i in range(PACK_MAX_CUTS)} | {n})
+
+
+def pack_context(candidates: List[Dict[str, Any]], max_chars: int) -> str:
+    """
+    Packs retrieved chunks into at most max_chars characters.
+    
+    candidates: [{"header", "text", "value"}] in output order (best first).
+    
+    1. Each chunk may be kept whole or trimmed to a prefix of its paragraphs;
+       a prefix is worth value * (kept chars / chunk chars). Tables contain no
+       blank lines, so a trim never cuts through one.
+    2. A group knapsack picks at most one version per chunk to maximise total value.
+    3. Paragraphs already emitted by an earlier chosen chunk are dropped (overlap
+       dedup). This runs on the chosen set only, so a paragraph shared with a chunk
+       the knapsack dropped or trimmed is still kept; dropping only shrinks the
+       output, so it stays within max_chars.
+    """
+    if max_chars <= 0:
+        return ""
+    
+    groups = []  # (candidate position, [(chars, value, paragraphs)])
+    for pos, cand in enumerate(candidates):
+        seen = set()
+        paragraphs = []
+        for para in cand["text"].split("\n\n"):
+            key = _paragraph_key(para)
+            if key and key not in seen:
+                seen.add(key)
+                paragraphs.append(para)
+        if not paragraphs or cand["value"] <= 0:
+            continue
+        total_len = sum(len(p) for p in paragraphs)
+        options = []
+        for cut in _cut_points(paragraphs):
+            text = "\n\n".join(paragraphs[:cut])
+            chars = len(cand["header"]) + len(text) + 1 + len(CONTEXT_SEPARATOR)
+            options.append((chars, cand["value"] * sum(len(p) for p in paragraphs[:cut]) / total_len, paragraphs[:cut]))
+        groups.append((pos, options))
+    
+    if not groups:
+        return ""
+    
+    # Weights are rounded up, so the chosen set can never exceed max_chars
+    unit = max(1, -(-max_chars // PACK_MAX_UNITS))
+    capacity = max_chars // unit
+    best = np.zeros(capacity + 1)
+    choices = []
+    for _, options in groups:
+        new_best = best.copy()
+        choice = np.full(capacity + 1, -1, dtype=np.int32)
+        for opt_idx, (chars, opt_value, _) in enumerate(options):
+            weight = -(-chars // unit)
+            if weight > capacity:
+                continue
+            candidate = np.full(capacity + 1, -np.inf)
+            candidate[weight:] = best[:capacity + 1 - weight] + opt_value
+            better = candidate > new_best
+            new_best[better] = candidate[better]
+            choice[better] = opt_idx
+        choices.append(choice)
+        best = new_best
+    
+    # Backtrack
+    picked = {}
+    remaining = int(np.argmax(best))
+    for (pos, options), choice in zip(reversed(groups), reversed(choices)):
+        opt_idx = int(choice[remaining])
+        if opt_idx >= 0:
+            picked[pos] = options[opt_idx][2]
+            remaining -= -(-options[opt_idx][0] // unit)
     
-    _document_index = DocumentIndex()
-    return _document_index.build(chunks)
+    # Overlap dedup against the chosen chunks, in output order
+    shown = set()
+    parts = []
+    for pos in sorted(picked):
+        kept = []
+        for para in picked[pos]:
+            key = _paragraph_key(para)
+            if key not in shown:
+                shown.add(key)
+                kept.append(para)
+        if kept:
+            parts.append(f"{candidates[pos]['header']}" + "\n\n".join(kept) + "\n")
+    return CONTEXT_SEPARATOR.join(parts)
 
 
-def retrieve_context(query: str, top_k: int = 8, max_chars: int = 20000) -> str:
+# ======================================
+# HIGH-LEVEL RETRIEVAL API
+# ======================================
+def index_document(markdown: str, ticker: Optional[str] = None, filing: Optional[str] = None,
+                   period: Optional[str] = None, provenance_map=None) -> Optional[DocumentIndex]:
+    """
+    Index a markdown document for RAG retrieval and return its index.
+    Cheap to call repeatedly: indexes are reused from memory or disk.
+    
+    The index is returned rather than stored globally, so concurrent jobs each
+    retrieve from their own document. When ticker is given the filing is also
+    added to the corpus index. When the parser's provenance_map is given, the
+    returned index is a per-call view whose chunks are mapped to their PDF pages,
+    so retrieved context is labelled with them.
+    """
+    index = get_or_build_index(markdown)
+    if index is None:
+        return None
+    base_index = index
+    if provenance_map is not None:
+        try:
+            index = index.with_provenance(provenance_map)
+        except Exception as e:
+            logger.warning(f"Could not map chunks to provenance: {e}")
+    if ticker and not base_index.lexical_only:
+        try:
+            corpus = get_corpus_index(base_index.model_name)
+            if corpus is not None:
+                corpus.add_document(base_index, document_key(markdown, base_index.model_name),
+                                    ticker=ticker, filing=filing, period=period)
+        except Exception as e:
+            logger.warning(f"Could not add document to corpus index: {e}")
+    return index
+
+
+def index_filings(filings: List[Dict[str, Any]], model_name: str = DEFAULT_EMBEDDING_MODEL) -> int:
+    """
+    Backfill the corpus: indexes [{"markdown", "ticker", "filing", "period"}] and adds
+    them with a single corpus index write. Returns the number of filings added.
+    """
+    batch = []
+    for filing in filings:
+        index = get_or_build_index(filing["markdown"], model_name)
+        if index is None or index.lexical_only:
+            continue
+        batch.append((index, document_key(filing["markdown"], model_name),
+                      filing.get("ticker"), filing.get("filing"), filing.get("period")))
+    corpus = get_corpus_index(model_name)
+    if corpus is None or not batch:
+        return 0
+    return corpus.add_documents(batch)
+
+
+def retrieve_context(index: Optional[DocumentIndex], query: str, top_k: int = 8, max_chars: int = 20000) -> str:
     """
     Retrieve relevant context for a query.
     
     Args:
+        index: Document index returned by index_document
         query: The metric or question to search for
         top_k: Number of chunks to retrieve
         max_chars: Maximum total characters to return
     
     Returns:
-        Concatenated relevant chunks as context string
+        Concatenated relevant chunks as context string, packed to fit max_chars
     """
-    global _document_index
-    
-    if _document_index is None:
+    if index is None:
         logger.warning("No document indexed, cannot retrieve")
         return ""
     
-    results = _document_index.retrieve(query, top_k=top_k)
-    
-    # Build context string with section headers
-    context_parts = []
-    total_chars = 0
+    results = index.retrieve(query, top_k=top_k)
     
+    candidates = []
     for chunk in results:
         section = chunk.get("section_title", "Unknown")
-        text = chunk.get("text", "")
         score = chunk.get("relevance_score", 0)
-        
-        formatted = f"\n[Section: {section}] (Relevance: {score:.2f})\n{text}\n"
-        
-        if total_chars + len(formatted) > max_chars:
-            break
-        
-        context_parts.append(formatted)
-        total_chars += len(formatted)
+        candidates.append({
+            "header": f"\n[Section: {section}]{_pages_label(chunk)} (Relevance: {score:.2f})\n",
+            "text": chunk.get("text", ""),
+            "value": max(score, 0.0)
+        })
+    
+    return pack_context(candidates, max_chars)
+
+
+def retrieve_context_multi(index: Optional[DocumentIndex], queries: Dict[str, str], top_k: int = 5,
+                           max_chars: int = 20000, sections: Optional[Dict[str, List[str]]] = None) -> str:
+    """
+    Retrieve context for several labelled queries (e.g. one per metric) under one budget.
+    
+    All queries are embedded and searched in one batch. For packing, a chunk is
+    worth 1/(rank+1) to every label that retrieved it, so each metric's best
+    hit outweighs anyone's runners-up and rarer metrics are not crowded out.
+    Output is ordered by reciprocal-rank-fusion score.
+    
+    sections: optional {label: section-title fragments} searched first for that label.
+    """
+    if index is None:
+        logger.warning("No document indexed, cannot retrieve")
+        return ""
+    
+    labels = list(queries)
+    ranked = index.retrieve_batch([queries[label] for label in labels], top_k=top_k,
+                                  sections=[(sections or {}).get(label) for label in labels])
+    fused = reciprocal_rank_fusion(ranked)
+    
+    # Which labels each chunk serves (shown to the LLM as a hint) and its packing value
+    served_by: Dict[int, List[str]] = {}
+    value: Dict[int, float] = {}
+    chunks: Dict[int, Dict[str, Any]] = {}
+    for label, results in zip(labels, ranked):
+        for rank, chunk in enumerate(results):
+            idx = chunk["index"]
+            served_by.setdefault(idx, []).append(label)
+            value[idx] = value.get(idx, 0.0) + 1.0 / (rank + 1)
+            chunks[idx] = chunk
+    
+    candidates = []
+    for idx in sorted(chunks, key=lambda i: fused[i], reverse=True):
+        section = chunks[idx].get("section_title", "Unknown")
+        candidates.append({
+            "header": f"\n[Section: {section}]{_pages_label(chunks[idx])} (Relevance: {fused[idx]:.3f}) "
+                      f"[For: {', '.join(served_by[idx])}]\n",
+            "text": chunks[idx].get("text", ""),
+            "value": value[idx]
+        })
     
-    return "\n---\n".join(context_parts)
+    return pack_context(candidates, max_chars)
 
 
-def get_context_for_metrics(metrics: List[str], markdown: str, max_chars: int = 25000) -> str:
+def get_context_for_metrics(metrics: List[str], markdown: str, max_chars: int = 25000,
+                            ticker: Optional[str] = None, filing: Optional[str] = None,
+                            period: Optional[str] = None, provenance_map=None) -> str:
     """
     Get relevant context for extracting specific metrics.
     
@@ -277,17 +1496,22 @@ def get_context_for_metrics(metrics: List[str], markdown: str, max_chars: int =
         metrics: List of metric names to search for (e.g., ["Revenue", "Net Income"])
         markdown: Full document markdown
         max_chars: Maximum context size
+        ticker, filing, period: Optional labels; when given, the filing is added to the corpus index
+        provenance_map: Optional parser provenance; excerpts are then labelled with their PDF pages
     
     Returns:
         Relevant document excerpts optimized for the metric extraction task
     """
-    # Index document if needed
-    if not index_document(markdown):
+    # Index document if needed (BM25-only when embeddings are unavailable)
+    index = index_document(markdown, ticker=ticker, filing=filing, period=period, provenance_map=provenance_map)
+    if index is None:
         # Fallback to truncated full context
         logger.warning("RAG indexing failed, using truncated context")
         return markdown[:max_chars]
     
-    # Build composite query from metrics
-    query = f"Financial data for: {', '.join(metrics)}. Income statement, revenue, expenses, cash flow."
+    # One query per metric, batched and fused under the shared budget
+    queries = {metric: f"{metric}: reported figure in the financial statements" for metric in metrics}
+    # e.g. cash-flow metrics search the cash flow statement first
+    sections = {metric: sections_for_query(metric) for metric in metrics}
     
-    return retrieve_context(query, top_k=10, max_chars=max_chars)
+    return retrieve_context_multi(index, queries, top_k=10, max_chars=max_chars, sections=sections)
@@ -1,16 +1,19 @@
 import asyncio
-import json
 import logging
 import os
+import re
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, Optional
 
 from src.parsers.financial_pdf import FinancialPDFParser
+from src.parsers.provenance import ProvenanceStore
 from src.agents.quant import QuantAgent
 from src.agents.auditor import AuditorAgent
 from src.agents.auditor_logic import CoordinateVerifier
 from src.agents.qual import QualAgent
 from src.agents.consolidator import ConsolidatorAgent
+from src.utils import db
+from src.utils.llm import AsyncLLMSession
 
 # Configure Logging
 logging.basicConfig(level=logging.INFO)
@@ -26,20 +29,41 @@ class EarningsAuditOrchestrator:
         self.coord_verifier = CoordinateVerifier()
         self.log_history = []
 
-    async def run_workflow(self, pdf_path: str) -> Dict[str, Any]:
+    async def run_workflow(self, pdf_path: str, ticker: Optional[str] = None, period: Optional[str] = None) -> Dict[str, Any]:
         """
         Executes the full Institutional Earnings Workflow with One-Strike Recovery.
+        ticker/period label the stored report and the corpus entry; when not given they are
+        inferred from the filename.
         """
+        try:
+            return await self._run_workflow(pdf_path, ticker, period)
+        finally:
+            # Release the PDFs the coordinate verifier kept open for this run
+            self.coord_verifier.close()
+
+    async def _run_workflow(self, pdf_path: str, ticker: Optional[str], period: Optional[str]) -> Dict[str, Any]:
         run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        ticker = ticker or self._infer_ticker(pdf_path)
+        period = period or self._infer_period(pdf_path)
         logger.info(f"--- Starting Audit Run {run_id} for {pdf_path} ---")
 
         # 1. PARSE (Foundation)
         parse_result = self.parser.parse(pdf_path)
         markdown = parse_result["markdown"]
+        provenance_map = parse_result.get("provenance_map")
+        provenance_store = ProvenanceStore(provenance_map or [])
+        
+        # Warm the per-document index that the Quant agent retrieves from, and file
+        # the filing in the cross-filing corpus
+        try:
+            from src.utils.rag import index_document
+            index_document(markdown, ticker=ticker, filing=os.path.basename(pdf_path), period=period)
+        except Exception as e:
+            logger.warning(f"Document indexing skipped: {e}")
         
-        # 2. EXTRACT (Quant)
+        # 2. EXTRACT (Quant) - retrieved sections are labelled with their PDF pages
         logger.info("Asking Quant Agent to extract metrics (Attempt 1)...")
-        quant_result = self.quant.extract_metrics(markdown)
+        quant_result = self.quant.extract_metrics(markdown, provenance_map=provenance_map)
         
         if "error" in quant_result:
              logger.error("Quant failed to produce JSON.")
@@ -51,17 +75,29 @@ class EarningsAuditOrchestrator:
         # 3. VERIFICATION - PARALLEL FIRST PASS
         # =====================================
         # Performance Optimization: Run all initial verifications concurrently.
-        # This reduces O(N) latency to O(1) for the first pass.
+        # This reduces O(N) latency to O(1) for the first pass. PyMuPDF work runs
+        # in a worker thread and Auditor calls share one async LLM session
+        # (closed before this loop ends), so the event loop is never blocked.
         logger.info(f"Running parallel verification on {len(metrics)} metrics...")
         
+        # Physical checks for the whole first pass in one batch, grouped by page,
+        # so each page's words are extracted once
+        for metric in metrics:
+            self._anchor_provenance(metric, provenance_store)
+        jump_checks = await asyncio.to_thread(
+            self.coord_verifier.verify_jumps, pdf_path, [self._jump_claim(m) for m in metrics]
+        )
+        
         async def verify_with_index(idx: int, metric: Dict[str, Any]):
             """Wrapper to preserve metric index for result mapping."""
-            result = await self.verify_single_metric(metric, pdf_path)
+            result = await self.verify_single_metric(metric, pdf_path, provenance_store,
+                                                     jump_check=jump_checks[idx], llm_session=llm_session)
             return idx, metric, result
         
         # Launch all verifications concurrently
-        verification_tasks = [verify_with_index(i, m) for i, m in enumerate(metrics)]
-        first_pass_results = await asyncio.gather(*verification_tasks)
+        async with AsyncLLMSession() as llm_session:
+            verification_tasks = [verify_with_index(i, m) for i, m in enumerate(metrics)]
+            first_pass_results = await asyncio.gather(*verification_tasks)
         
         logger.info("Parallel verification complete. Processing results...")
         
@@ -93,7 +129,8 @@ class EarningsAuditOrchestrator:
             feedback = f"Error in {metric_id}: {audit_result.get('note')}. {audit_result.get('details')}"
             
             # Re-query Quant with Feedback
-            retry_output = self.quant.extract_metrics(markdown, target_metrics=[metric_id], feedback=feedback)
+            retry_output = self.quant.extract_metrics(markdown, target_metrics=[metric_id], feedback=feedback,
+                                                      provenance_map=provenance_map)
             
             # Extract corrected metric from response
             corrected_metrics_list = retry_output.get("metrics", [])
@@ -102,7 +139,7 @@ class EarningsAuditOrchestrator:
             if corrected_metric:
                 logger.info(f"Quant provided correction: {corrected_metric.get('value_raw')}")
                 # Re-Verify
-                audit_result_2 = await self.verify_single_metric(corrected_metric, pdf_path)
+                audit_result_2 = await self.verify_single_metric(corrected_metric, pdf_path, provenance_store)
                 
                 if audit_result_2["status"] == "verified":
                      logger.info(f"Recovery Successful for {metric_id}")
@@ -157,6 +194,8 @@ class EarningsAuditOrchestrator:
             "run_id": run_id,
             "timestamp": datetime.now().isoformat(),
             "pdf_path": pdf_path,
+            "ticker": ticker,
+            "period": period,
             "metrics": verified_metrics,
             "qual_analysis": qual_result,
             "institutional_thesis": thesis_result,
@@ -168,10 +207,18 @@ class EarningsAuditOrchestrator:
         self.save_log(final_report)
         return final_report
 
-    async def verify_single_metric(self, metric: Dict[str, Any], pdf_path: str) -> Dict[str, Any]:
+    async def verify_single_metric(self, metric: Dict[str, Any], pdf_path: str,
+                                   provenance_store: Optional[ProvenanceStore] = None,
+                                   jump_check: Optional[Dict[str, Any]] = None,
+                                   llm_session: Optional[AsyncLLMSession] = None) -> Dict[str, Any]:
         """
         The Verification Triad: Physical, Logic, Vision.
+        A metric with a source snippet but no coordinates is anchored to the
+        parsed element containing that snippet before the physical check.
+        jump_check: physical check result already computed in a batch (see verify_jumps).
+        llm_session: open AsyncLLMSession for the Auditor call (else the executor-backed client).
         """
+        self._anchor_provenance(metric, provenance_store)
         provenance = metric.get("provenance", {})
         bbox = provenance.get("bbox")
         page = provenance.get("page")
@@ -179,7 +226,10 @@ class EarningsAuditOrchestrator:
         
         # A. PHYSICAL CHECK (Coordinate JUMP)
         if bbox and page:
-            jump_check = self.coord_verifier.verify_jump(pdf_path, page, bbox, metric.get("value_raw"))
+            if jump_check is None:
+                jump_check = await asyncio.to_thread(
+                    self.coord_verifier.verify_jump, pdf_path, page, bbox, metric.get("value_raw")
+                )
             if not jump_check["match"]:
                  return {
                     "status": "error_detected",
@@ -190,7 +240,7 @@ class EarningsAuditOrchestrator:
 
         # B. LOGIC & VISION CHECK (Auditor Agent)
         context_text = snippet 
-        audit_response = self.auditor.verify_metric(metric, context_text)
+        audit_response = await self.auditor.verify_metric_async(metric, context_text, llm_session=llm_session)
         
         return {
             "status": audit_response.get("verification_status", "unknown"),
@@ -198,14 +248,61 @@ class EarningsAuditOrchestrator:
             "details": audit_response.get("error_details", "")
         }
 
+    @staticmethod
+    def _anchor_provenance(metric: Dict[str, Any], provenance_store: Optional[ProvenanceStore]) -> None:
+        """Fills page/bbox for a snippet-only metric from the parsed element containing the snippet."""
+        provenance = metric.get("provenance", {})
+        snippet = provenance.get("source_snippet")
+        if provenance.get("bbox") or not snippet or provenance_store is None:
+            return
+        element = provenance_store.locate(snippet, page=provenance.get("page"))
+        if element and element.get("bbox"):
+            provenance.update({"page": element.get("page"), "bbox": element.get("bbox")})
+            metric["provenance"] = provenance
+
+    @staticmethod
+    def _jump_claim(metric: Dict[str, Any]) -> Optional[tuple]:
+        """(page, bbox, value_raw) for the physical check, or None if the metric has no coordinates."""
+        provenance = metric.get("provenance", {})
+        if provenance.get("bbox") and provenance.get("page"):
+            return provenance["page"], provenance["bbox"], metric.get("value_raw")
+        return None
+
+    @staticmethod
+    def _filing_name(pdf_path: str) -> str:
+        """Filename without the upload prefix ('4b154bb9_AAPL 10-K 2024.pdf' -> 'AAPL 10-K 2024.pdf')."""
+        return re.sub(r"^[0-9a-f]{8}_", "", os.path.basename(pdf_path or ""))
+
+    @classmethod
+    def _infer_ticker(cls, pdf_path: str) -> Optional[str]:
+        """
+        Ticker named in the filename, if it is one of the held tickers. Company names are
+        not guessed into tickers ('SHOPIFY Form 10-K 2024.pdf' -> None), so ticker-filtered
+        lookups never see a company word stored as a ticker.
+        """
+        name = os.path.splitext(cls._filing_name(pdf_path))[0]
+        tokens = [t for t in re.split(r"[\s_\-]+", name) if t]
+        try:
+            held = {h["ticker"].upper() for h in db.get_all_holdings() if h.get("ticker")}
+        except Exception as e:
+            logger.warning(f"Could not read holdings for ticker inference: {e}")
+            held = set()
+        for token in tokens:
+            if token.upper() in held:
+                return token.upper()
+        return None
+
+    @classmethod
+    def _infer_period(cls, pdf_path: str) -> Optional[str]:
+        """Best-effort fiscal year from the filename (e.g. 'SHOPIFY Form 10-K 2024.pdf' -> '2024')."""
+        match = re.search(r"(?<!\d)((?:19|20)\d{2})(?!\d)", cls._filing_name(pdf_path))
+        return match.group(1) if match else None
+
     def save_log(self, report):
-        log_file = "verification_log.json"
+        """Persists the report to the verification_logs table (compressed, indexed per metric)."""
         try:
-            with open(log_file, "w") as f:
-                json.dump(report, f, indent=2)
-            logger.info(f"Audit Log saved to {log_file}")
-            
-            # Save chain of events logs too if needed, but report has the history
+            log_id = db.insert_verification_log(report)
+            logger.info(f"Audit Log saved to database (verification_logs id={log_id})")
         except Exception as e:
             logger.error(f"Failed to save log: {e}")
 
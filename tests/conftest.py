@@ -0,0 +1,14 @@
+"""
+Pytest setup: src.utils.db creates and migrates its schema at import, so the
+database is pointed at a throwaway file before any test module imports it.
+"""
+import os
+import shutil
+import tempfile
+
+_db_dir = tempfile.mkdtemp(prefix="gvd_test_db_")
+os.environ["GVD_DB_PATH"] = os.path.join(_db_dir, "gvd_engine.db")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_db_dir, ignore_errors=True)
@@ -38,11 +38,11 @@ async def run_demo():
     print(f"    Metrics Processed: {len(result.get('metrics', []))}")
     print(f"    Run ID: {result.get('run_id')}")
     
-    log_path = "verification_log.json"
-    if os.path.exists(log_path):
-        print(f"\n>>> AUDIT LOG GENERATED: {os.path.abspath(log_path)}")
+    from src.utils import db
+    if db.get_verification_log(result.get("run_id")):
+        print(f"\n>>> AUDIT LOG STORED: verification_logs run_id={result.get('run_id')}")
     else:
-        print("\n>>> ERROR: Log file not found.")
+        print("\n>>> ERROR: Audit log not found in database.")
 
 if __name__ == "__main__":
     asyncio.run(run_demo())
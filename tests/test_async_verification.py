@@ -0,0 +1,145 @@
+"""
+Test Async Verification
+=======================
+verify_single_metric keeps the event loop free: the PyMuPDF check runs in a
+worker thread and Auditor calls are awaited, so gathered metrics overlap.
+"""
+import unittest
+import asyncio
+import gc
+import os
+import sys
+import threading
+import time
+import weakref
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.workflows.earnings_audit import EarningsAuditOrchestrator
+from src.utils.llm import AsyncLLMSession
+
+LLM_LATENCY = 0.2
+
+
+class SlowAuditor:
+    """Async auditor stub: each call takes LLM_LATENCY seconds."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def verify_metric_async(self, metric, context_text, image_crop_path=None, llm_session=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(LLM_LATENCY)
+        self.in_flight -= 1
+        return {"verification_status": "verified", "auditor_note": "ok"}
+
+
+class RecordingVerifier:
+    """Coordinate verifier stub that records which thread ran each check."""
+
+    def __init__(self):
+        self.threads = []
+        self.closed = 0
+
+    def close(self):
+        self.closed += 1
+
+    def verify_jump(self, pdf_path, page_num, bbox, claimed_text):
+        self.threads.append(threading.get_ident())
+        time.sleep(0.05)
+        return {"match": True, "ground_truth_text": claimed_text}
+
+
+class TestAsyncVerification(unittest.TestCase):
+
+    def setUp(self):
+        # Agents are replaced by stubs, so skip the real constructor
+        self.orchestrator = EarningsAuditOrchestrator.__new__(EarningsAuditOrchestrator)
+        self.orchestrator.auditor = SlowAuditor()
+        self.orchestrator.coord_verifier = RecordingVerifier()
+
+    def _metrics(self, n):
+        return [{"metric_id": f"m{i}", "value_raw": "10.4",
+                 "provenance": {"page": 1, "bbox": [0, 0, 10, 10], "source_snippet": "10.4"}} for i in range(n)]
+
+    def test_metrics_verify_concurrently(self):
+        async def run():
+            loop_thread = threading.get_ident()
+            start = time.perf_counter()
+            results = await asyncio.gather(*(self.orchestrator.verify_single_metric(m, "filing.pdf")
+                                             for m in self._metrics(5)))
+            return loop_thread, time.perf_counter() - start, results
+
+        loop_thread, elapsed, results = asyncio.run(run())
+        self.assertEqual([r["status"] for r in results], ["verified"] * 5)
+        self.assertEqual(self.orchestrator.auditor.max_in_flight, 5)
+        # Sequential would take 5 * (0.05 + 0.2) seconds
+        self.assertLess(elapsed, 3 * LLM_LATENCY)
+        self.assertNotIn(loop_thread, self.orchestrator.coord_verifier.threads)
+
+    def test_workflow_closes_verifier_even_on_failure(self):
+        class FailingParser:
+            def parse(self, pdf_path):
+                raise RuntimeError("corrupt PDF")
+
+        self.orchestrator.parser = FailingParser()
+        with self.assertRaises(RuntimeError):
+            asyncio.run(self.orchestrator.run_workflow("filing.pdf"))
+        self.assertEqual(self.orchestrator.coord_verifier.closed, 1)
+
+    def test_filing_is_indexed_under_inferred_ticker_and_period(self):
+        class StubParser:
+            def parse(self, pdf_path):
+                return {"markdown": "# Filing", "provenance_map": []}
+
+        class FailingQuant:
+            def extract_metrics(self, markdown, provenance_map=None):
+                return {"error": "no JSON"}
+
+        self.orchestrator.parser = StubParser()
+        self.orchestrator.quant = FailingQuant()
+        with patch("src.utils.rag.index_document") as index_document, \
+             patch("src.workflows.earnings_audit.db.get_all_holdings", return_value=[{"ticker": "SHOP"}]):
+            asyncio.run(self.orchestrator.run_workflow("temp/uploads/4b154bb9_Annual report SHOP 10-K 2024.pdf"))
+            asyncio.run(self.orchestrator.run_workflow("temp/uploads/1a2b3c4d_ADOBE Form 10-K 2023.pdf"))
+            asyncio.run(self.orchestrator.run_workflow("filing.pdf", ticker="AAPL", period="FY2025"))
+        labels = [(c.kwargs["ticker"], c.kwargs["period"]) for c in index_document.call_args_list]
+        self.assertEqual(labels, [("SHOP", "2024"), (None, "2023"), ("AAPL", "FY2025")])
+
+    def test_precomputed_jump_check_is_used(self):
+        mismatch = {"match": False, "ground_truth_text": "1.04"}
+        result = asyncio.run(self.orchestrator.verify_single_metric(self._metrics(1)[0], "filing.pdf", jump_check=mismatch))
+        self.assertEqual(result["status"], "error_detected")
+        self.assertEqual(self.orchestrator.coord_verifier.threads, [])
+        self.assertEqual(self.orchestrator.auditor.max_in_flight, 0)
+
+
+class TestAsyncLLMSession(unittest.TestCase):
+    """The grpc.aio channel is closed with the session, so finished job loops can be freed."""
+
+    def test_closed_sessions_release_their_loops(self):
+        loops = []
+
+        async def job():
+            loops.append(weakref.ref(asyncio.get_running_loop()))
+            async with AsyncLLMSession() as session:
+                self.assertIsNotNone(session._client)
+            self.assertIsNone(session._client)
+
+        for _ in range(4):
+            asyncio.run(job())
+        gc.collect()
+        # grpc's poller keeps only the most recently bound loop; earlier job loops are freed
+        self.assertEqual([ref() for ref in loops[:3]], [None, None, None])
+
+    def test_generate_requires_open_session(self):
+        with self.assertRaises(RuntimeError):
+            asyncio.run(AsyncLLMSession().generate_text("hi"))
+
+
+if __name__ == '__main__':
+    unittest.main()
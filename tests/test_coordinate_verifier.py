@@ -0,0 +1,87 @@
+"""
+Test Coordinate Verifier
+========================
+JUMP checks against a generated PDF: documents stay open between claims,
+each page's words are extracted once, and batch results come back in order.
+"""
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+import fitz
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.agents import auditor_logic
+from src.agents.auditor_logic import CoordinateVerifier
+
+# Second line of each page: "Cash and cash equivalents 28,840" (p1), "Total revenue 10.4" (p2)
+LINE_BBOX = [60, 85, 400, 110]
+
+
+class TestCoordinateVerifier(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pdf = self._make_pdf("filing.pdf")
+        self.verifier = CoordinateVerifier()
+
+    def tearDown(self):
+        self.verifier.close()
+        self.tmp_dir.cleanup()
+
+    def _make_pdf(self, name):
+        path = os.path.join(self.tmp_dir.name, name)
+        with fitz.open() as pdf:
+            for lines in (["Consolidated Balance Sheets", "Cash and cash equivalents 28,840"],
+                          ["Income Statement", "Total revenue 10.4"]):
+                page = pdf.new_page()
+                for i, line in enumerate(lines):
+                    page.insert_text((72, 72 + 30 * i), line)
+            pdf.save(path)
+        return path
+
+    def test_match_and_mismatch(self):
+        self.assertTrue(self.verifier.verify_jump(self.pdf, 1, LINE_BBOX, "28,840")["match"])
+        mismatch = self.verifier.verify_jump(self.pdf, 1, LINE_BBOX, "2,884")
+        self.assertFalse(mismatch["match"])
+        self.assertEqual(mismatch["ground_truth_text"], "Cash and cash equivalents 28,840")
+        self.assertIn("out of bounds", self.verifier.verify_jump(self.pdf, 9, LINE_BBOX, "x")["error"])
+
+    def test_document_opened_once_and_page_words_extracted_once(self):
+        with patch.object(auditor_logic.fitz, "open", wraps=fitz.open) as opened, \
+             patch.object(fitz.Page, "get_text", autospec=True, side_effect=fitz.Page.get_text) as get_text:
+            for claim in ("28,840", "Cash", "28,840"):
+                self.verifier.verify_jump(self.pdf, 1, LINE_BBOX, claim)
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(get_text.call_count, 1)
+
+    def test_batch_results_in_input_order(self):
+        claims = [(2, LINE_BBOX, "10.4"), None, (1, LINE_BBOX, "28,840"), (2, LINE_BBOX, "99.9"), (5, LINE_BBOX, "1")]
+        results = self.verifier.verify_jumps(self.pdf, claims)
+        self.assertEqual([r and r["match"] for r in results], [True, None, True, False, False])
+        self.assertEqual([r["page"] for r in (results[0], results[2])], [2, 1])
+        self.assertIn("error", results[4])
+
+    def test_lru_closes_oldest_document(self):
+        verifier = CoordinateVerifier(max_open_documents=1)
+        verifier.verify_jump(self.pdf, 1, LINE_BBOX, "28,840")
+        first_doc = next(iter(verifier._documents.values()))[0]
+        verifier.verify_jump(self._make_pdf("other.pdf"), 1, LINE_BBOX, "28,840")
+        self.assertTrue(first_doc.is_closed)
+        self.assertEqual(len(verifier._documents), 1)
+        verifier.close()
+
+    def test_context_manager_closes_documents(self):
+        with CoordinateVerifier() as verifier:
+            verifier.verify_jump(self.pdf, 1, LINE_BBOX, "28,840")
+            doc = next(iter(verifier._documents.values()))[0]
+        self.assertTrue(doc.is_closed)
+        self.assertEqual(len(verifier._documents), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
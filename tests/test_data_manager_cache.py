@@ -0,0 +1,198 @@
+"""
+Test DataManager Cache Invalidation
+====================================
+Caches are rebuilt only when table_versions shows a write to the backing table.
+Runs against a throwaway database file, never data/gvd_engine.db.
+"""
+import unittest
+import os
+import sys
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import db
+
+
+def _reset_connection():
+    conn = getattr(db._local, "connection", None)
+    if conn is not None:
+        conn.close()
+    db._local.connection = None
+
+
+class _TempDBTestCase(unittest.TestCase):
+    """Fresh DataManager bound to a temporary database."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_path = db.DB_PATH
+        _reset_connection()
+        db.DB_PATH = os.path.join(self.tmp_dir.name, "test.db")
+        db.init_database()
+
+        from src.utils.data_manager import DataManager
+        self.original_instance = DataManager._instance
+        DataManager._instance = None
+        with patch.object(DataManager, "_migrate_legacy_data"):
+            self.dm = DataManager()
+
+    def tearDown(self):
+        from src.utils.data_manager import DataManager
+        DataManager._instance = self.original_instance
+        _reset_connection()
+        db.DB_PATH = self.original_path
+        self.tmp_dir.cleanup()
+
+
+class TestDataManagerCache(_TempDBTestCase):
+
+    def test_triggers_bump_versions(self):
+        before = db.get_table_versions()
+        db.upsert_holding({"Ticker": "AAPL", "Shares": 1, "Market Value": 100})
+        after = db.get_table_versions()
+        self.assertGreater(after["holdings"], before["holdings"])
+        self.assertEqual(after["account_info"], before["account_info"])
+
+    def test_no_rebuild_when_unchanged(self):
+        df = self.dm.get_portfolio_df()
+        with patch.object(self.dm, "_load_holdings") as load_holdings:
+            self.assertIs(self.dm.get_portfolio_df(), df)
+            load_holdings.assert_not_called()
+
+    def test_external_write_reloads_only_changed_table(self):
+        """A write from another connection (e.g. another process) is picked up."""
+        self.assertEqual(self.dm.get_holdings_list(), [])
+        other = sqlite3.connect(db.DB_PATH)
+        other.execute("INSERT INTO holdings (ticker, shares, market_value) VALUES ('MSFT', 2, 800)")
+        other.commit()
+        other.close()
+
+        with patch.object(self.dm, "_load_account_info") as load_account:
+            self.assertEqual(self.dm.get_holdings_list(), ["MSFT"])
+            load_account.assert_not_called()
+        self.assertEqual(self.dm.get_holdings_value(), 800)
+
+    def test_account_write_visible(self):
+        db.set_account_value("Free Funds", 1234.5)
+        self.assertEqual(self.dm.get_cash_balance(), 1234.5)
+
+
+class TestTypedHoldingsFrame(_TempDBTestCase):
+    """Typed frame and precomputed aggregates."""
+
+    def _seed(self):
+        db.upsert_holding({"Ticker": "AAPL", "Currency": "USD", "Shares": 10, "Current Price": 10, "Market Value": 100})
+        db.upsert_holding({"Ticker": "MSFT", "Currency": "USD", "Shares": 2, "Current Price": 150, "Market Value": 300})
+
+    def test_dtypes(self):
+        self._seed()
+        df = self.dm.get_portfolio_df()
+        self.assertEqual(str(df['Ticker'].dtype), "category")
+        self.assertEqual(str(df['Currency'].dtype), "category")
+        self.assertEqual(str(df['Market Value'].dtype), "float64")
+        self.assertEqual(str(df['Allocation %'].dtype), "float32")
+        self.assertNotIn("id", df.columns)
+
+    def test_empty_frame_is_typed(self):
+        df = self.dm.get_portfolio_df()
+        self.assertTrue(df.empty)
+        self.assertEqual(str(df['Ticker'].dtype), "category")
+
+    def test_aggregates(self):
+        self._seed()
+        self.assertEqual(self.dm.get_holdings_value(), 400)
+        self.assertEqual(self.dm.get_holdings_list(), ["MSFT", "AAPL"])
+        self.assertAlmostEqual(self.dm.get_allocation()["MSFT"], 75.0)
+        context = self.dm.get_portfolio_context()
+        self.assertLess(context.index("MSFT"), context.index("AAPL"))
+        self.assertIn("- AAPL: 10.0 shares @ $10.00 (Value: $100.00)", context)
+
+    def test_aggregates_not_recomputed_without_changes(self):
+        self._seed()
+        self.dm.get_portfolio_context()
+        with patch.object(self.dm, "_rebuild_aggregates") as rebuild:
+            self.dm.get_portfolio_context()
+            rebuild.assert_not_called()
+
+
+class TestIncrementalIngest(_TempDBTestCase):
+    """Statement ingest applies only new rows; exact re-uploads are no-ops."""
+
+    def _statement(self, content, transactions, page_hashes):
+        path = os.path.join(self.tmp_dir.name, "statement.pdf")
+        with open(path, "wb") as f:
+            f.write(content)
+        parsed = {
+            "summary": {"Free Funds": 50.0},
+            "holdings": [{"Ticker": "AAPL", "ISIN": "US0378331005", "Qty": 2.0, "Market Value": 300.0}],
+            "transactions": transactions,
+            "page_count": 3,
+            "page_hashes": page_hashes,
+            "pages_skipped": 0
+        }
+        return path, parsed
+
+    def _trade(self, date, total, time="09:30:00"):
+        raw = str([date, time, "AAPL", "US0378331005", "Buy", "1", f"{total:.2f}", f"{total:.2f}"])
+        return {"Date": date, "Action": "Buy", "Ticker": "AAPL", "ISIN": "US0378331005",
+                "Qty": 1.0, "Price": total, "Total": total, "Raw": raw}
+
+    def test_overlapping_statements_insert_only_new_transactions(self):
+        from src.parsers.trading212 import Trading212Parser
+        jan = [self._trade("2024-01-02", 100.0)]
+        path, parsed = self._statement(b"jan", jan, ["page-a"])
+        with patch.object(Trading212Parser, "parse", return_value=parsed) as parse:
+            self.assertIn("1 new transactions", self.dm.ingest_statement(path))
+            self.assertEqual(parse.call_args.kwargs["skip_page_hashes"], set())
+
+        path, parsed = self._statement(b"jan+feb", jan + [self._trade("2024-02-01", 50.0)], ["page-b"])
+        with patch.object(Trading212Parser, "parse", return_value=parsed) as parse:
+            self.assertIn("1 new transactions", self.dm.ingest_statement(path))
+            self.assertEqual(parse.call_args.kwargs["skip_page_hashes"], {"page-a"})
+
+        self.assertEqual(len(db.get_all_transactions()), 2)
+        self.assertEqual(self.dm.get_portfolio_df()["Shares"].tolist(), [2.0])
+        self.assertEqual(self.dm.get_cash_balance(), 50.0)
+
+    def test_identical_same_day_trades_are_both_kept(self):
+        from src.parsers.trading212 import Trading212Parser
+        trades = [self._trade("2024-01-02", 100.0, "09:30:00"), self._trade("2024-01-02", 100.0, "15:45:10")]
+        path, parsed = self._statement(b"two buys", trades, [])
+        with patch.object(Trading212Parser, "parse", return_value=parsed):
+            self.assertIn("2 new transactions", self.dm.ingest_statement(path))
+        # A re-export read with another table strategy splits the cells differently
+        relaid = [dict(t, Date=f"2024-01-02 {time}", Ticker="Apple Inc", Raw=t["Raw"].replace(", ", " "))
+                  for t, time in zip(trades, ("09:30:00", "15:45:10"))]
+        path, parsed = self._statement(b"two buys, re-exported", relaid, [])
+        with patch.object(Trading212Parser, "parse", return_value=parsed):
+            self.assertIn("0 new transactions", self.dm.ingest_statement(path))
+        rows = db.get_all_transactions()
+        self.assertEqual(len(rows), 2)
+        self.assertEqual([(r["shares"], r["price"]) for r in rows], [(1.0, 100.0)] * 2)
+
+    def test_same_file_is_skipped(self):
+        from src.parsers.trading212 import Trading212Parser
+        path, parsed = self._statement(b"same", [self._trade("2024-01-02", 100.0)], [])
+        with patch.object(Trading212Parser, "parse", return_value=parsed) as parse:
+            self.dm.ingest_statement(path)
+            self.assertIn("already imported", self.dm.ingest_statement(path))
+            self.assertEqual(parse.call_count, 1)
+
+    def test_unchanged_holdings_are_not_rewritten(self):
+        from src.parsers.trading212 import Trading212Parser
+        path, parsed = self._statement(b"one", [], [])
+        with patch.object(Trading212Parser, "parse", return_value=parsed):
+            self.dm.ingest_statement(path)
+        version = db.get_table_versions()["holdings"]
+        path, parsed = self._statement(b"two", [], [])
+        with patch.object(Trading212Parser, "parse", return_value=parsed):
+            self.dm.ingest_statement(path)
+        self.assertEqual(db.get_table_versions()["holdings"], version)
+
+
+if __name__ == '__main__':
+    unittest.main()
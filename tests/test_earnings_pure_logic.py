@@ -40,9 +40,10 @@ class TestMemoContentGeneration(unittest.TestCase):
         import os
         # Use a path that definitely doesn't exist
         from src.logic import earnings_ui_logic
+        from src.utils import db
         original_path = "verification_log.json"
         # Temporarily move if exists
-        if os.path.exists(original_path):
+        if os.path.exists(original_path) or db.get_latest_verification_log():
             result = get_memo_content(None)  # Will load from existing file
             self.assertIn(result["status"], ["success", "warning"])
         else:
@@ -0,0 +1,237 @@
+"""
+Test Parse Cache
+================
+FinancialPDFParser serves repeat parses of the same PDF bytes from disk
+without running Docling, shards long PDFs across worker processes, and
+sends only triaged financial-table pages through the table pipeline.
+DeltaParser parses current/prior filings concurrently and reuses the cache.
+Uses a stub converter, so no models are loaded.
+"""
+import unittest
+import asyncio
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.parsers import financial_pdf
+from src.logic import delta_engine
+
+
+class StubBBox:
+    def as_tuple(self):
+        return (10.0, 20.0, 110.0, 40.0)
+
+
+class StubConverter:
+    def __init__(self):
+        self.calls = 0
+
+    def convert(self, file_path, page_range=None):
+        self.calls += 1
+        self.page_ranges = getattr(self, "page_ranges", []) + [page_range]
+        first, last = page_range or (3, 3)
+        items = [(SimpleNamespace(text=f"Revenue page {p}", prov=[SimpleNamespace(page_no=p, bbox=StubBBox())]), 1)
+                 for p in range(first, last + 1)]
+        document = SimpleNamespace(
+            export_to_markdown=lambda: "\n\n".join(item.text for item, _ in items),
+            iterate_items=lambda: items
+        )
+        return SimpleNamespace(document=document)
+
+
+def _thread_pool(max_workers, mp_context=None, initializer=None):
+    """Stands in for the process pool so the stub converter is visible to workers."""
+    return ThreadPoolExecutor(max_workers=max_workers, initializer=initializer)
+
+
+class _StubConverterTestCase(unittest.TestCase):
+    """Parser bound to a stub converter and a temporary cache directory."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.converter = StubConverter()
+        self.patcher = patch.object(financial_pdf, "_get_converter_instance", return_value=self.converter)
+        self.patcher.start()
+        self.pdf = self._write("filing.pdf", b"%PDF-1.7 filing")
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def _parser(self, **kwargs):
+        return financial_pdf.FinancialPDFParser(cache_dir=os.path.join(self.tmp_dir.name, "cache"), **kwargs)
+
+
+class TestParseCache(_StubConverterTestCase):
+
+    def test_repeat_parse_skips_conversion(self):
+        first = self._parser().parse(self.pdf)
+        # A new parser (e.g. a later job) with the same bytes under another name
+        copy = self._write("renamed.pdf", b"%PDF-1.7 filing")
+        second = self._parser().parse(copy)
+        self.assertEqual(self.converter.calls, 1)
+        self.assertEqual(second, first)
+        self.assertEqual(second["provenance_map"][0]["bbox"], [10.0, 20.0, 110.0, 40.0])
+        self.assertEqual(second["provenance_map"][0]["md_start"], 0)
+
+    def test_changed_bytes_or_pipeline_miss(self):
+        parser = self._parser()
+        parser.parse(self.pdf)
+        parser.parse(self._write("amended.pdf", b"%PDF-1.7 amended filing"))
+        with patch.dict(financial_pdf.PIPELINE_SETTINGS, {"table_mode": "fast"}):
+            parser.parse(self.pdf)
+        self.assertEqual(self.converter.calls, 3)
+
+    def test_cache_can_be_disabled(self):
+        parser = self._parser(use_cache=False)
+        parser.parse(self.pdf)
+        parser.parse(self.pdf)
+        self.assertEqual(self.converter.calls, 2)
+
+
+class TestShardedParse(_StubConverterTestCase):
+    """Page ranges are converted separately and stitched back in page order."""
+
+    def test_shards_stitched_in_page_order(self):
+        with patch.object(financial_pdf, "_page_count", return_value=50), \
+             patch.object(financial_pdf, "ProcessPoolExecutor", side_effect=_thread_pool):
+            result = self._parser(use_cache=False).parse(self.pdf, workers=4)
+        self.assertEqual(sorted(self.converter.page_ranges), [(1, 13), (14, 26), (27, 39), (40, 50)])
+        pages = [entry["page"] for entry in result["provenance_map"]]
+        self.assertEqual(pages, list(range(1, 51)))
+        self.assertLess(result["markdown"].index("Revenue page 13"), result["markdown"].index("Revenue page 14"))
+        # Offsets refer to the stitched markdown
+        entry = result["provenance_map"][20]
+        self.assertEqual(result["markdown"][entry["md_start"]:entry["md_end"]], entry["full_text"])
+
+    def test_small_pdf_or_one_worker_stays_serial(self):
+        with patch.object(financial_pdf, "_page_count", return_value=10):
+            self._parser(use_cache=False).parse(self.pdf, workers=4)
+        self._parser(use_cache=False).parse(self.pdf, workers=1)
+        self.assertEqual(self.converter.page_ranges, [None, None])
+
+    def test_pool_failure_falls_back_to_serial(self):
+        with patch.object(financial_pdf, "_page_count", return_value=50), \
+             patch.object(financial_pdf, "ProcessPoolExecutor", side_effect=OSError("no /dev/shm")):
+            result = self._parser(use_cache=False).parse(self.pdf, workers=4)
+        self.assertEqual(self.converter.page_ranges, [(1, 13), (14, 26), (27, 39), (40, 50)])
+        self.assertEqual(len(result["provenance_map"]), 50)
+
+
+class TestTwoTierParse(_StubConverterTestCase):
+    """Only pages triaged as financial tables reach the (stub) Docling converter."""
+
+    NARRATIVE = "Our business depends on customers. We continued to invest in research and people."
+    STATEMENT = [
+        "Consolidated Balance Sheets (in millions)",
+        "Total assets 120,400 118,200",
+        "Total liabilities 80,100 79,900",
+        "Cash 28,840 24,100 Inventory 1,200 1,150",
+    ]
+
+    def _make_pdf(self):
+        import fitz
+        path = os.path.join(self.tmp_dir.name, "10k.pdf")
+        with fitz.open() as pdf:
+            for heading, lines in (("Item 1A. Risk Factors", [self.NARRATIVE]), (None, self.STATEMENT),
+                                   ("Liquidity Outlook", [self.NARRATIVE])):
+                page = pdf.new_page()
+                if heading:
+                    page.insert_text((72, 50), heading, fontsize=16)
+                for i, line in enumerate(lines):
+                    page.insert_text((72, 72 + 20 * i), line)
+            pdf.save(path)
+        return path
+
+    def test_triage_scores(self):
+        self.assertGreater(financial_pdf.score_page_text("\n".join(self.STATEMENT)), 0.45)
+        self.assertLess(financial_pdf.score_page_text(self.NARRATIVE), 0.45)
+
+    def test_only_table_pages_use_docling(self):
+        result = self._parser(use_cache=False).parse(self._make_pdf(), workers=1)
+        self.assertEqual(self.converter.page_ranges, [(2, 2)])
+        self.assertEqual([e["page"] for e in result["provenance_map"]], [1, 1, 2, 3, 3])
+        self.assertEqual(result["provenance_map"][1]["type"], "TextBlock")
+        markdown = result["markdown"]
+        self.assertLess(markdown.index("Our business"), markdown.index("Revenue page 2"))
+        self.assertEqual(markdown.count("Our business"), 2)
+
+    def test_text_tier_emits_headings(self):
+        result = self._parser(use_cache=False).parse(self._make_pdf(), workers=1)
+        self.assertIn("## Item 1A. Risk Factors", result["markdown"])
+        self.assertIn("## Liquidity Outlook", result["markdown"])
+        self.assertNotIn("## Our business", result["markdown"])
+        self.assertEqual(result["provenance_map"][0]["type"], "SectionHeaderItem")
+        from src.utils import rag
+        titles = [c["section_title"] for c in rag.chunk_by_sections(result["markdown"])]
+        self.assertIn("Item 1A. Risk Factors", titles)
+
+    def test_text_tier_bboxes_use_bottom_left_origin(self):
+        from src.agents.auditor_logic import CoordinateVerifier
+        pdf = self._make_pdf()
+        entry = self._parser(use_cache=False).parse(pdf, workers=1)["provenance_map"][1]
+        left, top, right, bottom = entry["bbox"]
+        # Line drawn 72pt from the top of a 792pt page: same convention as Docling boxes
+        self.assertGreater(top, bottom)
+        self.assertGreater(bottom, 700)
+        with CoordinateVerifier() as verifier:
+            self.assertTrue(verifier.verify_jump(pdf, 1, entry["bbox"], "invest in research")["match"])
+
+    def test_two_tier_can_be_disabled(self):
+        with patch.dict(financial_pdf.PIPELINE_SETTINGS, {"two_tier": False}):
+            self._parser(use_cache=False).parse(self._make_pdf(), workers=1)
+        self.assertEqual(self.converter.page_ranges, [None])
+
+
+class TestDualParse(_StubConverterTestCase):
+    """Current and prior filings: cache hits skip parsing, misses run side by side."""
+
+    def setUp(self):
+        super().setUp()
+        self.prior = self._write("prior.pdf", b"%PDF-1.7 prior filing")
+        self.pool_sizes = []
+
+    def _pool(self, max_workers, mp_context=None, initializer=None):
+        self.pool_sizes.append(max_workers)
+        return _thread_pool(max_workers, mp_context, initializer)
+
+    def _parse_dual(self, current, prior):
+        delta = delta_engine.DeltaParser(self._parser())
+        with patch.object(delta_engine, "ProcessPoolExecutor", side_effect=self._pool):
+            return asyncio.run(delta.parse_dual_docs(current, prior))
+
+    def test_both_misses_parse_in_parallel(self):
+        result = self._parse_dual(self.pdf, self.prior)
+        self.assertEqual(self.pool_sizes, [2])
+        self.assertEqual(self.converter.calls, 2)
+        self.assertEqual(result["current"]["markdown"], "Revenue page 3")
+        self.assertEqual(len(result["prior"]["provenance_map"]), 1)
+
+    def test_cached_prior_costs_one_parse(self):
+        self._parser().parse(self.prior)  # last year's audit
+        result = self._parse_dual(self.pdf, self.prior)
+        self.assertEqual(self.pool_sizes, [])
+        self.assertEqual(self.converter.calls, 2)
+        self.assertEqual(result["prior"]["markdown"], "Revenue page 3")
+
+    def test_identical_bytes_parsed_once(self):
+        copy = self._write("copy.pdf", b"%PDF-1.7 filing")
+        result = self._parse_dual(self.pdf, copy)
+        self.assertEqual(self.converter.calls, 1)
+        self.assertEqual(result["prior"], result["current"])
+
+
+if __name__ == '__main__':
+    unittest.main()
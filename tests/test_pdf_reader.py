@@ -0,0 +1,102 @@
+"""
+Test PDF Reader
+===============
+read_pdf returns the same full text as before when no section is given, and
+with stop_after_section stops on the page where that section ends (the
+broker-statement import reads only up to the end of "Open positions").
+"""
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+import fitz
+import PyPDF2
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.tools import pdf_reader
+from src.tools.pdf_reader import read_pdf
+
+PAGES = [
+    ["Account summary", "Total account value 12,500.00"],
+    ["Open positions", "AAPL 10 1,500.00", "MSFT 5 2,000.00"],
+    ["GOOG 2 280.00", "Total 3,780.00"],
+    ["Transactions", "2024-01-02 Buy AAPL 150.00"],
+]
+
+
+def _legacy_read_pdf(file_path):
+    """read_pdf before pages were streamed: every page's text plus a newline."""
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        text = ""
+        for page in reader.pages:
+            text += page.extract_text() + "\n"
+        return text
+
+
+class TestReadPdf(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pdf = os.path.join(self.tmp_dir.name, "statement.pdf")
+        with fitz.open() as pdf:
+            for lines in PAGES:
+                page = pdf.new_page()
+                for i, line in enumerate(lines):
+                    page.insert_text((72, 72 + 20 * i), line)
+            pdf.save(self.pdf)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def _pages_read(self, pages, **kwargs):
+        """Runs read_pdf over stubbed page texts; returns (text, pages pulled from the reader)."""
+        pulled = []
+
+        def fake_pages(file_path):
+            for text in pages:
+                pulled.append(text)
+                yield text
+
+        with patch.object(pdf_reader, "iter_pdf_pages", side_effect=fake_pages):
+            text = read_pdf("statement.pdf", **kwargs)
+        return text, len(pulled)
+
+    def test_full_text_unchanged_without_section(self):
+        text = read_pdf(self.pdf)
+        self.assertEqual(text, _legacy_read_pdf(self.pdf))
+        self.assertIn("Transactions", text)
+
+    def test_stops_on_page_where_section_ends(self):
+        text = read_pdf(self.pdf, stop_after_section="Open positions")
+        # The "Total" on page 1 precedes the section, so it does not end it
+        self.assertEqual(text, _legacy_read_pdf(self.pdf).split("Transactions")[0])
+        self.assertIn("GOOG 2", text)
+        self.assertNotIn("Transactions", text)
+
+    def test_later_pages_are_not_read(self):
+        pages = ["\n".join(lines) for lines in PAGES]
+        _, pulled = self._pages_read(pages, stop_after_section="Open positions")
+        self.assertEqual(pulled, 3)
+
+    def test_section_ending_on_its_own_page(self):
+        pages = ["Open positions\nAAPL 10\nTotal 1,500.00", "Transactions"]
+        text, pulled = self._pages_read(pages, stop_after_section="Open positions")
+        self.assertEqual((text, pulled), (pages[0] + "\n", 1))
+
+    def test_unterminated_or_missing_section_reads_everything(self):
+        pages = ["Open positions\nAAPL 10", "MSFT 5", "Transactions"]
+        self.assertEqual(self._pages_read(pages, stop_after_section="Open positions"),
+                         ("\n".join(pages) + "\n", 3))
+        self.assertEqual(self._pages_read(pages, stop_after_section="Pending orders")[1], 3)
+
+    def test_errors_are_reported_as_text(self):
+        self.assertTrue(read_pdf(os.path.join(self.tmp_dir.name, "missing.pdf")).startswith("Error reading PDF"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+"""
+Test Portfolio Manager
+======================
+portfolio_manager writes through to SQLite: a statement import merges holdings
+and allocations, and a price refresh touches changed rows only.
+Runs against a throwaway database file, never data/gvd_engine.db.
+"""
+import unittest
+import os
+import sys
+import tempfile
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import db
+from src.utils import portfolio_manager
+
+STATEMENT = (
+    "Open positions\n"
+    "AAPL US0378331005 USD 10 100.00 150.00\n"
+    "MSFT US5949181045 USD 5 200.00 300.00\n"
+    "Total\n"
+)
+
+
+class TestPortfolioManagerDB(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_path = db.DB_PATH
+        self._reset_connection()
+        db.DB_PATH = os.path.join(self.tmp_dir.name, "test.db")
+        db.init_database()
+
+        from src.utils.data_manager import DataManager
+        self.original_instance = DataManager._instance
+        DataManager._instance = None
+        with patch.object(DataManager, "_migrate_legacy_data"):
+            self.dm = DataManager()
+
+    def tearDown(self):
+        from src.utils.data_manager import DataManager
+        DataManager._instance = self.original_instance
+        self._reset_connection()
+        db.DB_PATH = self.original_path
+        self.tmp_dir.cleanup()
+
+    def _reset_connection(self):
+        conn = getattr(db._local, "connection", None)
+        if conn is not None:
+            conn.close()
+        db._local.connection = None
+
+    def test_import_merges_holdings(self):
+        db.upsert_holding({"Ticker": "AAPL", "ISIN": "US0378331005", "Currency": "USD", "Shares": 1})
+        with patch.object(portfolio_manager, "read_pdf", return_value=STATEMENT) as read_pdf:
+            portfolio_manager.import_broker_statement("statement.pdf")
+        self.assertEqual(read_pdf.call_args.kwargs["stop_after_section"], "Open positions")
+
+        holdings = {h["ticker"]: h for h in db.get_all_holdings()}
+        self.assertEqual(holdings["AAPL"]["shares"], 10)
+        self.assertEqual(holdings["AAPL"]["currency"], "USD")  # preserved by merge
+        self.assertEqual(holdings["MSFT"]["market_value"], 1500)
+        self.assertAlmostEqual(holdings["MSFT"]["allocation_pct"], 50.0)
+
+    def test_price_update_touches_changed_rows_only(self):
+        with patch.object(portfolio_manager, "read_pdf", return_value=STATEMENT):
+            portfolio_manager.import_broker_statement("statement.pdf")
+
+        prices = {"AAPL": 150.0, "MSFT": 400.0}
+        with patch.object(portfolio_manager, "get_current_price", side_effect=prices.get), \
+             patch.object(db, "update_holding_prices", wraps=db.update_holding_prices) as update:
+            portfolio_manager.update_portfolio_prices()
+            update.assert_called_once_with({"MSFT": 400.0})
+
+        self.assertEqual(self.dm.get_holdings_value(), 3500)
+        self.assertAlmostEqual(self.dm.get_allocation()["MSFT"], 2000 / 3500 * 100, places=4)
+
+
+if __name__ == '__main__':
+    unittest.main()
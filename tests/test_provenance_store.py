@@ -0,0 +1,132 @@
+"""
+Test Provenance Store
+=====================
+Columnar provenance storage, the grid (spatial) and inverted (text) indexes
+over it, and the consumers that look elements up through them.
+"""
+import json
+import unittest
+import os
+import sys
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.parsers.provenance import ProvenanceStore, ColumnarProvenance
+from src.parsers.indexer import CrossReferenceIndexer
+from src.logic.earnings_ui_logic import _build_friction_points
+
+
+def _entry(text, page, bbox):
+    return {"text_snippet": text[:50], "full_text": text, "type": "TextItem", "page": page, "bbox": bbox}
+
+
+PROVENANCE = [
+    _entry("Consolidated Balance Sheets", 1, [72.0, 40.0, 400.0, 60.0]),
+    _entry("Cash and cash equivalents 28,840", 1, [72.0, 100.0, 500.0, 115.0]),
+    _entry("Total revenue $10.4B for the year", 2, [72.0, 300.0, 300.0, 320.0]),
+    _entry("See Note 12 for details", 2, [72.0, 500.0, 250.0, 515.0]),
+    _entry("Note 12. Income Taxes", 7, [72.0, 72.0, 260.0, 90.0]),
+    _entry("Footer without a box", 7, []),
+]
+
+
+class TestColumnarProvenance(unittest.TestCase):
+
+    def setUp(self):
+        self.columns = ColumnarProvenance.from_entries(PROVENANCE)
+
+    def test_dict_view_matches_entries(self):
+        self.assertEqual(len(self.columns), 6)
+        self.assertEqual(self.columns[2]["full_text"], "Total revenue $10.4B for the year")
+        self.assertEqual(self.columns[2]["bbox"], [72.0, 300.0, 300.0, 320.0])
+        self.assertEqual(self.columns[-1]["bbox"], [])
+        self.assertEqual(self.columns[-1]["md_start"], -1)
+        self.assertEqual([e["page"] for e in self.columns], [1, 1, 2, 2, 7, 7])
+        self.assertEqual(self.columns.type_names, ["TextItem"])
+        with self.assertRaises(IndexError):
+            self.columns[6]
+
+    def test_payload_round_trip(self):
+        payload = json.loads(json.dumps(self.columns.to_payload()))
+        restored = ColumnarProvenance.from_payload(payload)
+        self.assertEqual(restored, self.columns)
+        restored.md_spans[0] = (5, 10)  # restored columns stay writable
+        self.assertEqual(restored[0]["md_end"], 10)
+
+    def test_concat_reinterns_types(self):
+        other = ColumnarProvenance.from_entries([dict(_entry("Table cell", 9, [0, 0, 1, 1]), type="TableItem")])
+        joined = ColumnarProvenance.concat([other, PROVENANCE[:2]])
+        self.assertEqual([e["type"] for e in joined], ["TableItem", "TextItem", "TextItem"])
+        self.assertEqual(joined[2]["full_text"], "Cash and cash equivalents 28,840")
+
+
+class TestSpatialIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ProvenanceStore(PROVENANCE)
+
+    def test_point_lookup(self):
+        self.assertEqual(self.store.elements_at(1, 300.0, 107.0), [1])
+        self.assertEqual(self.store.elements_at(2, 300.0, 107.0), [])
+        self.assertEqual(self.store.elements_at(1, 600.0, 107.0), [])
+
+    def test_smallest_box_first(self):
+        store = ProvenanceStore([
+            _entry("Table", 1, [0.0, 0.0, 600.0, 700.0]),
+            _entry("Cell", 1, [100.0, 100.0, 150.0, 120.0]),
+        ])
+        self.assertEqual(store.elements_at(1, 120.0, 110.0), [1, 0])
+
+    def test_rectangle_lookup(self):
+        self.assertEqual(self.store.elements_in(1, [0.0, 0.0, 612.0, 792.0]), [0, 1])
+        self.assertEqual(self.store.elements_in(1, [450.0, 110.0, 460.0, 200.0]), [1])
+        self.assertEqual(self.store.elements_in(1, "bad"), [])
+
+    def test_entries_without_bbox_are_still_listed(self):
+        self.assertEqual(self.store.elements_on_page(7), [4, 5])
+        self.assertEqual(len(self.store), 6)
+
+
+class TestTextIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ProvenanceStore(PROVENANCE)
+
+    def test_find_text(self):
+        self.assertEqual(self.store.find_text("10.4B"), [2])
+        self.assertEqual(self.store.find_text("cash  AND cash"), [1])
+        self.assertEqual(self.store.find_text("note 12"), [3, 4])
+        self.assertEqual(self.store.find_text("note 12", page=7), [4])
+        self.assertEqual(self.store.find_text("10.5B"), [])
+        self.assertEqual(self.store.find_text(""), [])
+
+    def test_tokens_must_appear_in_order(self):
+        self.assertEqual(self.store.find_text("equivalents cash"), [])
+
+    def test_locate_prefers_page(self):
+        self.assertEqual(self.store.locate("Note 12", page=7)["page"], 7)
+        self.assertEqual(self.store.locate("Note 12")["page"], 2)
+        self.assertIsNone(self.store.locate("Goodwill"))
+
+
+class TestConsumers(unittest.TestCase):
+
+    def test_cross_reference_index(self):
+        index = CrossReferenceIndexer().build_index("", PROVENANCE)
+        self.assertEqual(list(index), ["Note 12"])
+        self.assertEqual(index["Note 12"]["page"], 7)
+
+    def test_friction_point_anchored_from_snippet(self):
+        metrics = [{
+            "display_name": "Revenue",
+            "verification": {"status": "error_detected"},
+            "provenance": {"source_snippet": "revenue $10.4B", "page": 1}
+        }]
+        result = _build_friction_points(metrics, ProvenanceStore(PROVENANCE))
+        self.assertEqual(result[0]["page"], 2)
+        self.assertEqual(result[0]["bbox"], [72.0, 300.0, 300.0, 320.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,544 @@
+"""
+Test RAG Retrieval
+==================
+Exercises chunking, caching and retrieval with a deterministic fake encoder,
+so no embedding model download is needed. FAISS-backed tests are skipped
+when the optional RAG dependencies are not installed.
+"""
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from unittest.mock import patch
+
+import numpy as np
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import rag
+
+HAS_FAISS = rag._load_dependencies()
+
+
+class FakeEncoder:
+    """Bag-of-words hashing encoder: similar texts get similar vectors."""
+
+    def __init__(self, dim=64):
+        self.dim = dim
+        self.encoded = 0
+
+    def encode(self, texts, show_progress_bar=False, **kwargs):
+        self.encoded += len(texts)
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                out[i, zlib.crc32(word.strip(".,:|").encode()) % self.dim] += 1.0
+        return out
+
+
+SAMPLE_DOC = """
+## Income Statement
+Total revenue was 8,880 million. Net income was 2,019 million.
+
+## Cash Flow Statement
+Operating cash flow was 1,600 million. Capital expenditures were 200 million.
+
+## Risk Factors
+Competition and regulation could harm our business.
+"""
+
+
+@unittest.skipUnless(HAS_FAISS, "FAISS / sentence-transformers not installed")
+class TestEmbeddingCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = rag.EmbeddingCache(self.tmp_dir.name)
+
+    def tearDown(self):
+        self.cache._conn.close()
+        self.tmp_dir.cleanup()
+
+    def _index(self, encoder):
+        index = rag.DocumentIndex(model_name="fake-model", embedding_cache=self.cache)
+        index.model = encoder
+        return index
+
+    def test_roundtrip(self):
+        vecs = np.random.rand(3, 8).astype(np.float32)
+        self.cache.put_many("m", ["a", "b", "c"], vecs)
+        got = self.cache.get_many("m", ["c", "a", "zzz"])
+        self.assertEqual(set(got), {"a", "c"})
+        np.testing.assert_allclose(got["c"], vecs[2])
+        self.assertEqual(self.cache.get_many("other-model", ["a"]), {})
+
+    def test_second_build_skips_encoding(self):
+        chunks = rag.chunk_by_sections(SAMPLE_DOC)
+        first = FakeEncoder()
+        self.assertTrue(self._index(first).build(chunks))
+        self.assertEqual(first.encoded, len(chunks))
+
+        # A fresh index (new process, same filing) encodes nothing
+        second = FakeEncoder()
+        index = self._index(second)
+        self.assertTrue(index.build(chunks))
+        self.assertEqual(second.encoded, 0)
+        top = index.retrieve("operating cash flow", top_k=1)[0]
+        self.assertEqual(top["section_title"], "Cash Flow Statement")
+
+    def test_shared_chunks_reused_across_documents(self):
+        self._index(FakeEncoder()).build(rag.chunk_by_sections(SAMPLE_DOC))
+        encoder = FakeEncoder()
+        amended = SAMPLE_DOC + "\n## Subsequent Events\nNone.\n"
+        self._index(encoder).build(rag.chunk_by_sections(amended))
+        self.assertEqual(encoder.encoded, 1)
+
+
+@unittest.skipUnless(HAS_FAISS, "FAISS / sentence-transformers not installed")
+class TestEmbeddingModelManager(unittest.TestCase):
+
+    def test_model_loaded_once_across_threads(self):
+        manager = rag.EmbeddingModelManager()
+        loads = []
+
+        def factory(name):
+            loads.append(name)
+            return FakeEncoder()
+
+        with patch.object(rag, "_SentenceTransformer", side_effect=factory):
+            threads = [threading.Thread(target=manager.encode, args=("fake-model", ["x"])) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(loads, ["fake-model"])
+        self.assertEqual(manager.get("fake-model").encoded, 8)
+
+    def test_indexes_share_registered_model(self):
+        encoder = FakeEncoder()
+        rag.get_model_manager().register("shared-fake", encoder)
+        chunks = rag.chunk_by_sections(SAMPLE_DOC)
+        for _ in range(2):
+            index = rag.DocumentIndex(model_name="shared-fake", embedding_cache=False)
+            index.build(chunks)
+            self.assertIsNone(index.model)
+        self.assertEqual(encoder.encoded, 2 * len(chunks))
+
+    def test_int8_backend_and_batch_size(self):
+        manager = rag.EmbeddingModelManager(backend="onnx-int8", batch_size=16)
+        encoder = FakeEncoder()
+        with patch.object(rag, "_SentenceTransformer", return_value=encoder) as factory, \
+             patch.object(encoder, "encode", wraps=encoder.encode) as encode:
+            manager.encode("fake-model", ["x"])
+        _, kwargs = factory.call_args
+        self.assertEqual(kwargs["backend"], "onnx")
+        self.assertTrue(kwargs["model_kwargs"]["file_name"].startswith("onnx/model_"))
+        self.assertEqual(encode.call_args.kwargs["batch_size"], 16)
+        self.assertEqual(manager.cache_key("fake-model"), "fake-model@onnx-int8")
+        self.assertEqual(rag.EmbeddingModelManager(backend="torch").cache_key("fake-model"), "fake-model")
+
+    def test_onnx_falls_back_to_torch(self):
+        def factory(name, backend="torch", **kwargs):
+            if backend == "onnx":
+                raise ImportError("optimum is not installed")
+            return FakeEncoder()
+
+        manager = rag.EmbeddingModelManager(backend="onnx")
+        with patch.object(rag, "_onnx_installed", return_value=True), \
+             patch.object(rag, "_SentenceTransformer", side_effect=factory):
+            self.assertEqual(manager.cache_key("fake-model"), "fake-model@onnx")
+            self.assertEqual(manager.encode("fake-model", ["x"]).shape, (1, 64))
+            # Vectors come from PyTorch, so they are keyed (and cached) as PyTorch vectors
+            self.assertEqual(manager.cache_key("fake-model"), "fake-model")
+        with patch.object(rag, "_onnx_installed", return_value=False):
+            self.assertEqual(rag.EmbeddingModelManager(backend="onnx-int8").cache_key("fake-model"), "fake-model")
+
+    def test_warm_up_in_background(self):
+        manager = rag.EmbeddingModelManager()
+        with patch.object(rag, "_SentenceTransformer", side_effect=lambda name: FakeEncoder()):
+            manager.warm_up("fake-model", background=True).join(timeout=5)
+        self.assertTrue(manager.is_loaded("fake-model"))
+
+
+@unittest.skipUnless(HAS_FAISS, "FAISS / sentence-transformers not installed")
+class TestIndexPersistence(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.encoder = FakeEncoder()
+        rag.get_model_manager().register("persist-fake", self.encoder)
+        rag._index_lru.clear()
+        self.patches = [
+            patch.object(rag, "_index_dir", return_value=self.tmp_dir.name),
+            patch.object(rag, "get_embedding_cache", return_value=None),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        rag._index_lru.clear()
+        self.tmp_dir.cleanup()
+
+    def test_lru_then_disk_reuse(self):
+        first = rag.get_or_build_index(SAMPLE_DOC, model_name="persist-fake")
+        encoded = self.encoder.encoded
+        self.assertIs(rag.get_or_build_index(SAMPLE_DOC, model_name="persist-fake"), first)
+
+        # Simulate a new process: memory is empty, the saved index is loaded from disk
+        rag._index_lru.clear()
+        with patch.object(rag, "chunk_by_sections") as chunker:
+            loaded = rag.get_or_build_index(SAMPLE_DOC, model_name="persist-fake")
+            chunker.assert_not_called()
+        self.assertIsNot(loaded, first)
+        self.assertEqual(loaded.chunks, first.chunks)
+
+        hit = loaded.retrieve("operating cash flow", top_k=1)[0]
+        self.assertEqual(hit["section_title"], "Cash Flow Statement")
+        self.assertEqual(self.encoder.encoded, encoded + 1)  # only the query was encoded
+
+    def test_lexical_only_index_is_upgraded(self):
+        manager = rag.EmbeddingModelManager()
+        with patch.object(rag, "_model_manager", manager):
+            with patch.object(rag, "_load_dependencies", return_value=False):
+                lexical = rag.get_or_build_index(SAMPLE_DOC, model_name="upgrade-fake")
+                self.assertTrue(lexical.lexical_only)
+                self.assertIs(rag.get_or_build_index(SAMPLE_DOC, model_name="upgrade-fake"), lexical)
+            # The encoder is available now: the next call builds (and caches) a dense index
+            manager.register("upgrade-fake", FakeEncoder())
+            dense = rag.get_or_build_index(SAMPLE_DOC, model_name="upgrade-fake")
+            self.assertFalse(dense.lexical_only)
+            self.assertIs(rag.get_or_build_index(SAMPLE_DOC, model_name="upgrade-fake"), dense)
+        self.assertEqual(len(rag._index_lru), 1)
+
+    def test_lexical_only_retry_after_interval(self):
+        with patch.object(rag, "_load_dependencies", return_value=False):
+            lexical = rag.get_or_build_index(SAMPLE_DOC, model_name="never-loaded")
+            with patch.object(rag, "LEXICAL_RETRY_SECONDS", 0):
+                self.assertIsNot(rag.get_or_build_index(SAMPLE_DOC, model_name="never-loaded"), lexical)
+
+    def test_lru_evicts_oldest(self):
+        with patch.object(rag, "INDEX_LRU_SIZE", 2):
+            for i in range(3):
+                rag.get_or_build_index(SAMPLE_DOC + f"\n## Note {i}\nText {i}\n", model_name="persist-fake")
+        self.assertEqual(len(rag._index_lru), 2)
+
+
+class TestContextPacking(unittest.TestCase):
+
+    def _cand(self, text, value, header="\n[H]\n"):
+        return {"header": header, "text": text, "value": value}
+
+    def test_small_relevant_chunks_beat_one_large_chunk(self):
+        candidates = [
+            self._cand("x" * 900, 1.0),
+            self._cand("Revenue 8,880", 0.9),
+            self._cand("Net income 2,019", 0.8),
+        ]
+        packed = rag.pack_context(candidates, max_chars=500)
+        self.assertLessEqual(len(packed), 500)
+        self.assertIn("Revenue 8,880", packed)
+        self.assertIn("Net income 2,019", packed)
+        self.assertNotIn("xxx", packed)
+
+    def test_trims_at_paragraph_boundary(self):
+        table = "| Item | 2024 |\n|---|---|\n| Revenue | 8,880 |"
+        text = table + "\n\n" + "Commentary. " * 100
+        packed = rag.pack_context([self._cand(text, 1.0)], max_chars=200)
+        self.assertIn(table, packed)
+        self.assertNotIn("Commentary", packed)
+
+    def test_overlapping_paragraphs_kept_once(self):
+        shared = "Operating cash flow was 1,600 million."
+        packed = rag.pack_context([
+            self._cand(shared + "\n\nCapex was 200 million.", 1.0),
+            self._cand(shared + "\n\nFree cash flow was 1,400 million.", 0.5),
+        ], max_chars=10000)
+        self.assertEqual(packed.count(shared), 1)
+        self.assertIn("Free cash flow", packed)
+
+    def test_overlap_survives_when_earlier_chunk_is_dropped(self):
+        shared = "Operating cash flow was 1,600 million."
+        packed = rag.pack_context([
+            self._cand("x" * 900 + "\n\n" + shared, 1.0),
+            self._cand(shared + "\n\nFree cash flow was 1,400 million.", 0.5),
+        ], max_chars=300)
+        self.assertNotIn("xxx", packed)
+        self.assertIn(shared, packed)
+        self.assertIn("Free cash flow", packed)
+
+    def test_output_keeps_candidate_order(self):
+        packed = rag.pack_context([self._cand("first", 0.1), self._cand("second", 1.0)], max_chars=10000)
+        self.assertLess(packed.index("first"), packed.index("second"))
+
+
+@unittest.skipUnless(HAS_FAISS, "FAISS / sentence-transformers not installed")
+class TestMultiQueryRetrieval(unittest.TestCase):
+
+    def setUp(self):
+        self.encoder = FakeEncoder()
+        rag.get_model_manager().register("multi-fake", self.encoder)
+        self.index = rag.DocumentIndex(model_name="multi-fake", embedding_cache=False)
+        self.index.build(rag.chunk_by_sections(SAMPLE_DOC))
+
+    def test_batch_uses_one_encode_call(self):
+        encoded = self.encoder.encoded
+        with patch.object(self.encoder, "encode", wraps=self.encoder.encode) as encode:
+            results = self.index.retrieve_batch(["total revenue", "operating cash flow"], top_k=1)
+            encode.assert_called_once()
+        self.assertEqual(self.encoder.encoded, encoded + 2)
+        self.assertEqual([r[0]["section_title"] for r in results],
+                         ["Income Statement", "Cash Flow Statement"])
+
+    def test_rrf_rewards_agreement(self):
+        a, b, c = ({"index": i} for i in range(3))
+        fused = rag.reciprocal_rank_fusion([[a, b], [b, c]])
+        self.assertGreater(fused[1], fused[0])
+        self.assertAlmostEqual(fused[0], fused[2] + 1 / 61 - 1 / 62)
+
+    def test_every_metric_gets_its_section_under_budget(self):
+        queries = {"Revenue": "total revenue", "Operating Cash Flow": "operating cash flow"}
+        context = rag.retrieve_context_multi(self.index, queries, top_k=3, max_chars=330)
+        self.assertIn("Income Statement", context)
+        self.assertIn("Cash Flow Statement", context)
+        self.assertNotIn("Risk Factors", context)
+        self.assertLessEqual(len(context), 330)
+
+
+class TestChunker(unittest.TestCase):
+
+    TABLE = (
+        "| Item | 2024 | 2023 |\n"
+        "|---|---|---|\n"
+        "| Revenue | 8,880 | 8,000 |\n"
+        "| Net income | 2,019 | 1,800 |\n"
+    )
+
+    def test_offsets_slice_original_text(self):
+        chunks = rag.chunk_by_sections(SAMPLE_DOC)
+        self.assertEqual([c["section_title"] for c in chunks],
+                         ["Income Statement", "Cash Flow Statement", "Risk Factors"])
+        for c in chunks:
+            self.assertEqual(SAMPLE_DOC[c["start"]:c["end"]], c["text"])
+
+    def test_tables_are_never_split(self):
+        doc = "## Income Statement\nIntro paragraph.\n" + self.TABLE + "\n" + ("Note. " * 20 + "\n\n") * 3
+        chunks = rag.chunk_by_sections(doc, max_chunk_size=len(self.TABLE) + 10)
+        table_chunks = [c for c in chunks if c["has_table"]]
+        self.assertEqual(len(table_chunks), 1)
+        self.assertIn(self.TABLE.strip(), table_chunks[0]["text"])
+        self.assertGreater(len(chunks), 2)
+
+    def test_large_document_is_linear(self):
+        section = "## Note\n" + ("Some paragraph text here.\n\n" * 40) + self.TABLE + "\n"
+        doc = section * (500000 // len(section))
+        start = time.perf_counter()
+        chunks = rag.chunk_by_sections(doc)
+        self.assertLess(time.perf_counter() - start, 2.0)
+        self.assertEqual(sum(c["has_table"] for c in chunks), doc.count("| Item |"))
+
+    def test_chunks_map_back_to_provenance(self):
+        from src.parsers.financial_pdf import _attach_markdown_offsets
+        provenance = [
+            {"full_text": "Total revenue was 8,880 million.", "page": 3},
+            {"full_text": "Text that Docling did not export", "page": 3},
+            {"full_text": "Operating cash flow was 1,600 million.", "page": 5},
+            {"full_text": "Competition and regulation", "page": 9},
+        ]
+        _attach_markdown_offsets(SAMPLE_DOC, provenance)
+        self.assertEqual(provenance[1]["md_start"], -1)
+        chunks = rag.chunk_by_sections(SAMPLE_DOC)
+        annotated = rag.attach_chunk_provenance(chunks, provenance)
+        self.assertEqual([c["provenance_ids"] for c in annotated], [[0], [2], [3]])
+        self.assertEqual([c["pages"] for c in annotated], [[3], [5], [9]])
+        self.assertNotIn("pages", chunks[0])
+
+
+class TestLexicalRetrieval(unittest.TestCase):
+    """BM25 works on its own, so these run without the embedding stack."""
+
+    def test_bm25_prefers_exact_terms(self):
+        bm25 = rag.BM25Index([
+            "Diluted EPS was 1.25 per share.",
+            "Basic earnings per share were 1.30.",
+            "Operating cash flow was 1,600 million.",
+        ])
+        self.assertEqual(bm25.search("Diluted EPS", top_k=1)[0][0], 0)
+        self.assertEqual(bm25.search("operating cash flow", top_k=1)[0][0], 2)
+        self.assertEqual(bm25.search("goodwill"), [])
+
+    def test_lexical_only_without_embeddings(self):
+        chunks = rag.chunk_by_sections(SAMPLE_DOC)
+        with patch.object(rag, "_load_dependencies", return_value=False):
+            index = rag.DocumentIndex(model_name="unused", embedding_cache=False)
+            self.assertTrue(index.build(chunks))
+        self.assertTrue(index.lexical_only)
+        top = index.retrieve("Operating Cash Flow", top_k=1)[0]
+        self.assertEqual(top["section_title"], "Cash Flow Statement")
+
+    def test_metrics_context_falls_back_to_bm25(self):
+        """A failing model no longer means "first N characters of the document"."""
+        doc = "## Cover\n" + "Boilerplate. " * 200 + SAMPLE_DOC
+        rag._index_lru.clear()
+        with patch.object(rag, "_index_dir", return_value=tempfile.gettempdir()), \
+             patch.object(rag, "get_embedding_cache", return_value=None), \
+             patch.object(rag.DocumentIndex, "_encode", side_effect=OSError("model download failed")):
+            context = rag.get_context_for_metrics(["Operating Cash Flow"], doc, max_chars=500)
+        rag._index_lru.clear()
+        self.assertIn("Operating cash flow was 1,600 million", context)
+        self.assertNotIn("Boilerplate", context)
+
+    def test_indexed_provenance_labels_context_pages(self):
+        from src.parsers.financial_pdf import _attach_markdown_offsets
+        provenance = [{"full_text": "Operating cash flow was 1,600 million.", "page": 5}]
+        _attach_markdown_offsets(SAMPLE_DOC, provenance)
+        rag._index_lru.clear()
+        with patch.object(rag, "_index_dir", return_value=tempfile.gettempdir()), \
+             patch.object(rag, "_load_dependencies", return_value=False):
+            context = rag.get_context_for_metrics(["Operating Cash Flow"], SAMPLE_DOC, max_chars=500,
+                                                  provenance_map=provenance)
+            # The cached index is shared: a call without provenance sees no stale pages
+            plain = rag.get_context_for_metrics(["Operating Cash Flow"], SAMPLE_DOC, max_chars=500)
+        rag._index_lru.clear()
+        self.assertIn("[Section: Cash Flow Statement] [Pages: 5]", context)
+        self.assertNotIn("[Pages:", plain)
+
+
+@unittest.skipUnless(HAS_FAISS, "FAISS / sentence-transformers not installed")
+class TestHybridRetrieval(unittest.TestCase):
+
+    def setUp(self):
+        rag.get_model_manager().register("hybrid-fake", FakeEncoder())
+        self.index = rag.DocumentIndex(model_name="hybrid-fake", embedding_cache=False)
+        self.index.build(rag.chunk_by_sections(SAMPLE_DOC))
+
+    def test_modes(self):
+        for mode in ("hybrid", "dense", "lexical"):
+            top = self.index.retrieve("operating cash flow", top_k=1, mode=mode)[0]
+            self.assertEqual(top["section_title"], "Cash Flow Statement", mode)
+
+    def test_hybrid_score_blends_both(self):
+        dense = self.index.retrieve("capital expenditures", top_k=1, mode="dense")[0]
+        hybrid = self.index.retrieve("capital expenditures", top_k=1, mode="hybrid")[0]
+        expected = (1 - rag.HYBRID_LEXICAL_WEIGHT) * dense["relevance_score"] + rag.HYBRID_LEXICAL_WEIGHT
+        self.assertAlmostEqual(hybrid["relevance_score"], expected, places=5)
+
+
+class TestSectionFilters(unittest.TestCase):
+
+    def setUp(self):
+        with patch.object(rag, "_load_dependencies", return_value=False):
+            self.lexical_index = rag.DocumentIndex(model_name="unused", embedding_cache=False)
+            self.lexical_index.build(rag.chunk_by_sections(SAMPLE_DOC))
+
+    def test_query_hints(self):
+        self.assertIn("cash flow", rag.sections_for_query("Operating Cash Flow"))
+        self.assertIn("income statement", rag.sections_for_query("Diluted EPS"))
+        self.assertIn("risk factor", rag.sections_for_query("What are the key risks?"))
+        self.assertIsNone(rag.sections_for_query("Headcount"))
+        self.assertIsNone(rag.sections_for_query("Steps taken"))  # "eps" only as a whole word
+
+    def test_section_map(self):
+        self.assertEqual(self.lexical_index.chunk_ids_for_sections(["cash flow"]), [1])
+        self.assertEqual(self.lexical_index.chunk_ids_for_sections(["segment"]), [])
+
+    def test_filtered_sections_first_then_fill(self):
+        results = self.lexical_index.retrieve("million", top_k=2, sections=["cash flow"])
+        self.assertEqual([r["section_title"] for r in results], ["Cash Flow Statement", "Income Statement"])
+
+    @unittest.skipUnless(HAS_FAISS, "FAISS / sentence-transformers not installed")
+    def test_dense_filter_and_boost(self):
+        rag.get_model_manager().register("section-fake", FakeEncoder())
+        index = rag.DocumentIndex(model_name="section-fake", embedding_cache=False)
+        index.build(rag.chunk_by_sections(SAMPLE_DOC))
+        top = index.retrieve("total revenue", top_k=1, sections=["risk factor"])[0]
+        self.assertEqual(top["section_title"], "Risk Factors")
+        boosted = index.retrieve("total revenue", top_k=3, sections=["risk factor"], section_boost=0.01)
+        self.assertEqual(boosted[0]["section_title"], "Income Statement")
+        self.assertEqual(len(boosted), 3)
+
+
+@unittest.skipUnless(HAS_FAISS, "FAISS / sentence-transformers not installed")
+class TestCorpusIndex(unittest.TestCase):
+
+    FILINGS = [
+        ("AAPL", "10-K 2022", "2022", "## Impairment\nNo goodwill impairment was recorded.\n## Revenue\nRevenue rose.\n"),
+        ("AAPL", "10-K 2023", "2023", "## Impairment\nGoodwill impairment of 40 million in services.\n"),
+        ("MSFT", "10-K 2023", "2023", "## Impairment\nGoodwill impairment charge on the devices unit.\n"),
+        ("MSFT", "10-K 2021", "2021", "## Leases\nOperating lease liabilities increased.\n"),
+    ]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        rag.get_model_manager().register("corpus-fake", FakeEncoder())
+        self.corpus = rag.CorpusIndex(self.tmp_dir.name, model_name="corpus-fake")
+        for ticker, filing, period, markdown in self.FILINGS:
+            index = rag.DocumentIndex(model_name="corpus-fake", embedding_cache=False)
+            index.build(rag.chunk_by_sections(markdown))
+            self.assertTrue(self.corpus.add_document(index, f"{ticker}-{period}", ticker, filing, period))
+        # Re-adding the same document is a no-op
+        self.assertFalse(self.corpus.add_document(index, "MSFT-2021", "MSFT", "10-K 2021", "2021"))
+
+    def tearDown(self):
+        self.corpus._conn.close()
+        self.tmp_dir.cleanup()
+
+    def test_search_all_filings(self):
+        hits = self.corpus.search("goodwill impairment", top_k=3)
+        self.assertEqual({h["ticker"] for h in hits}, {"AAPL", "MSFT"})
+        self.assertTrue(all(h["section_title"] == "Impairment" for h in hits))
+
+    def test_metadata_filters(self):
+        hits = self.corpus.search("goodwill impairment", top_k=5, tickers=["MSFT"])
+        self.assertEqual({h["ticker"] for h in hits}, {"MSFT"})
+        latest = self.corpus.search("goodwill impairment", top_k=10, latest=1)
+        self.assertEqual({(h["ticker"], h["period"]) for h in latest}, {("AAPL", "2023"), ("MSFT", "2023")})
+        with patch.object(rag, "CORPUS_EXACT_SEARCH_LIMIT", 0):  # force the HNSW + ID selector path
+            hits = self.corpus.search("goodwill impairment", top_k=5, periods=["2022"])
+        self.assertEqual([(h["ticker"], h["period"]) for h in hits][:1], [("AAPL", "2022")])
+        self.assertEqual(self.corpus.search("goodwill", tickers=["NVDA"]), [])
+
+    def test_batch_add_writes_index_once(self):
+        batch = []
+        for period in ("2019", "2020", "2020"):
+            index = rag.DocumentIndex(model_name="corpus-fake", embedding_cache=False)
+            index.build(rag.chunk_by_sections(f"## Goodwill\nGoodwill impairment review for {period}.\n"))
+            batch.append((index, f"NVDA-{period}", "NVDA", f"10-K {period}", period))
+        with patch.object(self.corpus, "_write", wraps=self.corpus._write) as write:
+            self.assertEqual(self.corpus.add_documents(batch), 2)
+            self.assertEqual(self.corpus.add_documents(batch), 0)
+        self.assertEqual(write.call_count, 1)
+        hits = self.corpus.search("goodwill impairment", top_k=10, tickers=["NVDA"])
+        self.assertEqual(sorted({h["period"] for h in hits}), ["2019", "2020"])
+        reopened = rag.CorpusIndex(self.tmp_dir.name, model_name="corpus-fake")
+        self.assertEqual(len(reopened.documents()), 6)
+        reopened._conn.close()
+
+    def test_corpus_directory_is_keyed_by_backend(self):
+        corpora = []
+        for backend in ("onnx-int8", "torch"):
+            manager = rag.EmbeddingModelManager(backend=backend)
+            manager.register("corpus-fake", FakeEncoder())
+            with patch.object(rag, "_model_manager", manager), \
+                 patch.object(rag, "_corpus_indexes", {}), \
+                 patch.object(rag, "_default_cache_dir", return_value=self.tmp_dir.name):
+                corpora.append(rag.get_corpus_index("corpus-fake"))
+                self.assertIs(rag.get_corpus_index("corpus-fake"), corpora[-1])
+        self.assertEqual([os.path.basename(c.directory) for c in corpora], ["corpus-fake_onnx-int8", "corpus-fake"])
+        for corpus in corpora:
+            corpus._conn.close()
+
+    def test_reopened_corpus_sees_documents(self):
+        reopened = rag.CorpusIndex(self.tmp_dir.name, model_name="corpus-fake")
+        self.assertEqual(len(reopened.documents()), 4)
+        self.assertEqual(reopened.search("operating lease", top_k=1)[0]["ticker"], "MSFT")
+        reopened._conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
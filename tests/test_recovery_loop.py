@@ -2,7 +2,6 @@ import asyncio
 import os
 import sys
 import logging
-import json
 
 # Setup Path
 sys.path.append(os.getcwd())
@@ -30,7 +29,8 @@ class MockQuant:
     def __init__(self):
         self.call_count = 0
 
-    def extract_metrics(self, markdown_content: str, target_metrics: List[str] = None, feedback: str = None) -> Dict[str, Any]:
+    def extract_metrics(self, markdown_content: str, target_metrics: List[str] = None, feedback: str = None,
+                        provenance_map=None) -> Dict[str, Any]:
         self.call_count += 1
         
         # BBox for the line "Current assets: Cash..." approx from previous run
@@ -100,11 +100,9 @@ async def run_stress_test():
     print("="*60)
     
     # Check Logs
-    log_file = "verification_log.json"
-    if os.path.exists(log_file):
-        with open(log_file, "r") as f:
-            data = json.load(f)
-            
+    from src.utils import db
+    data = db.get_verification_log(final_report.get("run_id"))
+    if data:
         metrics = data.get("metrics", [])
         if metrics:
             m = metrics[0]
@@ -126,7 +124,7 @@ async def run_stress_test():
         else:
             print("[FAIL] No metrics in log.")
     else:
-        print("[FAIL] Log file not found.")
+        print("[FAIL] Verification log not found in database.")
 
 if __name__ == "__main__":
     asyncio.run(run_stress_test())
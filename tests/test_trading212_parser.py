@@ -0,0 +1,149 @@
+"""
+Test Trading212 Parser
+======================
+Page handling against stubbed pdfplumber pages: the text-strategy fallback,
+page ranges split across workers and merged back in page order, and row
+dedup on HOLDING_FIELDS / TRANSACTION_FIELDS.
+"""
+import unittest
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.parsers import trading212
+from src.parsers.trading212 import Trading212Parser, TEXT_TABLE_SETTINGS
+
+TRANSACTION_HEADER = ["Date", "Time", "Action", "Ticker", "ISIN", "Total"]
+HOLDINGS_HEADER = ["Instrument", "ISIN", "Quantity", "Price", "Value"]
+
+
+def _transactions(*rows):
+    return [TRANSACTION_HEADER] + [list(row) for row in rows]
+
+
+def _buy(date, total, time_="09:30:00"):
+    return (date, time_, "Buy", "AAPL", "US0378331005", f"{total:.2f}")
+
+
+class FakePage:
+    """pdfplumber page stub: ruled-strategy tables, text-strategy tables and a text layer."""
+
+    def __init__(self, tables=(), text_tables=(), text="", delay=0.0):
+        self.tables = list(tables)
+        self.text_tables = list(text_tables)
+        self.text = text
+        self.delay = delay
+        self.strategies = []
+
+    def extract_tables(self, table_settings=None):
+        self.strategies.append("text" if table_settings == TEXT_TABLE_SETTINGS else "default")
+        time.sleep(self.delay)
+        return self.text_tables if table_settings == TEXT_TABLE_SETTINGS else self.tables
+
+    def extract_text(self):
+        return self.text
+
+
+class FakePDF:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class TestParsePage(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = Trading212Parser()
+        self.result = trading212._new_page_result()
+
+    def test_text_strategy_only_when_default_finds_nothing(self):
+        ruled = FakePage(tables=[_transactions(_buy("2024-01-02", 100.0))],
+                         text_tables=[_transactions(_buy("2024-01-03", 999.0))])
+        self.parser._parse_page(ruled, self.result)
+        self.assertEqual(ruled.strategies, ["default"])
+
+        unruled = FakePage(tables=[[["Statement", "page 2"]]],
+                           text_tables=[_transactions(_buy("2024-01-04", 50.0))])
+        self.parser._parse_page(unruled, self.result)
+        self.assertEqual(unruled.strategies, ["default", "text"])
+        self.assertEqual([t["Total"] for t in self.result["transactions"]], [100.0, 50.0])
+
+    def test_quantity_and_price_are_extracted(self):
+        row = ("2024-01-02", "09:30:00", "Buy", "AAPL", "US0378331005", "3", "1,150.00", "3,450.00")
+        self.parser._parse_page(FakePage(tables=[_transactions(row, _buy("2024-01-03", 10.0))]), self.result)
+        self.assertEqual([(t["Qty"], t["Price"], t["Total"]) for t in self.result["transactions"]],
+                         [(3.0, 1150.0, 3450.0), (None, None, 10.0)])
+
+    def test_default_tables_are_reused(self):
+        page = FakePage(text_tables=[_transactions(_buy("2024-01-04", 50.0))])
+        self.parser._parse_page(page, self.result, default_tables=[_transactions(_buy("2024-01-02", 100.0))])
+        self.assertEqual(page.strategies, [])
+        self.assertEqual(len(self.result["transactions"]), 1)
+
+    def test_skipped_and_fingerprinted_pages(self):
+        holdings = FakePage(tables=[[HOLDINGS_HEADER, ["Apple Inc", "US0378331005", "10", "150.00", "1500.00"]]],
+                            text="Open positions")
+        seen = FakePage(tables=[_transactions(_buy("2024-01-02", 100.0))], text="January")
+        fresh = FakePage(tables=[_transactions(_buy("2024-02-02", 100.0))], text="February")
+        skip = {self.parser._page_fingerprint(seen)}
+        for page in (holdings, seen, fresh):
+            self.parser._parse_page(page, self.result, skip_page_hashes=skip)
+        self.assertEqual(self.result["pages_skipped"], 1)
+        self.assertEqual(seen.strategies, [])
+        # Pages with open positions are never recorded as safe to skip
+        self.assertEqual(self.result["page_hashes"], [self.parser._page_fingerprint(fresh)])
+        self.assertEqual(self.result["holdings"][0]["Market Value"], 1500.0)
+
+
+class TestParallelParse(unittest.TestCase):
+
+    def _parse(self, pages, max_workers):
+        # Threads stand in for worker processes so the stubbed pdfplumber is shared
+        with patch.object(trading212.pdfplumber, "open", side_effect=lambda path: FakePDF(pages)), \
+             patch.object(trading212, "ProcessPoolExecutor", ThreadPoolExecutor), \
+             patch.object(trading212, "_parse_page_range", wraps=trading212._parse_page_range) as ranges:
+            data = Trading212Parser().parse("statement.pdf", max_workers=max_workers)
+        return data, sorted(call.args[1:3] for call in ranges.call_args_list)
+
+    def test_ranges_merge_in_page_order(self):
+        # Earlier pages are slower, so later ranges finish first
+        pages = [FakePage(tables=[_transactions(_buy(f"2024-01-{i + 1:02d}", float(i)))], delay=0.02 * (9 - i))
+                 for i in range(9)]
+        data, ranges = self._parse(pages, max_workers=3)
+        self.assertEqual(ranges, [(0, 3), (3, 6), (6, 9)])
+        self.assertEqual([t["Total"] for t in data["transactions"]], [float(i) for i in range(9)])
+        self.assertEqual(data["page_count"], 9)
+
+    def test_serial_below_threshold(self):
+        pages = [FakePage(tables=[_transactions(_buy("2024-01-02", float(i)))]) for i in range(3)]
+        data, ranges = self._parse(pages, max_workers=4)
+        self.assertEqual(ranges, [])
+        self.assertEqual(len(data["transactions"]), 3)
+
+    def test_duplicate_rows_across_pages_are_dropped(self):
+        holding = ["Apple Inc", "US0378331005", "10", "150.00", "1500.00"]
+        repeated = _buy("2024-01-31", 100.0)
+        pages = [FakePage(tables=[_transactions(_buy("2024-01-02", 50.0))]) for _ in range(8)]
+        # A row repeated at a page break, and the same open position on two pages
+        pages[3].tables = [_transactions(repeated)]
+        pages[4].tables = [_transactions(repeated, _buy("2024-01-31", 100.0, "15:45:10"))]
+        pages[6].tables = [[HOLDINGS_HEADER, holding]]
+        pages[7].tables = [[HOLDINGS_HEADER, holding, ["Microsoft", "US5949181045", "2", "400.00", "800.00"]]]
+        data, _ = self._parse(pages, max_workers=4)
+        self.assertEqual([(t["Date"], t["Total"]) for t in data["transactions"]],
+                         [("2024-01-02", 50.0), ("2024-01-31", 100.0), ("2024-01-31", 100.0)])
+        self.assertEqual([h["ISIN"] for h in data["holdings"]], ["US0378331005", "US5949181045"])
+
+
+if __name__ == '__main__':
+    unittest.main()
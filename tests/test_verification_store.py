@@ -0,0 +1,95 @@
+"""
+Test Verification Log Storage
+==============================
+Audit reports are persisted compressed in SQLite with per-metric index rows.
+Runs against a throwaway database file, never data/gvd_engine.db.
+"""
+import unittest
+import os
+import sys
+import tempfile
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import db
+
+
+def _report(run_id, ticker, period, statuses):
+    return {
+        "run_id": run_id,
+        "timestamp": "2026-01-02T00:00:00",
+        "pdf_path": f"{ticker}_{period}.pdf",
+        "ticker": ticker,
+        "period": period,
+        "metrics": [
+            {"metric_id": metric_id, "value_raw": "1,000", "verification": {"status": status}, "flagged": status != "verified"}
+            for metric_id, status in statuses.items()
+        ],
+        "qual_analysis": {"summary": "x" * 5000},
+    }
+
+
+class TestVerificationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_path = db.DB_PATH
+        self._reset_connection()
+        db.DB_PATH = os.path.join(self.tmp_dir.name, "test.db")
+        db.init_database()
+
+    def tearDown(self):
+        self._reset_connection()
+        db.DB_PATH = self.original_path
+        self.tmp_dir.cleanup()
+
+    def _reset_connection(self):
+        conn = getattr(db._local, "connection", None)
+        if conn is not None:
+            conn.close()
+        db._local.connection = None
+
+    def test_roundtrip_and_latest(self):
+        """Reports are decompressed intact; latest returns the newest run."""
+        db.insert_verification_log(_report("RUN_1", "SHOP", "2023", {"revenue": "verified"}))
+        db.insert_verification_log(_report("RUN_2", "SHOP", "2024", {"revenue": "error_detected"}))
+
+        self.assertEqual(db.get_verification_log("RUN_1")["period"], "2023")
+        latest = db.get_latest_verification_log()
+        self.assertEqual(latest["run_id"], "RUN_2")
+        self.assertEqual(latest["qual_analysis"]["summary"], "x" * 5000)
+
+    def test_report_is_compressed(self):
+        """The stored blob is smaller than the raw JSON payload."""
+        db.insert_verification_log(_report("RUN_1", "SHOP", "2024", {"revenue": "verified"}))
+        with db.get_cursor() as cursor:
+            cursor.execute("SELECT report_blob, report_json FROM verification_logs")
+            row = cursor.fetchone()
+        self.assertIsNone(row["report_json"])
+        self.assertLess(len(row["report_blob"]), 5000)
+
+    def test_metric_history_filters(self):
+        """Per-metric rows support ticker and status filters without loading reports."""
+        db.insert_verification_log(_report("RUN_1", "SHOP", "2023", {"revenue": "verified", "eps": "error_detected"}))
+        db.insert_verification_log(_report("RUN_2", "ADBE", "2024", {"revenue": "verified"}))
+
+        history = db.get_metric_history("revenue")
+        self.assertEqual([h["run_id"] for h in history], ["RUN_2", "RUN_1"])
+        self.assertEqual(len(db.get_metric_history("revenue", ticker="SHOP")), 1)
+        failed = db.get_metric_history("eps", status="error_detected")
+        self.assertEqual(failed[0]["flagged"], 1)
+
+        runs = db.list_verification_runs(ticker="ADBE")
+        self.assertEqual([r["run_id"] for r in runs], ["RUN_2"])
+        self.assertNotIn("report_blob", runs[0])
+
+    def test_latest_by_ticker(self):
+        db.insert_verification_log(_report("RUN_1", "SHOP", "2024", {}))
+        db.insert_verification_log(_report("RUN_2", "ADBE", "2024", {}))
+        self.assertEqual(db.get_latest_verification_log(ticker="SHOP")["run_id"], "RUN_1")
+        self.assertIsNone(db.get_latest_verification_log(ticker="MSFT"))
+
+
+if __name__ == '__main__':
+    unittest.main()